@@ -1,266 +1,231 @@
 import os, sys, io
 import M5
 from M5 import *
-import m5ui
-import lvgl as lv
-from hardware import Pin
-from hardware import I2C
-from hardware import Rotary
-from unit import WeightI2CUnit
 import time
 import json
 
+# Shared hardware and UI core (next to this file on the device, one level up in the repository)
+try:
+    import core
+except ImportError:
+    sys.path.append('..')
+    import core
+import log
+from weighing import StabilityDetector
+
 
 # Configuration
-CALIBRATION_POINTS = [0, 500, 5000, 20000]  # Default calibration points (grams)
+CALIBRATION_POINTS = [0, 500, 5000, 20000]  # Default calibration points (grams), any number
 CALIBRATION_DURATION = 30  # seconds
-DEBUG_MODE = True  # Set to False to disable debug logging
-
-# Global variables
-page0 = None
-title_label = None
-info_step_label = None
-info_label = None
-status_label = None
-progress_bar = None
-i2c0 = None
-weight_i2c_0 = None
-rotary = None
+MAX_CALIBRATION_POINTS = 64
 
-# Wizard state
-current_step = 0  # Current calibration index
-adjusted_weights = list(CALIBRATION_POINTS)  # Adjustable weights
-calibration_data = {}  # Stores results
+# Automatic capture: a point is measured whenever the known reference weight
+# is added and the reading settles; the button finishes and saves
+AUTO_CAPTURE = False
+AUTO_REFERENCE_G = 500  # weight added between points (adjusted with the encoder)
+AUTO_CAPTURE_DURATION = 5  # seconds averaged per point
+AUTO_MIN_STEP_COUNTS = 1000  # ADC change that counts as a new load
+AUTO_STABLE_COUNTS = 200  # ADC spread of a settled reading
+AUTO_HOLD_MS = 2000  # time the reading must stay settled
+# Serial output: core.LOG_LEVEL (log.DEBUG shows the ADC readings), or
+# log.set_level(level, 'wizard') for the wizard only
 
-# Encoder with momentum
-last_encoder_change_time = 0
-encoder_speed_multiplier = 1  # Start at 1g for precision
-encoder_last_direction = 0
-encoder_momentum_count = 0
+# Sensor to calibrate (see SENSORS in scale.py for several platforms)
+I2C_BUS = 0
+SCL_PIN = 15
+SDA_PIN = 13
+I2C_ADDRESS = 0x26
+I2C_FREQ = 100000  # used if the bus is not open yet: averaging does not need fast mode
+CALIBRATION_SECTION = "scale"  # section of scale_calibration.json for this sensor
+CALIBRATION_FILE = "/flash/scale_calibration.json"
 
+_log = log.get_logger('wizard')
 
-def get_font(preferred_size: int = 16):
-    """Return an available LVGL font, with fallbacks if missing."""
-    candidates = [
-        f"font_montserrat_{preferred_size}",
-        f"font_montserrat_{preferred_size - 2}",
-        "font_montserrat_16",
-        "font_montserrat_14",
-        "font_montserrat_12",
-        "font_montserrat_10",
-    ]
-    for name in candidates:
-        if hasattr(lv, name):
-            return getattr(lv, name)
-    return None
 
-
-def setup():
-    global page0, title_label, info_step_label, info_label, status_label, i2c0, weight_i2c_0, rotary
+class CalibrationWizard:
+    """
+    Guided calibration of one sensor
     
-    M5.begin()
-    m5ui.init()
-    page0 = m5ui.M5Page(bg_c=0x000000)
+    The Weight Unit driver, rotary encoder, fonts and screen come from core:
+    started from the scale application, the wizard reuses its hardware and
+    its screen is only built the first time.
+    """
     
-    # Title - centered with softer color
-    title_label = m5ui.M5Label(
-        "Scale Calibration",
-        x=50,
-        y=30,
-        text_c=0x9CA3AF,
-        bg_c=0x000000,
-        bg_opa=0,
-        font=get_font(16),
-        parent=page0,
-    )
+    def __init__(self, bus=I2C_BUS, scl=SCL_PIN, sda=SDA_PIN, address=I2C_ADDRESS,
+                 section=CALIBRATION_SECTION, filename=CALIBRATION_FILE,
+                 points=CALIBRATION_POINTS, auto=AUTO_CAPTURE):
+        """
+        Initialize the wizard (hardware shared through core)
+        
+        Args:
+            bus: I2C peripheral id
+            scl: SCL pin
+            sda: SDA pin
+            address: I2C address of the Weight I2C unit
+            section: Section of the calibration file for this sensor
+            filename: Calibration file
+            points: Calibration weights in grams (any number, at least 2)
+            auto: Capture points automatically as reference weights are added
+        """
+        core.init_m5()
+        self.section = section
+        self.filename = filename
+        self.points = list(points)[:MAX_CALIBRATION_POINTS]
+        self.auto = auto
+        self.stability = StabilityDetector(AUTO_STABLE_COUNTS, AUTO_HOLD_MS)
+        self.weight_unit = core.get_weight_unit(bus, scl, sda, address, I2C_FREQ)
+        self.rotary = core.get_rotary()
+        self.screen = core.get_screen('calibration', self._build_ui)
+        self.reset()
     
-    # Current calibration step - larger
-    info_step_label = m5ui.M5Label(
-        "Step 1/4: 0g",
-        x=65,
-        y=75,
-        text_c=0xE0E0E0,
-        bg_c=0x000000,
-        bg_opa=0,
-        font=get_font(16),
-        parent=page0,
-    )
+    def _build_ui(self):
+        """Create the calibration screen (once)"""
+        screen = core.Screen()
+        # Title - centered with softer color
+        screen.title_label = core.label(screen.page, "Scale Calibration", 50, 30, 16, 0x9CA3AF)
+        # Current calibration step - larger
+        screen.info_step_label = core.label(screen.page, "Step 1: 0g", 65, 75, 16, 0xE0E0E0)
+        # Instructions - smaller and more discreet
+        screen.info_label = core.label(screen.page, "Rotary: adjust\nBtn: start", 60, 105, 9, 0x808080)
+        # Status - below instructions
+        screen.status_label = core.label(screen.page, "", 70, 150, 12, 0xE0E0E0)
+        # Progress bar for calibration time
+        screen.progress_bar = core.progress_bar(screen.page, 40, 195, 160)
+        return screen
     
-    # Instructions - smaller and more discreet
-    info_label = m5ui.M5Label(
-        "Rotary: adjust\nBtn: start",
-        x=60,
-        y=105,
-        text_c=0x808080,
-        bg_c=0x000000,
-        bg_opa=0,
-        font=get_font(9),
-        parent=page0,
-    )
+    def reset(self):
+        """Start again from the first calibration point"""
+        self.current_step = 0  # Current calibration index
+        self.adjusted_weights = list(self.points)  # Adjustable weights
+        self.measured = []  # (weight, ADC average) in measurement order
+        self.reference_g = AUTO_REFERENCE_G
+        self._direction = 0  # sign of the ADC change when loading (automatic mode)
+        self._complete = False
+        self.stability.reset()
+        
+        # Encoder with momentum
+        self.last_encoder_change_time = 0
+        self.encoder_speed_multiplier = 1  # Start at 1g for precision
+        self.encoder_last_direction = 0
+        self.encoder_momentum_count = 0
     
-    # Status - below instructions
-    status_label = m5ui.M5Label(
-        "",
-        x=70,
-        y=150,
-        text_c=0xE0E0E0,
-        bg_c=0x000000,
-        bg_opa=0,
-        font=get_font(12),
-        parent=page0,
-    )
-
-    # Progress bar (LVGL) for calibration time
-    global progress_bar
-    progress_bar = lv.bar(page0)
-    progress_bar.set_size(160, 8)
-    progress_bar.set_pos(40, 195)
-    progress_bar.set_range(0, 100)
-    progress_bar.set_value(0, False)
+    @property
+    def done(self):
+        """True once every point is measured (automatic mode: finished)"""
+        return self._complete or (not self.auto and self.current_step >= len(self.points))
     
-    i2c0 = I2C(0, scl=Pin(15), sda=Pin(13), freq=100000)
-    weight_i2c_0 = WeightI2CUnit(i2c0, 0x26)
+    def enter(self):
+        """Show the wizard screen at the first step"""
+        self.reset()
+        if self.rotary:
+            self.rotary.reset_rotary_value()
+        self.screen.progress_bar.set_value(0, False)
+        self.update_display()
+        self.screen.show()
     
-    # Initialize rotary encoder (UIFlow2 2.4)
-    rotary = Rotary()
-    rotary.reset_rotary_value()
+    def is_button_pressed(self):
+        """Check if button is pressed"""
+        return M5.BtnA.wasPressed()
     
-    update_display()
-    page0.screen_load()
-
-
-def is_button_pressed():
-    """Check if button is pressed"""
-    return M5.BtnA.wasPressed()
-
-
-def update_display():
-    """Refresh display with current state"""
-    global title_label, info_step_label, info_label, status_label, current_step, adjusted_weights
-    
-    if current_step < len(CALIBRATION_POINTS):
-        weight = adjusted_weights[current_step]
-        step_name = f"{CALIBRATION_POINTS[current_step]}g"
-        info_step_label.set_text(f"Step {current_step + 1}/4: {step_name}")
-        info_label.set_text("Enc: adjust\nBtn: start")
-        status_label.set_text(f"Target {weight}g")
-    else:
-        info_step_label.set_text("Calibration complete")
-        info_label.set_text("")
-        status_label.set_text("Data saved")
-
-
-def read_adc_average(duration_seconds=30):
-    """Read ADC during the window and return average"""
-    global weight_i2c_0, status_label, progress_bar
-    
-    values = []
-    start_time = time.ticks_ms()
-    duration_ms = duration_seconds * 1000
-    sample_count = 0
+    def update_display(self):
+        """Refresh display with current state"""
+        screen = self.screen
+        if self.done:
+            screen.info_step_label.set_text("Calibration complete")
+            screen.info_label.set_text("")
+            screen.status_label.set_text("Data saved")
+        elif self.auto:
+            count = len(self.measured)
+            screen.info_step_label.set_text(f"Auto: {count} points")
+            screen.info_label.set_text("Enc: ref weight\nBtn: finish")
+            screen.status_label.set_text(f"Add {self.reference_g}g" if count else "Empty platform")
+        else:
+            weight = self.adjusted_weights[self.current_step]
+            step_name = f"{self.points[self.current_step]}g"
+            screen.info_step_label.set_text(f"Step {self.current_step + 1}/{len(self.points)}: {step_name}")
+            screen.info_label.set_text("Enc: adjust\nBtn: start")
+            screen.status_label.set_text(f"Target {weight}g")
     
-    status_label.set_text(f"Measuring\n0/{duration_seconds}s")
-    if progress_bar:
+    def read_adc_average(self, duration_seconds=30):
+        """Read ADC during the window and return average"""
+        status_label = self.screen.status_label
+        progress_bar = self.screen.progress_bar
+        values = []
+        start_time = time.ticks_ms()
+        duration_ms = duration_seconds * 1000
+        sample_count = 0
+        
+        status_label.set_text(f"Measuring\n0/{duration_seconds}s")
         progress_bar.set_value(0, False)
-    
-    while time.ticks_diff(time.ticks_ms(), start_time) < duration_ms:
-        M5.update()
-        try:
-            adc_value = weight_i2c_0.get_adc_raw
-            if adc_value is not None:
-                values.append(adc_value)
-                sample_count += 1
-                # Log ADC value to serial port (only in DEBUG mode)
-                if DEBUG_MODE:
-                    print(f"ADC: {adc_value}")
-        except Exception as e:
-            if DEBUG_MODE:
-                print(f"ADC read error: {e}")
         
-        # Update display roughly once a second
-        elapsed = time.ticks_diff(time.ticks_ms(), start_time) // 1000
-        if sample_count % 10 == 0:  # Roughly each second
-            status_label.set_text(f"Measuring\n{elapsed}/{duration_seconds}s")
-            if progress_bar:
+        while time.ticks_diff(time.ticks_ms(), start_time) < duration_ms:
+            M5.update()
+            try:
+                adc_value = self.weight_unit.get_adc_raw
+                if adc_value is not None:
+                    values.append(adc_value)
+                    sample_count += 1
+                    # Buffered and rate limited, printed after the window
+                    _log.debug("ADC: %d", adc_value)
+            except Exception as e:
+                _log.debug("ADC read error: %s", e)
+            
+            # Update display roughly once a second
+            elapsed = time.ticks_diff(time.ticks_ms(), start_time) // 1000
+            if sample_count % 10 == 0:  # Roughly each second
+                status_label.set_text(f"Measuring\n{elapsed}/{duration_seconds}s")
                 pct = min(100, int((elapsed * 100) / duration_seconds)) if duration_seconds else 100
                 progress_bar.set_value(pct, False)
-        
-        time.sleep_ms(100)
-    
-    if len(values) > 0:
-        average = sum(values) / len(values)
-        status_label.set_text(f"Avg: {int(average)}")
-        if progress_bar:
-            progress_bar.set_value(100, False)
-        return average
-    return 0
 
+            time.sleep_ms(100)
 
-def save_calibration_data():
-    """Save calibration data to JSON"""
-    global calibration_data
+        # Serial output only once the timed window is over
+        log.flush()
+        if len(values) > 0:
+            average = sum(values) / len(values)
+            status_label.set_text(f"Avg: {int(average)}")
+            progress_bar.set_value(100, False)
+            return average
+        return 0
     
-    try:
-        # Build CalibrationPoints array with step, calibration_point, weight, and ADC average
-        calibration_points = []
-        # Sort by weight to maintain step order
-        sorted_data = sorted(calibration_data.items(), key=lambda x: x[0])
-        
-        for step_index, (weight, adc_value) in enumerate(sorted_data):
-            calibration_points.append({
-                "step": step_index,
-                "calibration_point": CALIBRATION_POINTS[step_index] if step_index < len(CALIBRATION_POINTS) else 0,
-                "weight": int(weight),
-                "adc_average": float(adc_value)
-            })
-        
-        # Build complete data dictionary
-        data = {
-            "scale": {
-                "CalibrationPoints": calibration_points
-            }
-        }
-        
-        if DEBUG_MODE:
-            print(f"Saving calibration data: {data}")
-        
-        # Save JSON file to /flash root
-        filename = "/flash/scale_calibration.json"
-        with open(filename, 'w') as f:
-            json.dump(data, f)
-        
-        if DEBUG_MODE:
-            print(f"Calibration data saved to {filename}")
-        
-        return True
-    except Exception as e:
-        error_msg = f"Save error: {str(e)}"
-        status_label.set_text(error_msg[:30])
-        if DEBUG_MODE:
-            print(error_msg)
-        return False
-
+    def save_calibration_data(self):
+        """Save calibration data to JSON"""
+        try:
+            # [weight, ADC average] pairs sorted by weight: compact with dozens
+            # of points (the scale reads them into a CalibrationTable)
+            calibration_points = [[int(weight), round(adc_value, 1)] for weight, adc_value in sorted(self.measured)]
 
-def loop():
-    global page0, info_step_label, info_label, status_label, i2c0, weight_i2c_0
-    global current_step, adjusted_weights, calibration_data
-    global last_encoder_change_time, encoder_speed_multiplier, encoder_last_direction, encoder_momentum_count
-    
-    M5.update()
-    
-    # Exit early if all steps are done
-    if current_step >= len(CALIBRATION_POINTS):
-        time.sleep_ms(100)
-        return
-    
-    # Adjust phase: allow encoder to change weight with acceleration
-    encoder_delta = rotary.get_rotary_value() if rotary else 0
-    if rotary:
-        rotary.reset_rotary_value()
+            # Keep the calibration of the other sensors
+            filename = self.filename
+            try:
+                with open(filename, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            
+            section = data.get(self.section, {})
+            section["CalibrationPoints"] = calibration_points
+            data[self.section] = section
+            
+            _log.debug("Saving calibration data: %s", data)
+            
+            # Save JSON file to /flash root
+            with open(filename, 'w') as f:
+                json.dump(data, f)
+            
+            _log.info("Calibration data saved to %s", filename)
+            
+            return True
+        except Exception as e:
+            error_msg = f"Save error: {str(e)}"
+            self.screen.status_label.set_text(error_msg[:30])
+            _log.error("Save error: %s", e)
+            return False
     
-    if encoder_delta != 0:
+    def _apply_encoder(self, encoder_delta):
+        """Adjust the current weight with momentum (1g -> 10g -> 100g)"""
         current_time = time.ticks_ms()
-        delta_time = time.ticks_diff(current_time, last_encoder_change_time)
+        delta_time = time.ticks_diff(current_time, self.last_encoder_change_time)
         
         # Precision-first momentum system:
         # - Default: 1g (precision adjustments)
@@ -270,75 +235,156 @@ def loop():
         current_direction = 1 if encoder_delta > 0 else -1
         
         # Check if continuing in same direction quickly
-        if delta_time < 500 and current_direction == encoder_last_direction:
+        if delta_time < 500 and current_direction == self.encoder_last_direction:
             # Build momentum: max 3 fast clicks possible
-            encoder_momentum_count += 1
-            if encoder_momentum_count >= 3:
-                encoder_speed_multiplier = 100  # 3rd fast click
-            elif encoder_momentum_count >= 2:
-                encoder_speed_multiplier = 10   # 2nd fast click
+            self.encoder_momentum_count += 1
+            if self.encoder_momentum_count >= 3:
+                self.encoder_speed_multiplier = 100  # 3rd fast click
+            elif self.encoder_momentum_count >= 2:
+                self.encoder_speed_multiplier = 10   # 2nd fast click
             else:
-                encoder_speed_multiplier = 1    # 1st click
+                self.encoder_speed_multiplier = 1    # 1st click
         else:
             # Gradual deceleration on pause or direction change
-            if encoder_speed_multiplier == 100:
-                encoder_speed_multiplier = 10
-                encoder_momentum_count = 1  # Maintain at 10g level
-            elif encoder_speed_multiplier == 10:
-                encoder_speed_multiplier = 1
-                encoder_momentum_count = 0
+            if self.encoder_speed_multiplier == 100:
+                self.encoder_speed_multiplier = 10
+                self.encoder_momentum_count = 1  # Maintain at 10g level
+            elif self.encoder_speed_multiplier == 10:
+                self.encoder_speed_multiplier = 1
+                self.encoder_momentum_count = 0
             else:
-                encoder_speed_multiplier = 1
-                encoder_momentum_count = 0
+                self.encoder_speed_multiplier = 1
+                self.encoder_momentum_count = 0
+        
+        self.encoder_last_direction = current_direction
+        self.last_encoder_change_time = current_time
+        
+        # Apply change with momentum (automatic mode: to the reference weight)
+        increment = encoder_delta * self.encoder_speed_multiplier
+        if self.auto:
+            self.reference_g = min(max(self.reference_g + increment, 1), 50000)
+        else:
+            weight = self.adjusted_weights[self.current_step] + increment
+            # Clamp to reasonable bounds
+            self.adjusted_weights[self.current_step] = min(max(weight, 0), 50000)
+        self.update_display()
+    
+    def step(self):
+        """
+        One iteration of the wizard
         
-        encoder_last_direction = current_direction
-        last_encoder_change_time = current_time
+        Returns:
+            True once the calibration is complete (and saved)
+        """
+        M5.update()
+        
+        # Exit early if all steps are done
+        if self.done:
+            time.sleep_ms(100)
+            return True
+        
+        # Adjust phase: allow encoder to change weight with acceleration
+        encoder_delta = self.rotary.get_rotary_value() if self.rotary else 0
+        if self.rotary:
+            self.rotary.reset_rotary_value()
+        
+        if encoder_delta != 0:
+            self._apply_encoder(encoder_delta)
         
-        # Apply change with momentum (1g → 10g → 100g)
-        adjusted_weights[current_step] += encoder_delta * encoder_speed_multiplier
+        if self.auto:
+            if self._auto_capture():
+                return True
         
-        # Clamp to reasonable bounds
-        if adjusted_weights[current_step] < 0:
-            adjusted_weights[current_step] = 0
-        if adjusted_weights[current_step] > 50000:
-            adjusted_weights[current_step] = 50000
-        update_display()
+        # Start calibration on button press
+        elif self.is_button_pressed():
+            weight = self.adjusted_weights[self.current_step]
+            
+            # Read ADC for the duration and average
+            self.measured.append((weight, self.read_adc_average(CALIBRATION_DURATION)))
+            
+            # Next step
+            self.current_step += 1
+            
+            if not self.done:
+                self.update_display()
+                time.sleep_ms(500)  # Pause avant le point suivant
+            else:
+                return self._finish()
+        
+        log.flush()
+        time.sleep_ms(50)
+        return False
     
-    # Start calibration on button press
-    if is_button_pressed():
-        weight = adjusted_weights[current_step]
+    def _auto_capture(self):
+        """
+        Automatic mode: measure a point whenever the reading settles on a new load
         
-        # Read ADC for the duration and average
-        average_adc = read_adc_average(CALIBRATION_DURATION)
+        The first point is the empty platform, each following one the
+        previous weight plus the reference weight. A load lighter than the
+        last point (weight removed) is ignored.
         
-        # Store average
-        calibration_data[weight] = average_adc
+        Returns:
+            True once the calibration is complete (and saved)
+        """
+        count = len(self.measured)
+        if self.is_button_pressed() or count >= MAX_CALIBRATION_POINTS:
+            if count < 2:
+                self.screen.status_label.set_text("Need 2 points")
+                return False
+            return self._finish()
         
-        # Next step
-        current_step += 1
+        try:
+            adc_value = self.weight_unit.get_adc_raw
+        except Exception as e:
+            _log.debug("ADC read error: %s", e)
+            return False
+        if adc_value is None or not self.stability.update(adc_value, time.ticks_ms()):
+            return False
         
-        if current_step < len(CALIBRATION_POINTS):
-            update_display()
-            time.sleep_ms(500)  # Pause avant le point suivant
-        else:
-            # Final step: save
-            update_display()
-            if save_calibration_data():
-                status_label.set_text("Calibration complete!\nData saved")
-            time.sleep_ms(2000)
+        if count:
+            change = adc_value - self.measured[-1][1]
+            if abs(change) < AUTO_MIN_STEP_COUNTS:
+                return False  # still the load of the last point
+            if self._direction and (change > 0) != (self._direction > 0):
+                return False  # weight removed
+        
+        weight = self.measured[-1][0] + self.reference_g if count else 0
+        average = self.read_adc_average(AUTO_CAPTURE_DURATION)
+        if count == 1:
+            self._direction = average - self.measured[0][1]
+        self.measured.append((weight, average))
+        _log.info("Point %d: %dg, ADC %.1f", count + 1, weight, average)
+        self.stability.reset()
+        self.update_display()
+        return False
+    
+    def _finish(self):
+        """Save the measured points and show the result"""
+        self._complete = True
+        self.update_display()
+        if self.save_calibration_data():
+            self.screen.status_label.set_text("Calibration complete!\nData saved")
+        time.sleep_ms(2000)
+        return True
     
-    time.sleep_ms(50)
+    def run(self):
+        """Run the wizard until the calibration is saved"""
+        self.enter()
+        while not self.step():
+            pass
 
 
 if __name__ == '__main__':
     try:
-        setup()
+        wizard = CalibrationWizard()
+        wizard.enter()
         while True:
-            loop()
+            wizard.step()
     except (Exception, KeyboardInterrupt) as e:
         try:
+            import m5ui
             m5ui.deinit()
             from utility import print_error_msg
             print_error_msg(e)
         except ImportError:
-            print("please update to latest firmware")
\ No newline at end of file
+            print("please update to latest firmware")
@@ -0,0 +1,414 @@
+"""
+Ultimate Homebrewing Scale - Sample acquisition
+Reads the sensors at a fixed period (hardware timer or dedicated thread)
+into a preallocated ring buffer drained by several consumers
+"""
+
+import time
+from array import array
+import log
+
+try:
+    from machine import Timer
+except ImportError:
+    Timer = None
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+    ticks_add = time.ticks_add
+    sleep_us = time.sleep_us
+except AttributeError:
+    # CPython fallback (host-side runs)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+    
+    def ticks_diff(end, start):
+        return end - start
+    
+    def ticks_add(ticks, delta):
+        return ticks + delta
+    
+    def sleep_us(us):
+        time.sleep(us / 1000000)
+
+_log = log.get_logger('acquisition')
+
+
+class SampleRing:
+    """
+    Fixed-size ring of (timestamp, value) samples
+    
+    Written by a single producer (the acquisition tick) without allocating;
+    each consumer reads through its own RingCursor. A consumer that falls
+    more than `size` samples behind loses the oldest ones, counted in its
+    `dropped` attribute.
+    """
+    
+    def __init__(self, size=256):
+        """
+        Allocate the ring
+        
+        Args:
+            size: Number of samples kept
+        """
+        self.size = size
+        self.times = array('i', [0] * size)  # ticks_ms
+        self.values = array('i', [0] * size)  # raw ADC
+        self.head = 0  # number of samples ever written
+    
+    def push(self, t, value):
+        """Store a sample (producer side, no allocation)"""
+        index = self.head % self.size
+        self.times[index] = t
+        self.values[index] = value
+        # Publish after the slot is written
+        self.head += 1
+    
+    def cursor(self):
+        """New consumer positioned at the next sample"""
+        return RingCursor(self)
+
+
+class RingCursor:
+    """Read position of one consumer (UI, controller, logger) in a SampleRing"""
+    
+    def __init__(self, ring):
+        self.ring = ring
+        self.position = ring.head
+        self.dropped = 0
+    
+    def available(self):
+        """Number of samples waiting"""
+        return self.ring.head - self.position
+    
+    def _skip_overrun(self):
+        oldest = self.ring.head - self.ring.size
+        if self.position < oldest:
+            self.dropped += oldest - self.position
+            self.position = oldest
+    
+    def drain(self, callback, limit=None):
+        """
+        Pass the waiting samples to callback(t, value), oldest first
+        
+        Args:
+            callback: Function receiving timestamp (ticks_ms) and value
+            limit: Maximum number of samples handled in this call
+        
+        Returns:
+            Number of samples handled
+        """
+        ring = self.ring
+        count = 0
+        while self.position < ring.head and (limit is None or count < limit):
+            self._skip_overrun()
+            index = self.position % ring.size
+            t = ring.times[index]
+            value = ring.values[index]
+            # The producer may have lapped us while reading
+            if self.position < ring.head - ring.size:
+                continue
+            self.position += 1
+            callback(t, value)
+            count += 1
+        return count
+    
+    def latest(self):
+        """
+        Skip to the newest sample (for consumers that only display it)
+        
+        Returns:
+            Tuple (t, value), or None if no new sample
+        """
+        head = self.ring.head
+        if head == self.position:
+            return None
+        index = (head - 1) % self.ring.size
+        self.position = head
+        return self.ring.times[index], self.ring.values[index]
+
+
+class Acquisition:
+    """
+    Fixed-period sensor sampling
+    
+    A hardware timer (machine.Timer) calls the sampling tick when available,
+    otherwise a dedicated thread paces it with ticks_us. Samples never wait
+    for the UI loop: LVGL rendering only delays the consumers.
+    
+    Jitter is the delay of each tick against its schedule; a tick arriving
+    more than one period late counts the skipped periods as missed.
+    """
+    
+    def __init__(self, read, period_ms=10, size=256, timer_id=0):
+        """
+        Initialize the acquisition (not started)
+        
+        Args:
+            read: Function returning a raw sensor value, or None on error
+            period_ms: Sampling period
+            size: Ring buffer size (samples)
+            timer_id: Hardware timer used when machine.Timer is available
+        """
+        self.read = read
+        self.period_ms = period_ms
+        self.ring = SampleRing(size)
+        self.timer_id = timer_id
+        self.running = False
+        self._timer = None
+        self._generation = 0  # thread loop allowed to run (see start())
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Clear jitter and loss statistics"""
+        self.ticks = 0
+        self.samples = 0
+        self.errors = 0  # failed sensor reads
+        self.missed = 0  # periods without a tick
+        self.jitter_max_us = 0
+        self._jitter_total_us = 0
+        self._due_us = None
+    
+    def start(self):
+        """Start sampling"""
+        if self.running:
+            return
+        self.running = True
+        self._due_us = None
+        if Timer is not None:
+            try:
+                self._timer = Timer(self.timer_id)
+                self._timer.init(period=self.period_ms, mode=Timer.PERIODIC, callback=self._timer_cb)
+                return
+            except Exception as e:
+                _log.warning("Hardware timer unavailable (%s), using a thread", e)
+                self._timer = None
+        if _thread is None:
+            self.running = False
+            raise RuntimeError("No timer or thread available for acquisition")
+        # A loop of a previous start() may still be sleeping: the new
+        # generation makes it exit instead of ticking along with this one
+        self._generation += 1
+        _thread.start_new_thread(self._thread_loop, (self._generation,))
+    
+    def stop(self):
+        """Stop sampling"""
+        self.running = False
+        self._generation += 1
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+    
+    def _timer_cb(self, timer):
+        self._tick()
+    
+    def _thread_loop(self, generation):
+        while generation == self._generation:
+            # Same schedule as the jitter statistics (kept by _tick)
+            if self._due_us is not None:
+                wait = ticks_diff(self._due_us, ticks_us())
+                if wait > 0:
+                    sleep_us(wait)
+                    if generation != self._generation:
+                        break  # stopped (or restarted) while sleeping
+            self._tick()
+    
+    def _tick(self):
+        """Account for the tick timing and sample (timer or thread context)"""
+        now_us = ticks_us()
+        self.ticks += 1
+        period_us = self.period_ms * 1000
+        if self._due_us is not None:
+            late = ticks_diff(now_us, self._due_us)
+            if late >= period_us:
+                skipped = late // period_us
+                self.missed += skipped
+                late -= skipped * period_us
+                self._due_us = ticks_add(self._due_us, skipped * period_us)
+            if late < 0:
+                late = -late
+            self._jitter_total_us += late
+            if late > self.jitter_max_us:
+                self.jitter_max_us = late
+            self._due_us = ticks_add(self._due_us, period_us)
+        else:
+            self._due_us = ticks_add(now_us, period_us)
+        
+        self._sample()
+    
+    def _sample(self):
+        """Read one sample into the ring"""
+        value = self.read()
+        if value is None:
+            self.errors += 1
+            return
+        self.ring.push(ticks_ms(), value)
+        self.samples += 1
+    
+    def cursor(self):
+        """New consumer of the samples"""
+        return self.ring.cursor()
+    
+    def stats(self):
+        """
+        Acquisition statistics
+        
+        Returns:
+            Dict with samples, errors, missed periods, mean and max jitter (µs)
+        """
+        return {
+            'samples': self.samples,
+            'errors': self.errors,
+            'missed': self.missed,
+            'jitter_avg_us': self._jitter_total_us // self.ticks if self.ticks else 0,
+            'jitter_max_us': self.jitter_max_us,
+        }
+
+
+class Channel:
+    """One sensor of a SensorScheduler, with its own ring buffer"""
+    
+    def __init__(self, name, read, size=128, min_interval_ms=0):
+        """
+        Initialize the channel
+        
+        Args:
+            name: Channel name (e.g. 'bucket', 'hops', 'keg')
+            read: Function returning a raw sensor value, or None on error
+            size: Ring buffer size (samples)
+            min_interval_ms: Minimum time between two reads (ADC conversion
+                period: reading faster only returns the same value again)
+        """
+        self.name = name
+        self.read = read
+        self.ring = SampleRing(size)
+        self.min_interval_us = min_interval_ms * 1000
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Clear the channel statistics"""
+        self.samples = 0
+        self.errors = 0
+        self.max_gap_us = 0  # longest time between two reads
+        self.last_us = None
+        self._since_us = ticks_us()
+    
+    def cursor(self):
+        """New consumer of the channel samples"""
+        return self.ring.cursor()
+    
+    def stats(self):
+        """Samples, errors, rate (Hz) and longest gap between reads (ms)"""
+        elapsed_us = ticks_diff(ticks_us(), self._since_us)
+        return {
+            'samples': self.samples,
+            'errors': self.errors,
+            'rate_hz': round(self.samples * 1000000 / elapsed_us, 1) if elapsed_us > 0 else 0,
+            'max_gap_ms': self.max_gap_us // 1000,
+        }
+
+
+class SensorScheduler(Acquisition):
+    """
+    Round-robin sampling of several sensors sharing the controller
+    
+    Each tick makes a single bus transaction: among the channels whose
+    minimum interval has elapsed, the one read longest ago is read. Reads
+    are never spent on a sensor that has no new conversion, so the other
+    channels use that time (higher aggregate rate), and a ready channel
+    always becomes the oldest one eventually (no starvation).
+    """
+    
+    def __init__(self, period_ms=2, timer_id=0):
+        """
+        Initialize the scheduler (not started)
+        
+        Args:
+            period_ms: Tick period (one read per tick at most)
+            timer_id: Hardware timer used when machine.Timer is available
+        """
+        self.channels = []
+        super().__init__(None, period_ms, 1, timer_id)
+    
+    def reset_stats(self):
+        """Clear the scheduler and channel statistics"""
+        super().reset_stats()
+        self.idle = 0  # ticks with no channel ready
+        for channel in self.channels:
+            channel.reset_stats()
+    
+    def add_channel(self, name, read, size=128, min_interval_ms=0):
+        """
+        Add a sensor (see Channel)
+        
+        Returns:
+            The new Channel
+        """
+        channel = Channel(name, read, size, min_interval_ms)
+        self.channels.append(channel)
+        return channel
+    
+    def channel(self, name):
+        """Channel by name, None if unknown"""
+        for channel in self.channels:
+            if channel.name == name:
+                return channel
+        return None
+    
+    def _sample(self):
+        """Read the ready channel that waited longest"""
+        now_us = ticks_us()
+        best = None
+        best_wait = -1
+        for channel in self.channels:
+            if channel.last_us is None:
+                wait = 1 << 29  # never read: first in line
+            else:
+                wait = ticks_diff(now_us, channel.last_us)
+            if wait >= channel.min_interval_us and wait > best_wait:
+                best = channel
+                best_wait = wait
+        
+        if best is None:
+            self.idle += 1
+            return
+        
+        if best.last_us is not None and best_wait > best.max_gap_us:
+            best.max_gap_us = best_wait
+        best.last_us = now_us
+        value = best.read()
+        if value is None:
+            best.errors += 1
+            self.errors += 1
+            return
+        best.ring.push(ticks_ms(), value)
+        best.samples += 1
+        self.samples += 1
+    
+    def cursor(self, name=None):
+        """New consumer of a channel (the first one by default)"""
+        channel = self.channel(name) if name else self.channels[0]
+        return channel.cursor()
+    
+    def stats(self):
+        """
+        Scheduler statistics
+        
+        Returns:
+            Dict of Acquisition.stats() plus idle ticks and per-channel
+            statistics under 'channels' (see Channel.stats())
+        """
+        stats = super().stats()
+        stats['idle'] = self.idle
+        stats['channels'] = {channel.name: channel.stats() for channel in self.channels}
+        return stats
@@ -3,4 +3,10 @@ Brewing Software API for UIFlow2.0
 """
 
 from brewing_software_api import BrewingSoftwareAPI, Batch, Malt, Hop
+from brewing_software_api import BrewingAPIError, APIConnectionError, APITimeoutError, APIHTTPError, APIAuthError, CircuitOpenError
 from brewfather_api import BrewfatherAPI
+from http_session import HTTPSession
+from recipe_store import RecipeStore
+from prefetcher import RecipePrefetcher
+from resilience import RetryPolicy, CircuitBreaker
+from snapshot_store import SnapshotStore, SnapshotAPI
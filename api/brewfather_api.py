@@ -3,27 +3,34 @@ Brewfather API Implementation
 For UIFlow2.0 / MicroPython on M5Stack
 """
 
-import requests
 import binascii
-import json
-from brewing_software_api import BrewingSoftwareAPI, Batch, Malt, Hop
+from brewing_software_api import BrewingSoftwareAPI, Batch, Malt, Hop, BrewingAPIError, APIHTTPError, APIAuthError, get_logger
+from http_session import HTTPSession
+from resilience import RetryPolicy, CircuitBreaker
+
+_log = get_logger('brewfather')
 
 
 class BrewfatherAPI(BrewingSoftwareAPI):
     """Implementation of BrewingSoftwareAPI for Brewfather"""
     
     BASE_URL = "https://api.brewfather.app/v2"
+    PAGE_SIZE = 50  # Maximum page size allowed by the Brewfather API
     
-    def __init__(self, user_id, api_key):
+    def __init__(self, user_id, api_key, base_url=None, timeout_ms=8000, retry=None):
         """
         Initialize Brewfather API client
         
         Args:
             user_id: Brewfather user ID
             api_key: Brewfather API key
+            base_url: Override BASE_URL (e.g. a local stand-in server)
+            timeout_ms: Deadline of a single HTTP request
+            retry: RetryPolicy (default: 3 attempts, 20 s per call, circuit breaker)
         """
         self.user_id = user_id
         self.api_key = api_key
+        self.base_url = base_url
         # Create Basic Auth header
         credentials = f"{user_id}:{api_key}"
         b64_credentials = binascii.b2a_base64(credentials.encode()).decode().strip()
@@ -31,40 +38,81 @@ class BrewfatherAPI(BrewingSoftwareAPI):
             'Authorization': f'Basic {b64_credentials}',
             'Content-Type': 'application/json'
         }
+        # Keep-alive session: one TLS handshake shared by all calls
+        self.session = HTTPSession(base_url or self.BASE_URL, headers=self.headers, timeout_ms=timeout_ms)
+        self.retry = retry or RetryPolicy(breaker=CircuitBreaker())
+    
+    def close(self):
+        """Close the persistent connection to Brewfather"""
+        self.session.close()
+    
+    def clone(self):
+        """
+        Same client on a connection of its own (e.g. for a background thread)
+        
+        The retry policy and its circuit breaker are shared: both clients
+        talk to the same server.
+        """
+        return BrewfatherAPI(self.user_id, self.api_key, self.base_url, self.session.timeout_ms, self.retry)
     
     def get_batches(self):
         """
         Retrieve all batches from Brewfather
         
+        Follows pagination until the last page (see iter_batches()).
+        
         Returns:
             List[Batch]: List of batches with batch_id and name (recipe name)
+        
+        Raises:
+            BrewingAPIError: Network, timeout, HTTP or circuit breaker error
         """
-        try:
-            response = requests.get(f"{self.BASE_URL}/batches?status=Planning&include=_id", headers=self.headers)
-            
-            if response.status_code != 200:
-                print(f"Error: HTTP {response.status_code}")
-                response.close()
-                return []
-            
-            batches_data = response.json()
-            response.close()
-            
-            batches = []
-            for batch_data in batches_data:
-                recipe = batch_data.get('recipe', {})
-                recipe_name = recipe.get('name', 'Unknown Recipe')
-                batch = Batch(
-                    batch_id=batch_data.get('_id', ''),
-                    name=recipe_name
-                )
-                batches.append(batch)
-            
-            return batches
+        return list(self.iter_batches())
+    
+    def iter_batches(self, page_size=None):
+        """
+        Lazily iterate over planned batches, one page request at a time
+        
+        The next page is only requested once the previous one has been
+        consumed, so a menu can show the first batches immediately.
+        
+        Args:
+            page_size: Batches per request (default PAGE_SIZE, Brewfather max 50)
             
-        except Exception as e:
-            print(f"Error: {e}")
-            return []
+        Yields:
+            Batch: Batches with batch_id and name (recipe name)
+        """
+        query = "status=Planning&include=_timestamp_ms"
+        for batch_data in self._iter_pages(query, '_id', page_size):
+            yield self._parse_batch(batch_data)
+    
+    def iter_batches_modified_since(self, since_ms, page_size=None):
+        """
+        Iterate over batches modified after a timestamp, newest first
+        
+        Batches of every status are returned so that a batch leaving the
+        Planning status is seen as a change. A full listing of planned
+        batches is returned when since_ms is 0.
+        
+        Args:
+            since_ms: Modification timestamp (ms) of the last sync
+            page_size: Batches per request (default PAGE_SIZE)
+        
+        Yields:
+            Batch: Changed batches with modified timestamp and status
+        """
+        if not since_ms:
+            for batch in self.iter_batches(page_size):
+                yield batch
+            return
+        
+        query = "include=_timestamp_ms,status&order_by=_timestamp_ms&order_by_direction=desc"
+        for batch_data in self._iter_pages(query, '_timestamp_ms', page_size, descending=True):
+            batch = self._parse_batch(batch_data)
+            # Sorted newest first: everything after this one is already known
+            if batch.modified <= since_ms:
+                return
+            yield batch
     
     def get_malts(self, batch_id):
         """
@@ -72,40 +120,11 @@ class BrewfatherAPI(BrewingSoftwareAPI):
         
         Args:
             batch_id: The unique identifier of the batch
-            
+        
         Returns:
             List[Malt]: List of malts with name, EBC and amount
         """
-        try:
-            response = requests.get(f"{self.BASE_URL}/batches/{batch_id}?include=recipe.fermentables", headers=self.headers)
-            
-            if response.status_code != 200:
-                print(f"Error: HTTP {response.status_code}")
-                response.close()
-                return []
-            
-            batch_data = response.json()
-            response.close()
-            
-            recipe = batch_data.get('recipe', {})
-            fermentables = recipe.get('fermentables', [])
-            
-            malts = []
-            for fermentable in fermentables:
-                # Filter only malts/grains (exclude sugars, extracts, etc.)
-                if fermentable.get('type') in ['Grain', 'Malt']:
-                    malt = Malt(
-                        name=fermentable.get('name', 'Unknown Malt'),
-                        ebc=fermentable.get('color', 0.0),
-                        amount=fermentable.get('amount', 0.0)
-                    )
-                    malts.append(malt)
-            
-            return malts
-            
-        except Exception as e:
-            print(f"Error: {e}")
-            return []
+        return self._parse_malts(self._get_recipe(batch_id, "recipe.fermentables"))
     
     def get_hops(self, batch_id):
         """
@@ -113,36 +132,149 @@ class BrewfatherAPI(BrewingSoftwareAPI):
         
         Args:
             batch_id: The unique identifier of the batch
-            
+        
         Returns:
             List[Hop]: List of hops with name, amount, use and time
         """
-        try:
-            response = requests.get(f"{self.BASE_URL}/batches/{batch_id}?include=recipe.hops", headers=self.headers)
+        return self._parse_hops(self._get_recipe(batch_id, "recipe.hops"))
+    
+    def get_ingredients(self, batch_id):
+        """
+        Retrieve malts and hops of a batch with a single request
+        
+        Args:
+            batch_id: The unique identifier of the batch
+        
+        Returns:
+            Tuple (List[Malt], List[Hop])
+        """
+        recipe = self._get_recipe(batch_id, "recipe.fermentables,recipe.hops")
+        return self._parse_malts(recipe), self._parse_hops(recipe)
+    
+    def _iter_pages(self, query, order_key, page_size=None, descending=False):
+        """
+        Yield raw batch dicts from /batches, following pagination
+        
+        start_after only takes a value of the order field. Unless it is
+        the unique _id, batches sharing the last value of a page could
+        continue on the next page after it: the next page starts at that
+        value again and the batches already yielded are skipped by _id
+        (fewer than page_size batches may share a value).
+        
+        Args:
+            query: Query string without limit/start_after
+            order_key: Field the results are ordered by (used for start_after)
+            page_size: Batches per request (default PAGE_SIZE)
+            descending: The query orders by a numeric order_key, descending
+        """
+        page_size = page_size or self.PAGE_SIZE
+        start_after = None
+        yielded = ()  # ids of the previous page at its last order value
+        
+        while True:
+            path = f"/batches?{query}&limit={page_size}"
+            if start_after is not None:
+                path += f"&start_after={start_after}"
             
-            if response.status_code != 200:
-                print(f"Error: HTTP {response.status_code}")
-                response.close()
-                return []
+            batches_data = self._get_json(path)
             
-            batch_data = response.json()
-            response.close()
+            for batch_data in batches_data:
+                if batch_data.get('_id') not in yielded:
+                    yield batch_data
             
-            recipe = batch_data.get('recipe', {})
-            hops_data = recipe.get('hops', [])
+            # A short page is the last one
+            if len(batches_data) < page_size:
+                return
+            last = batches_data[-1].get(order_key)
+            if order_key == '_id':
+                start_after = last
+                continue
+            yielded = [b.get('_id') for b in batches_data if b.get(order_key) == last]
+            if len(yielded) == len(batches_data):
+                # A whole page on one value: the rest of it cannot be reached
+                _log.warning("%d batches or more at %s=%s, some are skipped", page_size, order_key, last)
+                start_after = last
+                yielded = ()
+            else:
+                # Just past the value, so that it is listed again
+                start_after = last + 1 if descending else last - 1
+    
+    def _get_recipe(self, batch_id, include):
+        """
+        Fetch the recipe part of a batch
+        
+        Args:
+            batch_id: The unique identifier of the batch
+            include: Comma-separated recipe fields to include
             
-            hops = []
-            for hop_data in hops_data:
-                hop = Hop(
-                    name=hop_data.get('name', 'Unknown Hop'),
-                    amount=hop_data.get('amount', 0.0),
-                    use=hop_data.get('use', ''),
-                    time=hop_data.get('time', 0)
-                )
-                hops.append(hop)
+        Returns:
+            Recipe dict
+        """
+        return self._get_json(f"/batches/{batch_id}?include={include}").get('recipe', {})
+    
+    def _get_json(self, path):
+        """
+        GET a path and decode the JSON body, with deadline, retries and circuit breaker
+        
+        Args:
+            path: Path relative to BASE_URL, including the query string
             
-            return hops
+        Returns:
+            Decoded JSON (dict or list)
             
-        except Exception as e:
-            print(f"Error: {e}")
-            return []
+        Raises:
+            BrewingAPIError: See RetryPolicy.call()
+        """
+        def attempt(timeout_ms):
+            response = self.session.get(path, timeout_ms=min(timeout_ms, self.session.timeout_ms))
+            _log.debug("GET %s: HTTP %d", path, response.status_code)
+            if response.status_code in (401, 403):
+                raise APIAuthError(response.status_code, "Brewfather credentials rejected")
+            if response.status_code != 200:
+                raise APIHTTPError(response.status_code)
+            try:
+                return response.json()
+            except ValueError:
+                raise BrewingAPIError("Invalid JSON response")
+        
+        return self.retry.call(attempt)
+    
+    @staticmethod
+    def _parse_batch(batch_data):
+        """Build a Batch from a Brewfather batch dict"""
+        recipe = batch_data.get('recipe', {})
+        return Batch(
+            batch_id=batch_data.get('_id', ''),
+            name=recipe.get('name', 'Unknown Recipe'),
+            modified=batch_data.get('_timestamp_ms', 0),
+            status=batch_data.get('status', 'Planning')
+        )
+    
+    @staticmethod
+    def _parse_malts(recipe):
+        """Build the Malt list from a Brewfather recipe dict"""
+        malts = []
+        for fermentable in recipe.get('fermentables', []):
+            # Filter only malts/grains (exclude sugars, extracts, etc.)
+            if fermentable.get('type') in ['Grain', 'Malt']:
+                malt = Malt(
+                    name=fermentable.get('name', 'Unknown Malt'),
+                    ebc=fermentable.get('color', 0.0),
+                    amount=fermentable.get('amount', 0.0)
+                )
+                malts.append(malt)
+        return malts
+    
+    @staticmethod
+    def _parse_hops(recipe):
+        """Build the Hop list from a Brewfather recipe dict"""
+        hops = []
+        for hop_data in recipe.get('hops', []):
+            hop = Hop(
+                name=hop_data.get('name', 'Unknown Hop'),
+                amount=hop_data.get('amount', 0.0),
+                use=hop_data.get('use', ''),
+                time=hop_data.get('time', 0)
+            )
+            hops.append(hop)
+        return hops
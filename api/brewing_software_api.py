@@ -3,12 +3,70 @@ Brewing Software API Interface
 For UIFlow2.0 / MicroPython on M5Stack
 """
 
+try:
+    # Buffered logging of the application (log.py, one level up)
+    from log import get_logger
+except ImportError:
+    # API used on its own: print warnings and errors straight away
+    class _PrintLogger:
+        def __init__(self, name):
+            self.name = name
+        
+        def debug(self, message, *args):
+            pass
+        
+        info = debug
+        
+        def warning(self, message, *args):
+            print(f"{self.name}: {message % args if args else message}")
+        
+        error = warning
+    
+    def get_logger(name):
+        return _PrintLogger(name)
+
+
+class BrewingAPIError(Exception):
+    """Base class for errors raised by brewing software API clients"""
+    pass
+
+
+class APIConnectionError(BrewingAPIError):
+    """Network error: no route, connection refused or reset, bad response"""
+    pass
+
+
+class APITimeoutError(APIConnectionError):
+    """The call did not complete before its deadline"""
+    pass
+
+
+class APIHTTPError(BrewingAPIError):
+    """The server answered with an unexpected HTTP status"""
+    def __init__(self, status_code, message=None):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class APIAuthError(APIHTTPError):
+    """Credentials rejected (HTTP 401/403)"""
+    pass
+
+
+class CircuitOpenError(BrewingAPIError):
+    """Calls are short-circuited after repeated failures"""
+    def __init__(self, retry_in_ms):
+        super().__init__(f"Circuit open, retry in {retry_in_ms} ms")
+        self.retry_in_ms = retry_in_ms
+
 
 class Batch:
     """Represents a brewing batch"""
-    def __init__(self, batch_id, name):
+    def __init__(self, batch_id, name, modified=0, status='Planning'):
         self.batch_id = batch_id
         self.name = name
+        self.modified = modified  # last modification timestamp (ms), 0 if unknown
+        self.status = status  # Planning, Brewing, Completed, etc.
     
     def __repr__(self):
         return f"Batch(batch_id='{self.batch_id}', name='{self.name}')"
@@ -49,6 +107,22 @@ class BrewingSoftwareAPI:
         """
         raise NotImplementedError("Subclass must implement get_batches()")
     
+    def iter_batches(self, page_size=None):
+        """
+        Lazily iterate over batches
+        
+        Platforms with paginated results override this to fetch pages on
+        demand. The default implementation iterates over get_batches().
+        
+        Args:
+            page_size: Number of batches fetched per request (if paginated)
+        
+        Yields:
+            Batch: Batches with batch_id and name
+        """
+        for batch in self.get_batches():
+            yield batch
+    
     def get_malts(self, batch_id):
         """
         Retrieve malts/grains for a specific batch
@@ -72,3 +146,49 @@ class BrewingSoftwareAPI:
             List[Hop]: List of hops with name, amount, use and time
         """
         raise NotImplementedError("Subclass must implement get_hops()")
+    
+    def get_ingredients(self, batch_id):
+        """
+        Retrieve malts and hops for a specific batch
+        
+        Platforms able to return both in one request should override this.
+        
+        Args:
+            batch_id: The unique identifier of the batch
+        
+        Returns:
+            Tuple (List[Malt], List[Hop])
+        """
+        return self.get_malts(batch_id), self.get_hops(batch_id)
+    
+    def iter_batches_modified_since(self, since_ms, page_size=None):
+        """
+        Iterate over batches modified after a timestamp (used for delta sync)
+        
+        Platforms without modification timestamps keep this default, which
+        returns every batch: a sync is then a full listing, but recipes of
+        unchanged batches are still not refetched.
+        
+        Args:
+            since_ms: Modification timestamp (ms) of the last sync, 0 for all
+            page_size: Number of batches fetched per request (if paginated)
+        
+        Yields:
+            Batch: Batches modified after since_ms
+        """
+        for batch in self.iter_batches(page_size):
+            yield batch
+    
+    def close(self):
+        """
+        Release resources held by the client (open connections, files)
+        
+        Safe to call several times. The default implementation does nothing.
+        """
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
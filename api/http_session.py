@@ -0,0 +1,367 @@
+"""
+Persistent HTTP/1.1 session for UIFlow2.0 / MicroPython on M5Stack
+Keeps the TCP/TLS connection open between requests (keep-alive)
+"""
+
+import socket
+import errno
+import json
+import time
+from brewing_software_api import APIConnectionError, APITimeoutError
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_add = time.ticks_add
+    ticks_diff = time.ticks_diff
+    sleep_ms = time.sleep_ms
+except AttributeError:
+    # CPython fallback (host-side testing)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_add(ticks, delta):
+        return ticks + delta
+    
+    def ticks_diff(end, start):
+        return end - start
+
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+
+def _is_timeout(error):
+    """True if an OSError comes from a socket timeout (CPython or MicroPython)"""
+    if type(error).__name__ in ('timeout', 'TimeoutError'):
+        return True
+    return bool(error.args) and error.args[0] in (errno.ETIMEDOUT, errno.EAGAIN)
+
+
+class HTTPResponse:
+    """Response returned by HTTPSession (same surface as requests' Response)"""
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+    
+    @property
+    def text(self):
+        return self.content.decode()
+    
+    def json(self):
+        return json.loads(self.content)
+    
+    def close(self):
+        """Body is already read, the connection stays with the session"""
+        pass
+    
+    def __repr__(self):
+        return f"HTTPResponse(status_code={self.status_code}, length={len(self.content)})"
+
+
+class HTTPSession:
+    """
+    Minimal HTTP/1.1 client reusing a single connection
+    
+    Every `requests.get` call opens a new socket and, for HTTPS, pays a full
+    TLS handshake. The session keeps the socket open and only reconnects when
+    the server closes it.
+    
+    Requests from several threads are serialized: one request at a time is
+    written and read on the connection, the others wait for it.
+    """
+    
+    def __init__(self, base_url, headers=None, timeout_ms=10000):
+        """
+        Initialize the session (no connection is opened yet)
+        
+        Args:
+            base_url: Base URL, e.g. "https://api.brewfather.app/v2"
+            headers: Headers sent with every request
+            timeout_ms: Default deadline of a request (connect + response)
+        """
+        self.scheme, self.host, self.port, self.base_path = self._parse_url(base_url)
+        self.headers = headers or {}
+        self.timeout_ms = timeout_ms
+        self._deadline = 0
+        
+        # Shared header block, built once
+        lines = [f"Host: {self.host}", "Connection: keep-alive"]
+        for name, value in self.headers.items():
+            lines.append(f"{name}: {value}")
+        self._header_block = ("\r\n".join(lines) + "\r\n").encode()
+        
+        self._sock = None
+        self._stream = None
+        self._address = None  # resolved once, see _resolve()
+        self._lookup = None  # [address, error, done] of the lookup in progress
+        self._lock = _thread.allocate_lock() if _thread else None
+        
+        # Statistics
+        self.connect_count = 0
+        self.request_count = 0
+        self.last_latency_ms = 0
+        self.total_latency_ms = 0
+    
+    @staticmethod
+    def _parse_url(url):
+        """Split a base URL into (scheme, host, port, path)"""
+        scheme, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        if ":" in host:
+            host, port = host.split(":", 1)
+            port = int(port)
+        else:
+            port = 443 if scheme == "https" else 80
+        path = "/" + path if path else ""
+        return scheme, host, port, path.rstrip("/")
+    
+    def _arm_timeout(self, sock=None):
+        """Limit the next socket operation to the time left before the deadline"""
+        remaining = ticks_diff(self._deadline, ticks_ms())
+        if remaining <= 0:
+            raise APITimeoutError("Request deadline exceeded")
+        (sock or self._sock).settimeout(remaining / 1000)
+    
+    def _resolve(self):
+        """
+        Address of the server, resolved on first use
+        
+        getaddrinfo() cannot be given a timeout, so the lookup runs in a
+        thread of its own and the request only waits for it until its
+        deadline. A lookup still running then is not abandoned: the next
+        request waits for the same one. The address is kept so that
+        reconnections skip the DNS lookup; a failed connection forgets it
+        (the address may have changed). Without _thread, the lookup blocks
+        up to the resolver's own timeout.
+        """
+        if self._address is not None:
+            return self._address
+        if ticks_diff(self._deadline, ticks_ms()) <= 0:
+            raise APITimeoutError("Request deadline exceeded")
+        if _thread is None:
+            self._address = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+            return self._address
+        
+        lookup = self._lookup
+        if lookup is None:
+            lookup = self._lookup = [None, None, False]
+            _thread.start_new_thread(self._lookup_worker, (lookup,))
+        while not lookup[2]:
+            if ticks_diff(self._deadline, ticks_ms()) <= 0:
+                raise APITimeoutError(f"DNS lookup timed out: {self.host}")
+            sleep_ms(10)
+        self._lookup = None
+        if lookup[1] is not None:
+            raise lookup[1]
+        self._address = lookup[0]
+        return self._address
+    
+    def _lookup_worker(self, lookup):
+        """Thread: resolve the host into `lookup` ([address, error, done])"""
+        try:
+            lookup[0] = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+        except Exception as e:
+            lookup[1] = e
+        lookup[2] = True
+    
+    def _connect(self):
+        """Open the TCP connection (and TLS layer for https)"""
+        addr_info = self._resolve()
+        sock = socket.socket(addr_info[0], socket.SOCK_STREAM, addr_info[2])
+        try:
+            # Raises APITimeoutError if resolving used up the deadline
+            self._arm_timeout(sock)
+            sock.connect(addr_info[-1])
+            if self.scheme == "https":
+                if hasattr(ssl, "create_default_context"):
+                    sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+                else:
+                    sock = ssl.wrap_socket(sock, server_hostname=self.host)
+        except Exception as e:
+            sock.close()
+            if not isinstance(e, APITimeoutError):
+                self._address = None
+            raise
+        
+        self._sock = sock
+        # CPython sockets need a file object for readline(), MicroPython streams don't
+        self._stream = sock.makefile("rb") if hasattr(sock, "makefile") else sock
+        self.connect_count += 1
+    
+    def _write(self, data):
+        if hasattr(self._sock, "sendall"):
+            self._sock.sendall(data)
+        else:
+            self._sock.write(data)
+    
+    def _read_exact(self, length):
+        """Read exactly `length` bytes from the connection"""
+        chunks = []
+        while length > 0:
+            self._arm_timeout()
+            chunk = self._stream.read(length)
+            if not chunk:
+                raise OSError("Connection closed by server")
+            chunks.append(chunk)
+            length -= len(chunk)
+        return b"".join(chunks)
+    
+    def _read_chunked(self):
+        """Read a body sent with Transfer-Encoding: chunked"""
+        chunks = []
+        while True:
+            self._arm_timeout()
+            size_line = self._stream.readline()
+            if not size_line:
+                raise OSError("Connection closed by server")
+            size = int(size_line.split(b";")[0].strip(), 16)
+            if size == 0:
+                # Skip trailers up to the final empty line
+                while self._stream.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(self._read_exact(size))
+            self._stream.readline()  # CRLF after each chunk
+    
+    def _read_response(self):
+        """Read status line, headers and body of one response"""
+        self._arm_timeout()
+        status_line = self._stream.readline()
+        if not status_line:
+            raise OSError("Connection closed by server")
+        try:
+            status_code = int(status_line.split(None, 2)[1])
+        except (IndexError, ValueError):
+            raise APIConnectionError(f"Malformed status line: {status_line[:40]}")
+        
+        headers = {}
+        while True:
+            line = self._stream.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            content = self._read_chunked()
+        elif "content-length" in headers:
+            content = self._read_exact(int(headers["content-length"]))
+        else:
+            # No framing: body ends when the server closes the connection
+            self._arm_timeout()
+            content = self._stream.read()
+            keep_alive = False
+        
+        return HTTPResponse(status_code, headers, content), keep_alive
+    
+    def request(self, method, path, body=None, timeout_ms=None):
+        """
+        Send a request over the persistent connection
+        
+        Args:
+            method: HTTP method ("GET", "POST", ...)
+            path: Path relative to the base URL, including the query string
+            body: Optional request body (str or bytes)
+            timeout_ms: Deadline for this request (default self.timeout_ms)
+        
+        Returns:
+            HTTPResponse
+        
+        Raises:
+            APITimeoutError: The deadline expired
+            APIConnectionError: Connection failed or was closed
+        """
+        if self._lock:
+            self._lock.acquire()
+        try:
+            return self._request(method, path, body, timeout_ms)
+        finally:
+            if self._lock:
+                self._lock.release()
+    
+    def _request(self, method, path, body, timeout_ms):
+        """request() with the connection held"""
+        if isinstance(body, str):
+            body = body.encode()
+        request_head = f"{method} {self.base_path}{path} HTTP/1.1\r\n".encode()
+        if body:
+            request_head += f"Content-Length: {len(body)}\r\n".encode()
+        
+        start = ticks_ms()
+        self._deadline = ticks_add(start, timeout_ms or self.timeout_ms)
+        # A reused socket may have been closed by the server while idle:
+        # in that case retry once on a fresh connection
+        for attempt in range(2):
+            reused = self._sock is not None
+            try:
+                if not reused:
+                    self._connect()
+                self._arm_timeout()
+                self._write(request_head + self._header_block + b"\r\n" + (body or b""))
+                response, keep_alive = self._read_response()
+                break
+            except APIConnectionError:
+                self.close()
+                raise
+            except OSError as e:
+                self.close()
+                if _is_timeout(e):
+                    raise APITimeoutError(f"Timeout: {self.host}")
+                if reused and attempt == 0:
+                    continue
+                raise APIConnectionError(f"Connection error: {e}")
+        
+        if not keep_alive:
+            self.close()
+        
+        self.request_count += 1
+        self.last_latency_ms = ticks_diff(ticks_ms(), start)
+        self.total_latency_ms += self.last_latency_ms
+        return response
+    
+    def get(self, path, timeout_ms=None):
+        """Send a GET request (see request())"""
+        return self.request("GET", path, timeout_ms=timeout_ms)
+    
+    def close(self):
+        """Close the connection, the next request will reconnect"""
+        if self._sock is not None:
+            try:
+                if self._stream is not self._sock:
+                    self._stream.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
+    
+    def stats(self):
+        """
+        Connection statistics
+        
+        Returns:
+            dict with handshakes (connections opened), requests and latencies in ms
+        """
+        return {
+            'handshakes': self.connect_count,
+            'requests': self.request_count,
+            'last_latency_ms': self.last_latency_ms,
+            'avg_latency_ms': self.total_latency_ms // self.request_count if self.request_count else 0,
+        }
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -8,9 +8,13 @@ sys.path.append('..')  # Access config.py from parent directory
 
 from config import BREWFATHER_USER_ID, BREWFATHER_API_KEY
 from brewfather_api import BrewfatherAPI
+from prefetcher import RecipePrefetcher
+from brewing_software_api import BrewingAPIError, APIAuthError, CircuitOpenError
 import network
 import time
 
+MENU_ROWS = 8  # batches shown per screen
+
 
 def connect_wifi(ssid, password):
     """Connect to WiFi"""
@@ -55,19 +59,44 @@ def main():
     print("\nInitializing API...")
     api = BrewfatherAPI(BREWFATHER_USER_ID, BREWFATHER_API_KEY)
     
-    # Get batches
+    # Get the first screen of batches: the next page is only requested
+    # when the list is scrolled past it
     print("Fetching batches...")
-    batches = api.get_batches()
+    pages = api.iter_batches(page_size=MENU_ROWS)
+    batches = []
+    try:
+        for batch in pages:
+            batches.append(batch)
+            if len(batches) == MENU_ROWS:
+                break
+    except APIAuthError:
+        print("Check credentials in config.py")
+        return
+    except CircuitOpenError as e:
+        print(f"Brewfather unreachable, retry in {e.retry_in_ms // 1000} s")
+        return
+    except BrewingAPIError as e:
+        print(f"Network error: {e}")
+        return
     
     if not batches:
-        print("No batches found or error occurred")
+        print("No batches found")
         return
     
-    print(f"\nFound {len(batches)} batches:\n")
+    # Fetch the recipes of the first batches while the list is displayed
+    prefetcher = RecipePrefetcher(api, count=3)
+    prefetcher.start(batches)
     
-    # Display all batches
+    # Display the first screen, then scroll through the rest
+    print("\nBatches:\n")
     for i, batch in enumerate(batches, 1):
         print(f"{i}. {batch.name}")
+    try:
+        for batch in pages:
+            batches.append(batch)
+            print(f"{len(batches)}. {batch.name}")
+    except BrewingAPIError as e:
+        print(f"Could not list more batches: {e}")
     
     # Get details for first batch
     if batches:
@@ -76,9 +105,9 @@ def main():
         print(f"Details: {first_batch.name}")
         print("="*50 + "\n")
         
-        # Get malts
+        # Get the ingredients (prefetched while the list was displayed)
+        malts, hops = prefetcher.select(first_batch.batch_id)
         print("Malts/Grains:")
-        malts = api.get_malts(first_batch.batch_id)
         
         if malts:
             total = 0
@@ -92,7 +121,6 @@ def main():
         
         # Get hops
         print("\nHops:")
-        hops = api.get_hops(first_batch.batch_id)
         
         if hops:
             for hop in hops:
@@ -103,6 +131,13 @@ def main():
             print("  No hops")
         
         print("\n" + "="*50 + "\n")
+    
+    # Connection reuse report
+    stats = api.session.stats()
+    print(f"HTTP: {stats['requests']} requests, {stats['handshakes']} handshake(s)")
+    print(f"Latency: last {stats['last_latency_ms']} ms, avg {stats['avg_latency_ms']} ms")
+    print(f"Prefetch: {prefetcher.hits} hit(s), {prefetcher.misses} miss(es)")
+    api.close()
 
 
 # Run the example
@@ -0,0 +1,213 @@
+"""
+Background prefetch of recipe ingredients
+For UIFlow2.0 / MicroPython on M5Stack
+"""
+
+import gc
+import _thread
+from brewing_software_api import get_logger
+
+_log = get_logger('prefetch')
+
+
+class RecipePrefetcher:
+    """
+    Fetch ingredients of the most likely batches while the user browses
+    
+    Once the batch list is displayed, start() queues the first batches (or
+    the most recently modified ones) and a single background worker fetches
+    their ingredients. select() cancels what is still queued and returns the
+    ingredients of the chosen batch, usually without any network round trip.
+    
+    The worker uses a client of its own when the API can clone() itself
+    (BrewfatherAPI: a second connection), so select() of a batch that is not
+    being prefetched never waits for the prefetch in flight. Otherwise the
+    client is shared and its HTTPSession serializes the requests.
+    """
+    
+    def __init__(self, api, count=3, max_items=5, min_free_bytes=30000, by_modified=False):
+        """
+        Initialize the prefetcher
+        
+        Args:
+            api: BrewingSoftwareAPI used to fetch ingredients
+            count: Number of batches to prefetch after start()
+            max_items: Maximum number of recipes kept in memory (least
+                       recently used ones are dropped)
+            min_free_bytes: Stop prefetching below this free heap (MicroPython)
+            by_modified: Prefetch the most recently modified batches first
+                         instead of the first ones of the list
+        """
+        self.api = api
+        self.count = count
+        self.max_items = max_items
+        self.min_free_bytes = min_free_bytes
+        self.by_modified = by_modified
+        self._worker_api = None  # created with the first worker
+        self.mem_free = getattr(gc, 'mem_free', None)  # free heap (MicroPython only)
+        
+        self._cache = {}  # batch_id -> (malts, hops)
+        self._lru = []  # batch ids of _cache, least recently used first
+        self._queue = []
+        self._in_flight = None  # batch id fetched by the worker
+        self._fetch_lock = _thread.allocate_lock()  # held by the worker while fetching
+        self._state_lock = _thread.allocate_lock()
+        self._worker_running = False
+        
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.evicted = 0
+    
+    def start(self, batches):
+        """
+        Queue the most likely batches and start the background worker
+        
+        Args:
+            batches: List[Batch] currently displayed
+        """
+        if self.by_modified:
+            batches = sorted(batches, key=lambda b: b.modified, reverse=True)
+        
+        self._state_lock.acquire()
+        try:
+            self._queue = [b.batch_id for b in batches[:self.count]
+                           if b.batch_id not in self._cache]
+            start_worker = bool(self._queue) and not self._worker_running
+            if start_worker:
+                self._worker_running = True
+        finally:
+            self._state_lock.release()
+        
+        if start_worker:
+            _thread.start_new_thread(self._worker, ())
+    
+    def cancel(self):
+        """Drop queued prefetches (the request in flight, if any, completes)"""
+        self._state_lock.acquire()
+        self._queue = []
+        self._state_lock.release()
+    
+    def select(self, batch_id):
+        """
+        Ingredients of the batch chosen by the user
+        
+        Cancels the remaining prefetches. If this batch is being fetched in
+        the background, waits for that request instead of sending another;
+        any other batch is fetched at once.
+        
+        Args:
+            batch_id: The unique identifier of the batch
+        
+        Returns:
+            Tuple (List[Malt], List[Hop])
+        
+        Raises:
+            BrewingAPIError: Fetching the batch failed
+        """
+        self.cancel()
+        
+        self._state_lock.acquire()
+        in_flight = self._in_flight == batch_id
+        self._state_lock.release()
+        if in_flight:
+            # Released by the worker once the batch is cached (or failed)
+            self._fetch_lock.acquire()
+            self._fetch_lock.release()
+        
+        ingredients = self._lookup(batch_id)
+        if ingredients is not None:
+            self.hits += 1
+            return ingredients
+        self.misses += 1
+        ingredients = self.api.get_ingredients(batch_id)
+        self._store(batch_id, ingredients)
+        return ingredients
+    
+    def is_ready(self, batch_id):
+        """True if the ingredients of a batch are already prefetched"""
+        return batch_id in self._cache
+    
+    def clear(self):
+        """Cancel prefetches and free the prefetched recipes"""
+        self._state_lock.acquire()
+        self._queue = []
+        self._cache = {}
+        self._lru = []
+        self._state_lock.release()
+    
+    def _lookup(self, batch_id):
+        """Cached ingredients of a batch (now the most recently used), or None"""
+        self._state_lock.acquire()
+        try:
+            ingredients = self._cache.get(batch_id)
+            if ingredients is not None:
+                self._lru.remove(batch_id)
+                self._lru.append(batch_id)
+            return ingredients
+        finally:
+            self._state_lock.release()
+    
+    def _store(self, batch_id, ingredients):
+        """Cache ingredients, dropping the least recently used beyond max_items"""
+        self._state_lock.acquire()
+        try:
+            if batch_id in self._cache:
+                self._lru.remove(batch_id)
+            self._cache[batch_id] = ingredients
+            self._lru.append(batch_id)
+            while len(self._lru) > self.max_items:
+                del self._cache[self._lru.pop(0)]
+                self.evicted += 1
+        finally:
+            self._state_lock.release()
+    
+    def _has_budget(self):
+        """True if another recipe fits in the memory budget (state lock held, heap collected)"""
+        if len(self._cache) >= self.max_items:
+            return False
+        if self.mem_free is not None:
+            return self.mem_free() >= self.min_free_bytes
+        return True
+    
+    def _next_batch_id(self):
+        """Pop the next queued batch (now in flight), or mark the worker as stopped"""
+        self._state_lock.acquire()
+        try:
+            self._in_flight = None
+            while self._queue and self._has_budget():
+                batch_id = self._queue.pop(0)
+                if batch_id not in self._cache:
+                    self._in_flight = batch_id
+                    return batch_id
+            self._queue = []
+            if self._worker_api is not self.api:
+                # Free the TLS connection until the next start()
+                self._worker_api.close()
+            self._worker_running = False
+            return None
+        finally:
+            self._state_lock.release()
+    
+    def _worker(self):
+        """Background thread: fetch queued batches until the queue is empty"""
+        if self._worker_api is None:
+            self._worker_api = self.api.clone() if hasattr(self.api, 'clone') else self.api
+        while True:
+            # Collected before taking any lock: lookups are never held up by it
+            gc.collect()
+            self._fetch_lock.acquire()
+            try:
+                batch_id = self._next_batch_id()
+                if batch_id is None:
+                    break
+                self._store(batch_id, self._worker_api.get_ingredients(batch_id))
+                self.prefetched += 1
+            except Exception as e:
+                _log.warning("Prefetch error: %s", e)
+            finally:
+                self._state_lock.acquire()
+                self._in_flight = None
+                self._state_lock.release()
+                self._fetch_lock.release()
@@ -0,0 +1,193 @@
+"""
+Local recipe store with incremental sync
+For UIFlow2.0 / MicroPython on M5Stack
+"""
+
+from brewing_software_api import BrewingSoftwareAPI
+from snapshot_store import SnapshotStore
+
+
+class RecipeStore(BrewingSoftwareAPI):
+    """
+    Local copy of planned batches and their ingredients
+    
+    The store wraps a backend (e.g. BrewfatherAPI) and can be used in its
+    place. sync() only asks the backend for batches modified since the last
+    sync and merges them: ingredients of unchanged batches are kept and never
+    refetched, ingredients of changed batches are fetched again on demand.
+    A batch deleted on the server is not part of such a delta: deletions are
+    only detected by a full listing (first sync, or sync(full=True)).
+    
+    With a path, the store is persisted as a SnapshotStore on flash. After
+    load(), batches and recipes of the last session are served from flash,
+    even when the backend is unreachable.
+    """
+    
+    def __init__(self, api, path=None):
+        """
+        Initialize the store
+        
+        Args:
+            api: Backend BrewingSoftwareAPI
+            path: Snapshot path prefix used by load()/save(), None for memory only
+        """
+        self.api = api
+        self.snapshot = SnapshotStore(path) if path else None
+        self.last_sync_ms = 0  # newest modification timestamp seen
+        self._batches = {}  # batch_id -> Batch
+        self._ingredients = {}  # batch_id -> (malts, hops)
+    
+    def sync(self, full=False):
+        """
+        Merge batches changed on the server since the last sync
+        
+        An incremental sync sees batches modified or leaving the Planning
+        status, but not deleted ones: they stay in the store until a full
+        listing, which removes every batch it does not list.
+        
+        Args:
+            full: List all planned batches (detects deletions) instead of
+                  the changes since the last sync; the first sync is full
+        
+        Returns:
+            Number of batches added, updated or removed
+        
+        Raises:
+            BrewingAPIError: The backend could not be reached
+        """
+        changes = 0
+        newest = self.last_sync_ms
+        # Without a previous sync the backend returns a full listing:
+        # batches not listed anymore have been deleted
+        full_listing = full or not self.last_sync_ms
+        seen = set()
+        
+        for batch in self.api.iter_batches_modified_since(0 if full_listing else self.last_sync_ms):
+            if batch.modified > newest:
+                newest = batch.modified
+            seen.add(batch.batch_id)
+            known = self._batches.get(batch.batch_id)
+            
+            if batch.status != 'Planning':
+                # Left the planning stage (brewing, completed...): drop it
+                if known is not None:
+                    del self._batches[batch.batch_id]
+                    self._ingredients.pop(batch.batch_id, None)
+                    changes += 1
+                continue
+            
+            if known is None or batch.modified > known.modified or batch.name != known.name:
+                self._batches[batch.batch_id] = batch
+                # Recipe may have changed: refetch ingredients on next access
+                self._ingredients.pop(batch.batch_id, None)
+                changes += 1
+        
+        if full_listing:
+            for batch_id in [b for b in self._batches if b not in seen]:
+                del self._batches[batch_id]
+                self._ingredients.pop(batch_id, None)
+                changes += 1
+        
+        self.last_sync_ms = newest
+        return changes
+    
+    def get_batches(self):
+        """
+        Batches in the store (call sync() to refresh)
+        
+        Returns:
+            List[Batch]: Batches sorted by name
+        """
+        return sorted(self._batches.values(), key=lambda b: b.name)
+    
+    def get_malts(self, batch_id):
+        """Malts of a batch (see get_ingredients())"""
+        return self.get_ingredients(batch_id)[0]
+    
+    def get_hops(self, batch_id):
+        """Hops of a batch (see get_ingredients())"""
+        return self.get_ingredients(batch_id)[1]
+    
+    def get_ingredients(self, batch_id):
+        """
+        Malts and hops of a batch, fetched from the backend only once
+        
+        Args:
+            batch_id: The unique identifier of the batch
+        
+        Returns:
+            Tuple (List[Malt], List[Hop])
+        
+        Raises:
+            BrewingAPIError: The backend could not be reached (nothing cached)
+        """
+        ingredients = self._ingredients.get(batch_id)
+        if ingredients is None:
+            ingredients = self._read_snapshot(batch_id)
+            if ingredients is None:
+                ingredients = self.api.get_ingredients(batch_id)
+            self._ingredients[batch_id] = ingredients
+        return ingredients
+    
+    def has_ingredients(self, batch_id):
+        """True if the ingredients of a batch are available locally"""
+        if batch_id in self._ingredients:
+            return True
+        return self._snapshot_is_current(batch_id) and self.snapshot.read_ingredients(batch_id) is not None
+    
+    def _snapshot_is_current(self, batch_id):
+        """True if the snapshot holds the current version of a batch"""
+        batch = self._batches.get(batch_id)
+        return (self.snapshot is not None and batch is not None
+                and self.snapshot.modified(batch_id) == batch.modified)
+    
+    def _read_snapshot(self, batch_id):
+        """Ingredients from flash if still up to date, None otherwise"""
+        if self._snapshot_is_current(batch_id):
+            return self.snapshot.read_ingredients(batch_id)
+        return None
+    
+    def load(self):
+        """
+        Load batches of the last session from the snapshot
+        
+        Only the snapshot index is read, ingredients are read on demand.
+        
+        Returns:
+            True if loaded, False if missing or unreadable
+        """
+        if self.snapshot is None or not self.snapshot.load():
+            return False
+        self.last_sync_ms = self.snapshot.synced_ms
+        self._batches = {}
+        for batch in self.snapshot.batches():
+            self._batches[batch.batch_id] = batch
+        self._ingredients = {}
+        return True
+    
+    def save(self):
+        """
+        Write batches and known ingredients to the snapshot
+        
+        Returns:
+            True if saved, False otherwise
+        """
+        if self.snapshot is None:
+            return False
+        
+        def entries():
+            for batch_id, batch in self._batches.items():
+                ingredients = self._ingredients.get(batch_id)
+                if ingredients is None:
+                    ingredients = self._read_snapshot(batch_id)
+                yield batch, ingredients
+        
+        if not self.snapshot.write(entries(), self.last_sync_ms):
+            return False
+        # Recipes are on flash now: free the heap
+        self._ingredients = {}
+        return True
+    
+    def close(self):
+        """Close the backend"""
+        self.api.close()
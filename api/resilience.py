@@ -0,0 +1,166 @@
+"""
+Retry with backoff and circuit breaker for brewing software API calls
+For UIFlow2.0 / MicroPython on M5Stack
+"""
+
+import random
+from brewing_software_api import APIConnectionError, APIHTTPError, APITimeoutError, CircuitOpenError
+from http_session import ticks_ms, ticks_add, ticks_diff, sleep_ms
+
+
+def is_retryable(error):
+    """
+    True if a failed call may succeed when repeated
+    
+    Network errors, timeouts, rate limiting (429) and server errors (5xx) are
+    transient. Other HTTP errors (bad credentials, unknown batch) are not.
+    """
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIHTTPError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Fail fast after repeated transient failures
+    
+    After `failure_threshold` consecutive failed calls the circuit opens and
+    calls raise CircuitOpenError immediately. Once `reset_timeout_ms` has
+    elapsed a single trial call is let through (half-open): success closes
+    the circuit, failure opens it again.
+    
+    RetryPolicy records one failure per call, once its retries are over: a
+    threshold of 3 means 3 calls in a row failed, not 3 attempts.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    
+    def __init__(self, failure_threshold=3, reset_timeout_ms=30000):
+        """
+        Initialize the circuit breaker (closed)
+        
+        Args:
+            failure_threshold: Consecutive failures before opening
+            reset_timeout_ms: Time spent open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_ms = reset_timeout_ms
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0
+    
+    def check(self):
+        """
+        Raise CircuitOpenError if calls are currently short-circuited
+        """
+        if self.state == self.OPEN:
+            elapsed = ticks_diff(ticks_ms(), self._opened_at)
+            if elapsed < self.reset_timeout_ms:
+                raise CircuitOpenError(self.reset_timeout_ms - elapsed)
+            self.state = self.HALF_OPEN
+    
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        self.state = self.CLOSED
+        self.failures = 0
+    
+    def record_failure(self):
+        """Count a transient failure, open the circuit at the threshold"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = ticks_ms()
+
+
+class RetryPolicy:
+    """
+    Bounded retries with jittered exponential backoff, within a deadline
+    """
+    
+    def __init__(self, max_attempts=3, base_delay_ms=250, max_delay_ms=4000,
+                 deadline_ms=20000, breaker=None):
+        """
+        Initialize the retry policy
+        
+        Args:
+            max_attempts: Maximum number of attempts per call
+            base_delay_ms: Backoff before the first retry (doubled each time)
+            max_delay_ms: Upper bound of a single backoff
+            deadline_ms: Total time allowed for a call, retries included
+            breaker: Optional CircuitBreaker shared by all calls
+        """
+        self.max_attempts = max_attempts
+        self.base_delay_ms = base_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.deadline_ms = deadline_ms
+        self.breaker = breaker
+    
+    def backoff_ms(self, attempt):
+        """
+        Delay before retry number `attempt` (1-based), "equal jitter"
+        
+        Half of the exponential delay is fixed, the other half is random so
+        that several devices do not retry in lockstep.
+        """
+        delay = min(self.max_delay_ms, self.base_delay_ms << (attempt - 1))
+        half = delay // 2
+        return half + (random.getrandbits(16) * half >> 16)
+    
+    def call(self, fn, deadline_ms=None):
+        """
+        Call fn(timeout_ms) until it succeeds, fails permanently or runs out of time
+        
+        Args:
+            fn: Callable taking the time left (ms) and returning the result
+            deadline_ms: Override the policy deadline for this call
+        
+        Returns:
+            Result of fn
+        
+        Raises:
+            CircuitOpenError: The circuit breaker is open
+            APITimeoutError: The deadline expired
+            BrewingAPIError: Last error of fn
+        """
+        deadline = ticks_add(ticks_ms(), deadline_ms or self.deadline_ms)
+        attempt = 0
+        
+        while True:
+            if self.breaker:
+                self.breaker.check()
+            
+            remaining = ticks_diff(deadline, ticks_ms())
+            if remaining <= 0:
+                raise APITimeoutError("Call deadline exceeded")
+            
+            attempt += 1
+            try:
+                result = fn(remaining)
+            except APIConnectionError as e:
+                error = e
+            except APIHTTPError as e:
+                error = e
+            else:
+                if self.breaker:
+                    self.breaker.record_success()
+                return result
+            
+            if not is_retryable(error):
+                # The server answered: the link is healthy
+                if self.breaker:
+                    self.breaker.record_success()
+                raise error
+            
+            # The call fails once its retries are over (a half-open trial
+            # call is not retried): one breaker failure per call
+            delay = self.backoff_ms(attempt)
+            if (attempt >= self.max_attempts or delay >= ticks_diff(deadline, ticks_ms())
+                    or (self.breaker and self.breaker.state == CircuitBreaker.HALF_OPEN)):
+                if self.breaker:
+                    self.breaker.record_failure()
+                raise error
+            sleep_ms(delay)
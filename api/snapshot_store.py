@@ -0,0 +1,217 @@
+"""
+Offline recipe snapshot store on flash
+For UIFlow2.0 / MicroPython on M5Stack
+"""
+
+import os
+import json
+from brewing_software_api import BrewingSoftwareAPI, BrewingAPIError, Batch, Malt, Hop, get_logger
+
+_log = get_logger('snapshot')
+
+
+class SnapshotStore:
+    """
+    Compact on-flash copy of batches and their ingredients
+    
+    Two files are written next to each other:
+    - `<path>.dat`: one JSON record per batch (malts and hops as plain lists)
+    - `<path>.idx`: one line per batch with id, name, modification timestamp,
+      and offset/length of its record in the data file
+    
+    Only the index is read at boot. The record of a batch is read from flash
+    with a single seek when its ingredients are needed.
+    """
+    
+    MAGIC = "#uhs-snapshot"
+    VERSION = 1
+    
+    def __init__(self, path):
+        """
+        Initialize the store (nothing is read until load())
+        
+        Args:
+            path: Path prefix of the snapshot files, e.g. "/flash/recipes"
+        """
+        self.index_path = path + ".idx"
+        self.data_path = path + ".dat"
+        self.synced_ms = 0
+        self._index = {}  # batch_id -> (name, modified, offset, length)
+        self._order = []  # batch ids in file order
+    
+    def load(self):
+        """
+        Read the index file
+        
+        Returns:
+            True if a consistent snapshot was found, False otherwise
+        """
+        index = {}
+        order = []
+        try:
+            with open(self.index_path, 'r') as f:
+                magic, version, synced_ms, data_size = f.readline().split()
+                if magic != self.MAGIC or int(version) != self.VERSION:
+                    return False
+                # Data and index are renamed separately: check they match
+                if os.stat(self.data_path)[6] != int(data_size):
+                    _log.warning("Snapshot '%s' does not match its index", self.data_path)
+                    return False
+                
+                for line in f:
+                    batch_id, modified, offset, length, name = line.rstrip('\n').split('\t', 4)
+                    index[batch_id] = (name, int(modified), int(offset), int(length))
+                    order.append(batch_id)
+        except (OSError, ValueError) as e:
+            _log.warning("Could not load snapshot '%s': %s", self.index_path, e)
+            return False
+        
+        self.synced_ms = int(synced_ms)
+        self._index = index
+        self._order = order
+        return True
+    
+    def batches(self):
+        """
+        Batches of the snapshot
+        
+        Returns:
+            List[Batch]: Batches in stored order
+        """
+        batches = []
+        for batch_id in self._order:
+            name, modified = self._index[batch_id][:2]
+            batches.append(Batch(batch_id, name, modified))
+        return batches
+    
+    def modified(self, batch_id):
+        """Modification timestamp stored for a batch, None if unknown"""
+        entry = self._index.get(batch_id)
+        return entry[1] if entry else None
+    
+    def read_ingredients(self, batch_id):
+        """
+        Read the ingredients of one batch from flash
+        
+        Args:
+            batch_id: The unique identifier of the batch
+        
+        Returns:
+            Tuple (List[Malt], List[Hop]), or None if not in the snapshot
+            or its record is unreadable
+        """
+        entry = self._index.get(batch_id)
+        if entry is None or entry[3] == 0:
+            return None
+        
+        try:
+            with open(self.data_path, 'rb') as f:
+                f.seek(entry[2])
+                malts, hops = json.loads(f.read(entry[3]).decode())
+            return [Malt(*m) for m in malts], [Hop(*h) for h in hops]
+        except (OSError, ValueError, TypeError) as e:
+            # Damaged flash or a data file replaced since load()
+            _log.warning("Could not read batch %s from snapshot '%s': %s", batch_id, self.data_path, e)
+            return None
+    
+    def write(self, entries, synced_ms=0):
+        """
+        Replace the snapshot
+        
+        Entries may be produced lazily (e.g. read from the previous snapshot):
+        the new files are written aside and renamed once complete.
+        
+        Args:
+            entries: Iterable of (Batch, (malts, hops) or None if unknown)
+            synced_ms: Sync timestamp stored with the snapshot
+        
+        Returns:
+            True if saved, False otherwise
+        """
+        data_tmp = self.data_path + ".tmp"
+        index_tmp = self.index_path + ".tmp"
+        lines = []
+        offset = 0
+        try:
+            with open(data_tmp, 'wb') as f:
+                for batch, ingredients in entries:
+                    length = 0
+                    if ingredients is not None:
+                        malts, hops = ingredients
+                        record = json.dumps([
+                            [[m.name, m.ebc, m.amount] for m in malts],
+                            [[h.name, h.amount, h.use, h.time] for h in hops],
+                        ]).encode()
+                        f.write(record)
+                        length = len(record)
+                    name = batch.name.replace('\t', ' ').replace('\n', ' ')
+                    lines.append(f"{batch.batch_id}\t{batch.modified}\t{offset}\t{length}\t{name}\n")
+                    offset += length
+            
+            with open(index_tmp, 'w') as f:
+                f.write(f"{self.MAGIC} {self.VERSION} {synced_ms} {offset}\n")
+                for line in lines:
+                    f.write(line)
+            
+            for tmp, final in ((data_tmp, self.data_path), (index_tmp, self.index_path)):
+                try:
+                    os.remove(final)
+                except OSError:
+                    pass
+                os.rename(tmp, final)
+        except OSError as e:
+            _log.error("Error saving snapshot '%s': %s", self.data_path, e)
+            return False
+        
+        return self.load()
+
+
+class SnapshotAPI(BrewingSoftwareAPI):
+    """
+    Read-only backend serving batches from a SnapshotStore
+    
+    Lets the Grain and Hop Assistants work without Wi-Fi, with the recipes
+    of the last sync.
+    """
+    
+    def __init__(self, store):
+        """
+        Initialize the offline backend
+        
+        Args:
+            store: SnapshotStore, or path prefix of the snapshot files
+        """
+        if isinstance(store, str):
+            store = SnapshotStore(store)
+            store.load()
+        self.store = store
+    
+    def get_batches(self):
+        """Batches of the snapshot"""
+        return self.store.batches()
+    
+    def get_malts(self, batch_id):
+        """Malts of a batch (see get_ingredients())"""
+        return self.get_ingredients(batch_id)[0]
+    
+    def get_hops(self, batch_id):
+        """Hops of a batch (see get_ingredients())"""
+        return self.get_ingredients(batch_id)[1]
+    
+    def get_ingredients(self, batch_id):
+        """
+        Ingredients of a batch, read from flash
+        
+        Args:
+            batch_id: The unique identifier of the batch
+        
+        Returns:
+            Tuple (List[Malt], List[Hop])
+        
+        Raises:
+            BrewingAPIError: The batch recipe is not in the snapshot
+        """
+        ingredients = self.store.read_ingredients(batch_id)
+        if ingredients is None:
+            raise BrewingAPIError(f"Batch {batch_id} not available offline")
+        return ingredients
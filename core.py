@@ -0,0 +1,227 @@
+"""
+Ultimate Homebrewing Scale - Shared hardware and UI core
+I2C buses and Weight I2C unit drivers created once, M5/LVGL setup,
+cached fonts, common widgets and screens built once, for scale.py and
+the calibration wizard
+"""
+
+import M5
+import m5ui
+import lvgl as lv
+from unit import WeightI2CUnit
+from hardware import I2C, Pin
+import log
+
+# Hardware configuration
+SCL_PIN = 15
+SDA_PIN = 13
+I2C_ADDRESS = 0x26
+I2C_FREQ = 400000  # fast mode; falls back to I2C_SAFE_FREQ on repeated bus errors
+I2C_SAFE_FREQ = 100000
+
+# Serial output (see log.py): log.DEBUG, log.INFO, log.WARNING or log.ERROR,
+# per module with log.set_level(level, name)
+LOG_LEVEL = log.INFO
+
+# Display colors
+BG_COLOR = 0x000000
+TEXT_COLOR = 0xFFFFFF
+
+_m5_ready = False
+_backlight = None
+_log = log.get_logger('core')
+
+
+def init_m5():
+    """Initialize M5, the UI and the log level once, whichever mode starts first"""
+    global _m5_ready
+    if not _m5_ready:
+        log.set_level(LOG_LEVEL)
+        M5.begin()
+        m5ui.init()
+        _m5_ready = True
+
+
+# ----------------------------------------------------------------------------
+# I2C buses and sensor drivers
+# ----------------------------------------------------------------------------
+
+# Shared buses: (bus, scl, sda) -> I2C, and their frequency
+_i2c_buses = {}
+_i2c_freqs = {}
+# Weight I2C unit drivers: (bus, scl, sda, address) -> WeightI2CUnit
+_weight_units = {}
+
+
+def get_i2c_bus(bus=0, scl=SCL_PIN, sda=SDA_PIN, freq=I2C_FREQ):
+    """
+    I2C bus object, created once and shared by all sensors on it
+    
+    Args:
+        bus: I2C peripheral id
+        scl: SCL pin
+        sda: SDA pin
+        freq: Bus frequency when the bus is created (first sensor wins)
+    """
+    key = (bus, scl, sda)
+    i2c_bus = _i2c_buses.get(key)
+    if i2c_bus is None:
+        i2c_bus = I2C(bus, scl=Pin(scl), sda=Pin(sda), freq=freq)
+        _i2c_buses[key] = i2c_bus
+        _i2c_freqs[key] = freq
+    return i2c_bus
+
+
+def get_i2c_freq(bus=0, scl=SCL_PIN, sda=SDA_PIN):
+    """Current frequency of a shared bus, None if not created"""
+    return _i2c_freqs.get((bus, scl, sda))
+
+
+def set_i2c_freq(bus=0, scl=SCL_PIN, sda=SDA_PIN, freq=I2C_SAFE_FREQ):
+    """
+    Change the frequency of a shared bus
+    
+    Returns:
+        The I2C object (re-created if it could not be re-initialized, in
+        which case the unit drivers on the bus are re-created too)
+    """
+    key = (bus, scl, sda)
+    i2c_bus = _i2c_buses.get(key)
+    try:
+        i2c_bus.init(scl=Pin(scl), sda=Pin(sda), freq=freq)
+    except Exception:
+        i2c_bus = I2C(bus, scl=Pin(scl), sda=Pin(sda), freq=freq)
+        _i2c_buses[key] = i2c_bus
+        for unit_key in list(_weight_units):
+            if unit_key[:3] == key:
+                _weight_units[unit_key] = WeightI2CUnit(i2c_bus, unit_key[3])
+    _i2c_freqs[key] = freq
+    _log.info("I2C bus %d set to %d kHz", bus, freq // 1000)
+    return i2c_bus
+
+
+def get_weight_unit(bus=0, scl=SCL_PIN, sda=SDA_PIN, address=I2C_ADDRESS, freq=I2C_FREQ):
+    """
+    Weight I2C unit driver, created once per sensor
+    
+    The scale and the calibration wizard share it: switching mode does not
+    initialize the hardware again.
+    """
+    key = (bus, scl, sda, address)
+    weight_unit = _weight_units.get(key)
+    if weight_unit is None:
+        weight_unit = WeightI2CUnit(get_i2c_bus(bus, scl, sda, freq), address)
+        _weight_units[key] = weight_unit
+    return weight_unit
+
+
+_rotary = None
+
+
+def get_rotary():
+    """Rotary encoder (UIFlow2 2.4), created once; None if not available"""
+    global _rotary
+    if _rotary is None:
+        try:
+            from hardware import Rotary
+            _rotary = Rotary()
+        except Exception as e:
+            _log.warning("Rotary encoder unavailable: %s", e)
+            return None
+    return _rotary
+
+
+# ----------------------------------------------------------------------------
+# Fonts, widgets and screens
+# ----------------------------------------------------------------------------
+
+_fonts = {}
+
+
+def get_font(size=16):
+    """
+    LVGL Montserrat font of a size, with fallbacks if missing
+    
+    The lookup runs once per size; later calls are a dict access.
+    """
+    font = _fonts.get(size)
+    if font is None:
+        for candidate in (size, size - 2, 16, 14, 12, 10):
+            font = getattr(lv, f"font_montserrat_{candidate}", None)
+            if font is not None:
+                break
+        _fonts[size] = font
+    return font
+
+
+def label(parent, text, x, y, size=16, color=TEXT_COLOR):
+    """Transparent text label on the dark background"""
+    return m5ui.M5Label(
+        text,
+        x=x,
+        y=y,
+        text_c=color,
+        bg_c=BG_COLOR,
+        bg_opa=0,
+        font=get_font(size),
+        parent=parent,
+    )
+
+
+def progress_bar(parent, x, y, width, height=8):
+    """LVGL bar from 0 to 100"""
+    bar = lv.bar(parent)
+    bar.set_size(width, height)
+    bar.set_pos(x, y)
+    bar.set_range(0, 100)
+    bar.set_value(0, False)
+    return bar
+
+
+class Screen:
+    """A page and its widgets (set as attributes by the builder)"""
+    
+    def __init__(self):
+        self.page = m5ui.M5Page(bg_c=BG_COLOR)
+    
+    def show(self):
+        """Make this screen the active one"""
+        self.page.screen_load()
+
+
+def set_backlight(level):
+    """
+    Display backlight brightness (0-255), applied only when it changes
+    
+    Returns:
+        False if the display has no brightness control
+    """
+    global _backlight
+    if level == _backlight:
+        return True
+    try:
+        M5.Lcd.setBrightness(level)
+    except (AttributeError, OSError) as e:
+        _log.warning("Backlight control unavailable: %s", e)
+        _backlight = level  # do not retry on every call
+        return False
+    _backlight = level
+    return True
+
+
+_screens = {}
+
+
+def get_screen(name, build):
+    """
+    Screen built once and reused
+    
+    Args:
+        name: Screen name
+        build: Function returning a new Screen (called the first time only)
+    """
+    screen = _screens.get(name)
+    if screen is None:
+        screen = build()
+        _screens[name] = screen
+    return screen
@@ -0,0 +1,274 @@
+"""
+Ultimate Homebrewing Scale - Grain Assistant
+Weighing-session engine: walks the malts of a batch on the scale,
+auto-tares and advances when the target is reached and stable
+
+Replay recorded sessions on a computer:
+    python grain_assistant.py session.rec [...]
+"""
+
+import json
+from weighing import StabilityDetector, ticks_diff
+import log
+
+_log = log.get_logger('grain')
+
+
+class GrainWeighingSession:
+    """
+    Guide the weighing of every malt of a batch
+    
+    Call update() at each loop iteration. When the added weight reaches the
+    target (within tolerance) and the reading is stable, the actual weight is
+    logged, the scale is tared on the stable reading and the next malt starts,
+    without any user input. The stable window only starts once the reading
+    reaches the target within tolerance, and at least REACHED_FRACTION of
+    it whatever the tolerance: the empty platform, stable right after the
+    auto-tare, never completes a small addition.
+    """
+    
+    # Ingredient amount unit (Malt amounts are in kg) and screen strings
+    AMOUNT_TO_G = 1000
+    I18N_SECTION = 'grain'
+    NUMBER_KEY = 'grain.grain_number'
+    REACHED_FRACTION = 0.5
+    
+    def __init__(self, scale, malts, tolerance_g=10, band_g=3.0, hold_ms=1500, min_weight_g=20,
+                 record_path=None):
+        """
+        Initialize the session
+        
+        Args:
+            scale: Scale with read_weight(), tare_offset and tare_to() (CalibratedScale)
+            malts: List[Malt] (amounts in kg, as returned by the API)
+            tolerance_g: Target considered reached at target - tolerance_g
+                         (at least REACHED_FRACTION of the target)
+            band_g: Stability band of the filtered weight (grams)
+            hold_ms: Time the weight must stay in the band
+            min_weight_g: Ignore targets below this (empty or rounding entries)
+            record_path: Optional file receiving the readings, for replay()
+        """
+        self.scale = scale
+        self.items = [m for m in malts if m.amount * self.AMOUNT_TO_G >= min_weight_g]
+        self.tolerance_g = tolerance_g
+        self.stability = StabilityDetector(band_g, hold_ms)
+        
+        self.index = 0
+        self.added_g = 0.0
+        self.log = []  # one record per weighed malt
+        self.started_ms = None
+        self._malt_start_ms = None
+        
+        self._record = None
+        if record_path:
+            try:
+                self._record = open(record_path, 'w')
+                self._record.write(json.dumps([[m.name, m.amount] for m in self.items]) + '\n')
+            except OSError as e:
+                _log.warning("Could not record session to '%s': %s", record_path, e)
+                self._record = None
+    
+    @staticmethod
+    def make_item(name, amount):
+        """Ingredient of a recording (see replay())"""
+        from brewing_software_api import Malt
+        return Malt(name, 0, amount)
+    
+    @classmethod
+    def from_batch(cls, api, batch_id, scale, **kwargs):
+        """
+        Start a session with the malts of a batch
+        
+        Args:
+            api: BrewingSoftwareAPI (BrewfatherAPI, RecipeStore, SnapshotAPI)
+            batch_id: The unique identifier of the batch
+            scale: CalibratedScale
+            **kwargs: Other GrainWeighingSession parameters
+        
+        Raises:
+            BrewingAPIError: The malts could not be retrieved
+        """
+        return cls(scale, api.get_malts(batch_id), **kwargs)
+    
+    @property
+    def done(self):
+        return self.index >= len(self.items)
+    
+    @property
+    def current(self):
+        """Malt being weighed, None when done"""
+        return None if self.done else self.items[self.index]
+    
+    @property
+    def target_g(self):
+        return 0 if self.done else self.items[self.index].amount * self.AMOUNT_TO_G
+    
+    @property
+    def reached_g(self):
+        """Added weight completing the current malt"""
+        target_g = self.target_g
+        return max(target_g - self.tolerance_g, target_g * self.REACHED_FRACTION)
+    
+    @property
+    def remaining_g(self):
+        return self.target_g - self.added_g
+    
+    def update(self, now_ms):
+        """
+        Read the scale and advance when the current malt is weighed
+        
+        Args:
+            now_ms: Current time (time.ticks_ms())
+        
+        Returns:
+            'advanced' when a malt was completed, 'done' after the last one,
+            None otherwise
+        """
+        if self.done:
+            return 'done'
+        
+        weight = self.scale.read_weight()
+        if weight is None:
+            return None
+        
+        if self.started_ms is None:
+            self.started_ms = now_ms
+            self._malt_start_ms = now_ms
+        
+        if self._record:
+            # Gross reading, independent of the auto-tares
+            self._record.write(f"{now_ms} {weight + self.scale.tare_offset:.1f}\n")
+        
+        self.added_g = weight
+        if weight < self.reached_g:
+            # The stable window only holds readings with the malt added
+            self.stability.reset()
+            return None
+        if self.stability.update(weight, now_ms):
+            return self._advance(now_ms)
+        return None
+    
+    def _advance(self, now_ms):
+        """Log the current malt, auto-tare and move to the next one"""
+        actual_g = self.stability.mean
+        malt = self.items[self.index]
+        self.log.append({
+            'name': malt.name,
+            'target_g': round(self.target_g, 1),
+            'actual_g': round(actual_g, 1),
+            'error_g': round(actual_g - self.target_g, 1),
+            'duration_ms': ticks_diff(now_ms, self._malt_start_ms),
+        })
+        
+        # Auto-tare on the stable reading: shifting the offset keeps the
+        # moving average valid, unlike a blocking tare()
+        self.scale.tare_to(self.scale.tare_offset + actual_g)
+        self.stability.reset()
+        self.added_g = 0.0
+        
+        self.index += 1
+        self._malt_start_ms = now_ms
+        if self.done:
+            self.close()
+            return 'done'
+        return 'advanced'
+    
+    def close(self):
+        """End the session (stops recording)"""
+        if self._record:
+            self._record.close()
+            self._record = None
+    
+    def malts_per_minute(self, now_ms):
+        """Throughput of the session so far"""
+        if self.started_ms is None or not self.log:
+            return 0.0
+        elapsed_ms = ticks_diff(now_ms, self.started_ms)
+        return len(self.log) * 60000 / elapsed_ms if elapsed_ms > 0 else 0.0
+    
+    def display_lines(self, i18n):
+        """
+        Texts for the Grain Assistant screen
+        
+        Args:
+            i18n: I18n instance
+        
+        Returns:
+            Tuple (title, target, remaining) of translated strings
+        """
+        section = self.I18N_SECTION
+        if self.done:
+            return i18n.t(section + '.all_done'), '', ''
+        title = i18n.t(self.NUMBER_KEY, self.index + 1, len(self.items))
+        return (
+            f"{title}: {self.current.name}",
+            i18n.t(section + '.target', round(self.target_g)),
+            i18n.t(section + '.remaining', max(0, round(self.remaining_g))),
+        )
+
+
+class ReplayScale:
+    """
+    Scale fed from a recorded session (gross weights over time)
+    
+    Recordings (written with record_path) hold the malts as a JSON line,
+    then one "t_ms gross_weight_g" line per reading.
+    """
+    
+    def __init__(self, samples):
+        self.samples = samples
+        self.position = 0
+        self.tare_offset = 0.0
+    
+    def read_weight(self):
+        gross = self.samples[self.position][1]
+        return gross - self.tare_offset
+    
+    def tare_to(self, offset):
+        self.tare_offset = offset
+
+
+def replay(path, session_class=GrainWeighingSession, **session_args):
+    """
+    Replay a recorded session through the engine
+    
+    Args:
+        path: Recording (see ReplayScale)
+        session_class: GrainWeighingSession or HopWeighingSession
+        **session_args: Session parameters
+    
+    Returns:
+        Session after the last sample
+    """
+    with open(path, 'r') as f:
+        malts = [session_class.make_item(name, amount) for name, amount in json.loads(f.readline())]
+        samples = []
+        for line in f:
+            now_ms, gross = line.split()
+            samples.append((int(now_ms), float(gross)))
+    
+    scale = ReplayScale(samples)
+    session = session_class(scale, malts, **session_args)
+    session.last_ms = 0
+    for position, (now_ms, _) in enumerate(samples):
+        scale.position = position
+        session.last_ms = now_ms
+        if session.update(now_ms) == 'done':
+            break
+    return session
+
+
+if __name__ == '__main__':
+    import sys
+    import os
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+    
+    for path in sys.argv[1:]:
+        session = replay(path)
+        log.flush()
+        print(f"{path}:")
+        for record in session.log:
+            print(f"  {record['name']:<24} target {record['target_g']:>7} g"
+                  f"  actual {record['actual_g']:>7} g  ({record['duration_ms'] / 1000:.1f} s)")
+        status = "complete" if session.done else f"stopped at malt {session.index + 1}/{len(session.items)}"
+        print(f"  {status}, {session.malts_per_minute(session.last_ms):.2f} malts/min")
@@ -0,0 +1,144 @@
+"""
+Ultimate Homebrewing Scale - Heap monitor
+Allocations per loop iteration, heap usage and garbage collection pauses,
+with collections scheduled in the idle time of the loop
+"""
+
+import gc
+import time
+import log
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # CPython fallback (host-side runs)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+    
+    def ticks_diff(end, start):
+        return end - start
+
+_log = log.get_logger('heap')
+
+# gc.mem_alloc()/mem_free() are MicroPython only: on a computer (reference
+# counting frees most objects at once) the monitor only counts iterations
+_mem_alloc = getattr(gc, 'mem_alloc', None)
+_mem_free = getattr(gc, 'mem_free', None)
+
+
+class HeapMonitor:
+    """
+    Instrumentation and GC scheduling of a periodic loop
+    
+    Call begin() and end() around the work of an iteration: the heap growth
+    in between is what the iteration allocated (MicroPython does not free
+    anything before a collection). idle() then runs gc.collect() only when
+    enough has been allocated since the last one and the time left in the
+    period covers the longest pause seen, so collections happen between
+    display updates instead of in the middle of one.
+    """
+    
+    def __init__(self, collect_bytes=8192, report_ms=0):
+        """
+        Initialize the monitor
+        
+        Args:
+            collect_bytes: Allocation since the last collection that makes one due
+            report_ms: Log stats() this often (0: never)
+        """
+        self.collect_bytes = collect_bytes
+        self.report_ms = report_ms
+        self._start = 0
+        self._collected_at = _mem_alloc() if _mem_alloc else 0
+        self._report_at = ticks_ms()
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Clear the statistics"""
+        self.iterations = 0
+        self.alloc_total = 0
+        self.alloc_max = 0
+        self.collections = 0
+        self.auto_collections = 0  # collections that happened inside an iteration
+        self.pause_total_us = 0
+        self.pause_max_us = 0
+    
+    def begin(self):
+        """Start of the work of an iteration"""
+        if _mem_alloc:
+            self._start = _mem_alloc()
+    
+    def end(self):
+        """End of the work of an iteration"""
+        self.iterations += 1
+        if not _mem_alloc:
+            return
+        allocated = _mem_alloc() - self._start
+        if allocated < 0:
+            # The heap shrank: an automatic collection ran during the iteration
+            self.auto_collections += 1
+            self._collected_at = _mem_alloc()
+            return
+        self.alloc_total += allocated
+        if allocated > self.alloc_max:
+            self.alloc_max = allocated
+    
+    def idle(self, budget_ms):
+        """
+        Idle slot of the loop: collect if due and if the pause fits
+        
+        Args:
+            budget_ms: Time left before the next iteration
+        
+        Returns:
+            True if a collection ran
+        """
+        allocated = _mem_alloc() - self._collected_at if _mem_alloc else 0
+        if allocated < self.collect_bytes:
+            self._maybe_report()
+            return False
+        # Wait for a longer idle slot, unless the heap keeps growing
+        if budget_ms * 1000 < self.pause_max_us and allocated < 4 * self.collect_bytes:
+            return False
+        start = ticks_us()
+        gc.collect()
+        pause = ticks_diff(ticks_us(), start)
+        self.collections += 1
+        self.pause_total_us += pause
+        if pause > self.pause_max_us:
+            self.pause_max_us = pause
+        self._collected_at = _mem_alloc()
+        self._maybe_report()
+        return True
+    
+    def _maybe_report(self):
+        if self.report_ms and ticks_diff(ticks_ms(), self._report_at) >= self.report_ms:
+            self._report_at = ticks_ms()
+            if _log.enabled(log.INFO):
+                _log.info("Heap: %s", self.stats())
+    
+    def stats(self):
+        """
+        Loop and heap statistics
+        
+        Returns:
+            Dict with iterations, mean and max bytes allocated per iteration,
+            heap used and free, idle and automatic collections, mean and max
+            GC pause (µs)
+        """
+        return {
+            'iterations': self.iterations,
+            'alloc_avg': self.alloc_total // self.iterations if self.iterations else 0,
+            'alloc_max': self.alloc_max,
+            'heap_used': _mem_alloc() if _mem_alloc else 0,
+            'heap_free': _mem_free() if _mem_free else 0,
+            'collections': self.collections,
+            'auto_collections': self.auto_collections,
+            'gc_pause_avg_us': self.pause_total_us // self.collections if self.collections else 0,
+            'gc_pause_max_us': self.pause_max_us,
+        }
@@ -0,0 +1,75 @@
+"""
+Ultimate Homebrewing Scale - Hop Assistant
+Same weighing engine as the Grain Assistant, for hop additions:
+gram amounts, tighter tolerances and the scale in precision mode
+"""
+
+from grain_assistant import GrainWeighingSession
+
+
+class HopWeighingSession(GrainWeighingSession):
+    """
+    Guide the weighing of every hop addition of a batch
+    
+    The scale is switched to precision mode (oversampled readings) for the
+    whole session and restored by close().
+    """
+    
+    AMOUNT_TO_G = 1  # Hop amounts are in grams
+    I18N_SECTION = 'hop'
+    NUMBER_KEY = 'hop.hop_number'
+    
+    def __init__(self, scale, hops, tolerance_g=1, band_g=1.0, hold_ms=2000, min_weight_g=1,
+                 record_path=None):
+        """
+        Initialize the session
+        
+        Args:
+            scale: CalibratedScale
+            hops: List[Hop] (amounts in grams)
+            tolerance_g: Target considered reached at target - tolerance_g
+                         (at least half the target, see REACHED_FRACTION)
+            band_g: Stability band of the weight (grams)
+            hold_ms: Time the weight must stay in the band
+            min_weight_g: Ignore additions below this
+            record_path: Optional file receiving the readings
+        """
+        self._previous_mode = None
+        if hasattr(scale, 'set_precision_mode'):
+            self._previous_mode = scale.set_precision_mode(scale.PRECISION_ON)
+        super().__init__(scale, hops, tolerance_g, band_g, hold_ms, min_weight_g, record_path)
+    
+    @staticmethod
+    def make_item(name, amount):
+        """Hop addition of a recording (see grain_assistant.replay())"""
+        from brewing_software_api import Hop
+        return Hop(name, amount, '', 0)
+    
+    @classmethod
+    def from_batch(cls, api, batch_id, scale, **kwargs):
+        """
+        Start a session with the hops of a batch
+        
+        Raises:
+            BrewingAPIError: The hops could not be retrieved
+        """
+        return cls(scale, api.get_hops(batch_id), **kwargs)
+    
+    def close(self):
+        """End the session and restore the scale precision mode"""
+        super().close()
+        if self._previous_mode is not None:
+            self.scale.set_precision_mode(self._previous_mode)
+            self._previous_mode = None
+    
+    def display_lines(self, i18n):
+        """
+        Texts for the Hop Assistant screen
+        
+        Returns:
+            Tuple (title, target, remaining); the title includes the addition time
+        """
+        title, target, remaining = super().display_lines(i18n)
+        if not self.done and self.current.time:
+            title += " - " + i18n.t('hop.addition_time', self.current.time)
+        return title, target, remaining
@@ -3,6 +3,146 @@ Internationalization (i18n) module for Ultimate Homebrewing Scale
 Handles multi-language support with lightweight implementation for MicroPython
 """
 
+import sys
+import struct
+
+# Buffered logging of the application (log.py, one level up). i18n always
+# ships with the application and its tools run from the project root
+# (python -m i18n.build_table), so log.py is always there: only the API,
+# also used on its own, needs a fallback (see api/brewing_software_api.py)
+from log import get_logger
+
+# sys.intern is CPython only (MicroPython interns identifier-like literals itself)
+_intern = getattr(sys, 'intern', lambda s: s)
+
+# Maximum number of formatted strings kept (e.g. 'grain.remaining' with 150)
+FORMAT_CACHE_SIZE = 32
+
+# Compiled string table (built by i18n/build_table.py from locales/*.py)
+TABLE_FILE = __file__.rsplit('/', 1)[0] + '/locales/strings.bin' if '/' in __file__ else 'locales/strings.bin'
+TABLE_MAGIC = b'UHSL'
+TABLE_VERSION = 1
+TABLE_HEADER = '<4sBBHI'  # magic, version, languages, keys, keys section offset
+TABLE_ENTRY = '<IH'  # string offset, length (per key and language)
+TABLE_MISSING = 0xFFFF  # length of a key not translated in a language
+
+# Number of strings kept in each generation of the hot string cache
+HOT_CACHE_SIZE = 24
+
+_log = get_logger('i18n')
+
+
+class StringTable:
+    """
+    Translations read from flash on demand
+    
+    The table file holds, for every language, the offset and length of each
+    string. Only the key index (shared by all languages) is kept in RAM:
+    adding a language costs flash, not heap, and switching language only
+    changes which offset table is read.
+    
+    Recently used strings are kept in two generations of HOT_CACHE_SIZE
+    entries: when the current generation is full it becomes the old one, and
+    strings found in the old generation are promoted back.
+    """
+    
+    def __init__(self, path=TABLE_FILE):
+        """
+        Open the table and read its index
+        
+        Args:
+            path: Path of the compiled table
+        
+        Raises:
+            OSError: The file is missing
+            ValueError: The file is not a string table of this version
+        """
+        self._file = open(path, 'rb')
+        try:
+            header = self._file.read(struct.calcsize(TABLE_HEADER))
+            magic, version, n_langs, n_keys, keys_offset = struct.unpack(TABLE_HEADER, header)
+            if magic != TABLE_MAGIC or version != TABLE_VERSION:
+                raise ValueError(f"Not a string table: {path}")
+            
+            # Language index: code, name and offset of its entry table
+            self.languages = []
+            self._lang_offsets = {}
+            for _ in range(n_langs):
+                code = self._read_str()
+                name = self._read_str()
+                self._lang_offsets[code] = struct.unpack('<I', self._file.read(4))[0]
+                self.languages.append((code, name))
+            
+            # Key index: dotted key -> position in every entry table
+            self._file.seek(keys_offset)
+            self._keys = {}
+            for index in range(n_keys):
+                self._keys[_intern(self._read_str())] = index
+        except Exception:
+            self._file.close()
+            raise
+        
+        self._entries_offset = None
+        self._entry_size = struct.calcsize(TABLE_ENTRY)
+        self._entry_buf = bytearray(self._entry_size)
+        self._hot = {}
+        self._old = {}
+    
+    def _read_str(self):
+        """Read a length-prefixed UTF-8 string at the current position"""
+        length = self._file.read(1)[0]
+        return self._file.read(length).decode()
+    
+    def select(self, lang):
+        """
+        Switch to a language
+        
+        Returns:
+            True if the language is in the table, False otherwise
+        """
+        offset = self._lang_offsets.get(lang)
+        if offset is None:
+            return False
+        self._entries_offset = offset
+        self._hot = {}
+        self._old = {}
+        return True
+    
+    def get(self, key):
+        """
+        String of the selected language for a key
+        
+        Returns:
+            Translated string, or None if the key is unknown or untranslated
+        """
+        text = self._hot.get(key)
+        if text is not None:
+            return text
+        
+        text = self._old.get(key)
+        if text is None:
+            index = self._keys.get(key)
+            if index is None or self._entries_offset is None:
+                return None
+            self._file.seek(self._entries_offset + index * self._entry_size)
+            self._file.readinto(self._entry_buf)
+            offset, length = struct.unpack_from(TABLE_ENTRY, self._entry_buf)
+            if length == TABLE_MISSING:
+                return None
+            self._file.seek(offset)
+            text = self._file.read(length).decode()
+        
+        if len(self._hot) >= HOT_CACHE_SIZE:
+            self._old = self._hot
+            self._hot = {}
+        self._hot[key] = text
+        return text
+    
+    def close(self):
+        """Close the table file"""
+        self._file.close()
+
+
 class I18n:
     """Simple i18n manager optimized for MicroPython"""
     
@@ -10,15 +150,65 @@ class I18n:
         """
         Initialize i18n with specified language
         
+        Uses the compiled string table when present, the locale modules
+        otherwise.
+        
         Args:
             lang: Language code ('en', 'fr', etc.)
         """
         self.lang = lang
-        self._translations = {}
+        self._translations = {}  # flat table: 'scale.tare_ready' -> text
+        self._format_cache = {}
+        self._missing = set()  # keys already reported as missing
+        try:
+            self._table = StringTable()
+        except (OSError, ValueError) as e:
+            _log.warning("String table unavailable (%s), using locale modules", e)
+            self._table = None
         self._load_translations()
     
+    @staticmethod
+    def _flatten(tree, prefix='', table=None):
+        """
+        Flatten nested translation dicts into a single key table
+        
+        Args:
+            tree: Nested dict ({'scale': {'tare_ready': ...}})
+            prefix: Dotted prefix of the keys in tree
+            table: Dict filled in place
+        
+        Returns:
+            Dict mapping dotted keys to strings ('scale.tare_ready' -> ...)
+        """
+        if table is None:
+            table = {}
+        for name, value in tree.items():
+            key = prefix + name
+            if isinstance(value, dict):
+                I18n._flatten(value, key + '.', table)
+            else:
+                table[_intern(key)] = value
+        return table
+    
     def _load_translations(self):
-        """Load translation module for current language"""
+        """
+        Load translations for current language
+        
+        Returns:
+            True if the language was found, False if English was used instead
+        """
+        self._format_cache = {}
+        self._missing = set()
+        
+        if self._table is not None:
+            found = self._table.select(self.lang)
+            if not found:
+                _log.warning("No translations for '%s', using English", self.lang)
+                self._table.select('en')
+            self._get = self._table.get
+            return found
+        
+        found = True
         try:
             # Import the language module (relative import since locales is in same package)
             if self.lang == 'en':
@@ -27,18 +217,23 @@ class I18n:
                 from .locales.fr import TRANSLATIONS
             else:
                 # Fallback to English
+                found = False
                 from .locales.en import TRANSLATIONS
             
-            self._translations = TRANSLATIONS
+            self._translations = self._flatten(TRANSLATIONS)
         except ImportError as e:
-            print(f"Warning: Could not load translations for '{self.lang}': {e}")
+            _log.warning("Could not load translations for '%s': %s", self.lang, e)
+            found = False
             # Fallback to English
             try:
                 from .locales.en import TRANSLATIONS
-                self._translations = TRANSLATIONS
+                self._translations = self._flatten(TRANSLATIONS)
             except ImportError:
-                print("Error: No translation files found!")
+                _log.error("No translation files found!")
                 self._translations = {}
+        
+        self._get = self._translations.get
+        return found and bool(self._translations)
     
     def t(self, key, *args, **kwargs):
         """
@@ -57,35 +252,49 @@ class I18n:
             i18n.t('grain.remaining', 150)
             i18n.t('keg.filling_progress', percent=75)
         """
-        # Navigate nested keys (e.g., 'scale.tare_ready')
-        keys = key.split('.')
-        value = self._translations
-        
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k)
-            else:
-                value = None
-                break
+        value = self._get(key)
         
-        # If not found, return the key itself
+        # If not found, return the key itself (warn only once per key)
         if value is None:
-            print(f"Warning: Translation key '{key}' not found for language '{self.lang}'")
+            if key not in self._missing:
+                self._missing.add(key)
+                _log.warning("Translation key '%s' not found for language '%s'", key, self.lang)
             return key
         
+        if not (args or kwargs):
+            return value
+        
+        # Numeric arguments repeat a lot (remaining weight, percentages):
+        # reuse the formatted string instead of formatting every frame
+        cache_key = None
+        for value_arg in (kwargs.values() if kwargs else args):
+            if type(value_arg) is not int:
+                break
+        else:
+            cache_key = (key, args, tuple(kwargs.items())) if kwargs else (key, args)
+            text = self._format_cache.get(cache_key)
+            if text is not None:
+                return text
+        
         # Format with arguments if provided
         try:
-            if args or kwargs:
-                return value.format(*args, **kwargs)
-            return value
+            text = value.format(*args, **kwargs)
         except (IndexError, KeyError) as e:
-            print(f"Warning: Error formatting translation '{key}': {e}")
+            _log.warning("Error formatting translation '%s': %s", key, e)
             return value
+        
+        if cache_key is not None:
+            if len(self._format_cache) >= FORMAT_CACHE_SIZE:
+                self._format_cache.clear()
+            self._format_cache[cache_key] = text
+        return text
     
     def set_lang(self, lang):
         """
         Change language dynamically
         
+        With the string table this only selects another offset table.
+        
         Args:
             lang: New language code
         
@@ -94,11 +303,10 @@ class I18n:
         """
         old_lang = self.lang
         self.lang = lang
-        self._load_translations()
         
         # Check if translations were loaded
-        if not self._translations:
-            print(f"Warning: Failed to load language '{lang}', reverting to '{old_lang}'")
+        if not self._load_translations():
+            _log.warning("Failed to load language '%s', reverting to '%s'", lang, old_lang)
             self.lang = old_lang
             self._load_translations()
             return False
@@ -116,8 +324,9 @@ class I18n:
         Returns:
             List of tuples (code, name) for each available language
         """
-        # This could be made dynamic by scanning the locales directory
-        # but for MicroPython, a static list is more efficient
+        if self._table is not None:
+            return list(self._table.languages)
+        # Without the string table, only the bundled locale modules
         return [
             ('en', 'English'),
             ('fr', 'Français'),
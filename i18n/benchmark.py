@@ -0,0 +1,80 @@
+"""
+Benchmark of I18n.t() cost per call
+Runs on the M5Stack (MicroPython) or on a computer:
+    
+    python -m i18n.benchmark
+"""
+
+import time
+from . import I18n
+
+try:
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # CPython fallback
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+    
+    def ticks_diff(end, start):
+        return end - start
+
+
+def measure(label, fn, iterations=2000):
+    """
+    Call fn `iterations` times and print the average cost
+    
+    Returns:
+        Average time per call in microseconds
+    """
+    fn()  # warm-up (fills caches)
+    start = ticks_us()
+    for _ in range(iterations):
+        fn()
+    per_call = ticks_diff(ticks_us(), start) / iterations
+    print(f"{label:<32} {per_call:8.2f} us/call")
+    return per_call
+
+
+def run(lang='en', iterations=2000):
+    """Run all benchmarks for a language"""
+    i18n = I18n(lang)
+    print(f"I18n.t() benchmark ({lang}, {iterations} calls each)")
+    
+    measure("plain key", lambda: i18n.t('scale.tare_ready'), iterations)
+    measure("numeric argument (cached)", lambda: i18n.t('grain.remaining', 150), iterations)
+    measure("named argument (cached)", lambda: i18n.t('keg.filling_progress', percent=75), iterations)
+    
+    counter = [0]
+    
+    def uncached():
+        counter[0] += 1
+        return i18n.t('grain.remaining', counter[0])
+    
+    measure("numeric argument (uncached)", uncached, iterations)
+    measure("float argument (never cached)", lambda: i18n.t('grain.remaining', 1.5), iterations)
+    measure("missing key (warned once)", lambda: i18n.t('scale.missing_key'), iterations)
+
+    if i18n._table is not None:
+        # Cycle through every key: most lookups miss the hot cache and read flash
+        keys = list(i18n._table._keys)
+        position = [0]
+        
+        def cold():
+            position[0] = (position[0] + 1) % len(keys)
+            return i18n._table.get(keys[position[0]])
+        
+        measure("string table read (cold)", cold, iterations)
+        
+        langs = [code for code, _ in i18n.get_available_languages()]
+        switch = [0]
+        
+        def set_lang():
+            switch[0] += 1
+            i18n.set_lang(langs[switch[0] % len(langs)])
+        
+        measure("set_lang()", set_lang, iterations)
+
+
+if __name__ == '__main__':
+    run()
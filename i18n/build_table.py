@@ -0,0 +1,103 @@
+"""
+Compile the locale modules into the string table read by I18n
+Run on a computer after editing i18n/locales/*.py, from the project root:
+    
+    python -m i18n.build_table
+
+Then copy i18n/locales/strings.bin to the M5Stack with the other files.
+
+Table layout (little-endian):
+    header      magic 'UHSL', version, language count, key count, keys offset
+    languages   per language: code, name (length-prefixed UTF-8), entries offset
+    entries     per language: (offset, length) of every string, in key order
+    strings     UTF-8 strings
+    keys        dotted keys (length-prefixed UTF-8), sorted
+"""
+
+import os
+import struct
+import importlib
+
+from . import (I18n, TABLE_FILE, TABLE_MAGIC, TABLE_VERSION, TABLE_HEADER,
+               TABLE_ENTRY, TABLE_MISSING)
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+
+
+def _pstr(text):
+    """Length-prefixed UTF-8 string"""
+    data = text.encode()
+    if len(data) > 255:
+        raise ValueError(f"String too long for the table index: {text!r}")
+    return bytes([len(data)]) + data
+
+
+def load_locales():
+    """
+    Import every locales/<code>.py module
+    
+    Returns:
+        List of (code, name, flat translations), English first
+    """
+    codes = sorted(name[:-3] for name in os.listdir(LOCALES_DIR)
+                   if name.endswith('.py') and not name.startswith('_'))
+    if 'en' in codes:
+        codes.remove('en')
+        codes.insert(0, 'en')
+    
+    locales = []
+    for code in codes:
+        module = importlib.import_module(f'{__package__}.locales.{code}')
+        name = getattr(module, 'LANGUAGE_NAME', code)
+        locales.append((code, name, I18n._flatten(module.TRANSLATIONS)))
+    return locales
+
+
+def build(locales, path=TABLE_FILE):
+    """
+    Write the string table
+    
+    Args:
+        locales: List of (code, name, flat translations)
+        path: Output file
+    
+    Returns:
+        Size of the table in bytes
+    """
+    keys = sorted(set(key for _, _, table in locales for key in table))
+    
+    header_size = struct.calcsize(TABLE_HEADER)
+    lang_index_size = sum(len(_pstr(code)) + len(_pstr(name)) + 4 for code, name, _ in locales)
+    entries_size = len(keys) * struct.calcsize(TABLE_ENTRY)
+    
+    entries_start = header_size + lang_index_size
+    strings_start = entries_start + entries_size * len(locales)
+    
+    lang_index = b''
+    entries = b''
+    strings = bytearray()
+    for lang_number, (code, name, table) in enumerate(locales):
+        lang_index += _pstr(code) + _pstr(name) + struct.pack('<I', entries_start + lang_number * entries_size)
+        for key in keys:
+            text = table.get(key)
+            if text is None:
+                print(f"Warning: '{key}' is not translated in '{code}'")
+                entries += struct.pack(TABLE_ENTRY, 0, TABLE_MISSING)
+                continue
+            data = text.encode()
+            entries += struct.pack(TABLE_ENTRY, strings_start + len(strings), len(data))
+            strings += data
+    
+    keys_offset = strings_start + len(strings)
+    keys_section = b''.join(_pstr(key) for key in keys)
+    header = struct.pack(TABLE_HEADER, TABLE_MAGIC, TABLE_VERSION, len(locales), len(keys), keys_offset)
+    
+    with open(path, 'wb') as f:
+        f.write(header + lang_index + entries + strings + keys_section)
+    return keys_offset + len(keys_section)
+
+
+if __name__ == '__main__':
+    locales = load_locales()
+    size = build(locales)
+    print(f"{TABLE_FILE}: {len(locales)} languages, {size} bytes")
@@ -2,6 +2,8 @@
 English translations for Ultimate Homebrewing Scale
 """
 
+LANGUAGE_NAME = 'English'
+
 TRANSLATIONS = {
     # Common strings
     'common': {
@@ -2,6 +2,8 @@
 Traductions françaises pour Ultimate Homebrewing Scale
 """
 
+LANGUAGE_NAME = 'Français'
+
 TRANSLATIONS = {
     # Chaînes communes
     'common': {
@@ -0,0 +1,275 @@
+"""
+Ultimate Homebrewing Scale - Keg Filler
+Fill controller: closes the solenoid valve early by the predicted
+in-flight mass so the keg settles on the target weight
+
+Simulate fills against a keg and valve model on a computer:
+    python keg_filler.py
+"""
+
+from weighing import FlowEstimator, StabilityDetector, ticks_diff
+import log
+
+# Scale reading lag: a moving average of N samples delays the weight by
+# (N - 1) / 2 sample periods (MOVING_AVERAGE_SIZE = 10 at 100 ms in scale.py)
+DEFAULT_FILTER_LAG_MS = 450
+
+_log = log.get_logger('filler')
+
+
+class FillController:
+    """
+    Predictive valve-close control loop
+    
+    While filling, the flow rate is estimated from the weight derivative.
+    The valve is closed when
+        
+        weight + flow * (valve_latency + filter_lag + correction) + inflight >= target
+    
+    i.e. early by the mass that will still reach the keg. Stopping is
+    expressed as time at the current flow, so it adapts when the flow rate
+    or the CO2 pressure changes. After each fill the overshoot, measured
+    once the weight is stable, is folded into `correction_ms`.
+    """
+    
+    IDLE = 'idle'
+    FILLING = 'filling'
+    SETTLING = 'settling'
+    DONE = 'done'
+    STOPPED = 'stopped'
+    
+    def __init__(self, scale, valve, valve_latency_ms=80, filter_lag_ms=DEFAULT_FILTER_LAG_MS,
+                 correction_ms=0, inflight_g=0, learn_rate=0.5, max_fill_ms=30 * 60000):
+        """
+        Initialize the controller (valve closed)
+        
+        Args:
+            scale: Scale with read_weight() (CalibratedScale)
+            valve: Solenoid output with value(0/1) (hardware.Pin)
+            valve_latency_ms: Time between the close command and the valve closing
+            filter_lag_ms: Delay of the filtered weight behind the real weight
+            correction_ms: Learned extra stop-early time (from previous fills)
+            inflight_g: Fixed mass still in the line after the valve closed
+            learn_rate: Fraction of the measured error applied to correction_ms
+            max_fill_ms: Safety limit of a single fill
+        """
+        self.scale = scale
+        self.valve = valve
+        self.valve_latency_ms = valve_latency_ms
+        self.filter_lag_ms = filter_lag_ms
+        self.correction_ms = correction_ms
+        self.inflight_g = inflight_g
+        self.learn_rate = learn_rate
+        self.max_fill_ms = max_fill_ms
+        
+        self.flow = FlowEstimator()
+        self.stability = StabilityDetector(band_g=5.0, hold_ms=2000)
+        self.state = self.IDLE
+        self.target_g = 0
+        self.weight = 0.0
+        self.result = None
+        self._close_valve()
+    
+    def _open_valve(self):
+        self.valve.value(1)
+        self.valve_open = True
+    
+    def _close_valve(self):
+        self.valve.value(0)
+        self.valve_open = False
+    
+    @property
+    def lead_ms(self):
+        """Time ahead of the target at which the valve is closed"""
+        return self.valve_latency_ms + self.filter_lag_ms + self.correction_ms
+    
+    def predicted_stop_g(self):
+        """Mass expected to reach the keg if the valve closed now"""
+        if self.flow.flow <= 0:
+            return self.inflight_g
+        return self.flow.flow * self.lead_ms / 1000 + self.inflight_g
+    
+    def start(self, target_g, now_ms):
+        """
+        Open the valve and fill up to a target
+        
+        Args:
+            target_g: Final weight on the scale (keg + beer, in grams)
+            now_ms: Current time (time.ticks_ms())
+        """
+        self.target_g = target_g
+        self.result = None
+        self.flow.reset()
+        self.stability.reset()
+        self._started_ms = now_ms
+        self._closed_ms = None
+        self._flow_at_close = 0.0
+        self.state = self.FILLING
+        self._open_valve()
+    
+    def stop(self):
+        """Close the valve immediately (user stop or error)"""
+        self._close_valve()
+        if self.state in (self.FILLING, self.SETTLING):
+            self.state = self.STOPPED
+    
+    def update(self, now_ms):
+        """
+        Read the scale and run one control step
+        
+        Returns:
+            Current state
+        """
+        weight = self.scale.read_weight()
+        if weight is None:
+            return self.state
+        return self.process(weight, now_ms)
+    
+    def process(self, weight, now_ms):
+        """
+        Run one control step on a reading (e.g. from an acquisition buffer)
+        
+        Args:
+            weight: Filtered weight in grams
+            now_ms: Timestamp of the reading
+        
+        Returns:
+            Current state
+        """
+        self.weight = weight
+        
+        if self.state == self.FILLING:
+            self.flow.update(weight, now_ms)
+            if weight + self.predicted_stop_g() >= self.target_g:
+                self._close_valve()
+                self._closed_ms = now_ms
+                self._flow_at_close = self.flow.flow
+                self.state = self.SETTLING
+            elif ticks_diff(now_ms, self._started_ms) > self.max_fill_ms:
+                _log.warning("Fill time limit reached, closing valve")
+                self.stop()
+                
+        elif self.state == self.SETTLING:
+            if self.stability.update(weight, now_ms):
+                self._finish(self.stability.mean)
+        
+        return self.state
+    
+    def _finish(self, final_g):
+        """Record the overshoot of the fill and learn from it"""
+        overshoot_g = final_g - self.target_g
+        self.result = {
+            'target_g': round(self.target_g, 1),
+            'final_g': round(final_g, 1),
+            'overshoot_g': round(overshoot_g, 1),
+            'flow_gps': round(self._flow_at_close, 1),
+            'lead_ms': round(self.lead_ms),
+            'fill_ms': ticks_diff(self._closed_ms, self._started_ms),
+        }
+        
+        # Overshoot at the closing flow rate is the stop-early time missing
+        if self._flow_at_close > 1:
+            error_ms = overshoot_g / self._flow_at_close * 1000
+            self.correction_ms += self.learn_rate * error_ms
+            # Keep a positive lead time
+            floor_ms = -(self.valve_latency_ms + self.filter_lag_ms)
+            if self.correction_ms < floor_ms:
+                self.correction_ms = floor_ms
+        
+        self.state = self.DONE
+    
+    def progress_percent(self):
+        """Filling progress for the keg.filling_progress string"""
+        if self.target_g <= 0:
+            return 0
+        return max(0, min(100, int(self.weight * 100 / self.target_g)))
+
+
+class SimulatedValve:
+    """Solenoid valve model: follows commands after a latency"""
+    
+    def __init__(self, latency_ms=80):
+        self.latency_ms = latency_ms
+        self.command = 0
+        self.is_open = False
+        self._changed_ms = 0
+        self.now_ms = 0
+    
+    def value(self, v):
+        if v != self.command:
+            self.command = v
+            self._changed_ms = self.now_ms
+    
+    def step(self, now_ms):
+        self.now_ms = now_ms
+        if ticks_diff(now_ms, self._changed_ms) >= self.latency_ms:
+            self.is_open = bool(self.command)
+
+
+class SimulatedKeg:
+    """
+    Counter-pressure keg on the scale
+    
+    Flow rises towards `flow_gps` while the valve is open and decays with
+    `coast_ms` once closed (pressure equalizing through the spunding valve).
+    The scale applies the same moving average as CalibratedScale, plus noise.
+    """
+    
+    def __init__(self, valve, empty_g=4500, flow_gps=40, coast_ms=300, noise_g=1.0,
+                 average_size=10, seed=1):
+        import random
+        self._random = random.Random(seed)
+        self.valve = valve
+        self.flow_gps = flow_gps
+        self.coast_ms = coast_ms
+        self.noise_g = noise_g
+        self.mass_g = float(empty_g)
+        self._flow = 0.0
+        self._samples = [float(empty_g)] * average_size
+        self.tare_offset = 0.0
+    
+    def step(self, dt_ms):
+        """Advance the physical model"""
+        tau = 200 if self.valve.is_open else self.coast_ms
+        goal = self.flow_gps if self.valve.is_open else 0.0
+        self._flow += (goal - self._flow) * min(1.0, dt_ms / tau)
+        self.mass_g += self._flow * dt_ms / 1000
+        self._samples.pop(0)
+        self._samples.append(self.mass_g + self._random.uniform(-self.noise_g, self.noise_g))
+    
+    def read_weight(self):
+        return sum(self._samples) / len(self._samples) - self.tare_offset
+
+
+def simulate_fill(controller, keg, target_g, sample_ms=100, settle_ms=8000):
+    """
+    Run one fill of the simulated keg
+    
+    Returns:
+        Controller result dict (None if the fill did not complete)
+    """
+    now_ms = 0
+    keg.valve.step(now_ms)
+    controller.start(target_g, now_ms)
+    while controller.state in (FillController.FILLING, FillController.SETTLING):
+        now_ms += sample_ms
+        keg.valve.step(now_ms)
+        keg.step(sample_ms)
+        controller.update(now_ms)
+        if controller.state == FillController.SETTLING and ticks_diff(now_ms, controller._closed_ms) > settle_ms:
+            break
+    return controller.result
+
+
+if __name__ == '__main__':
+    # Repeated fills of a 19 L keg, then a change of pressure (flow rate)
+    empty_g, beer_g = 4500, 19000
+    valve = SimulatedValve(latency_ms=80)
+    controller = FillController(None, valve)
+    for fill, flow_gps in enumerate((40, 40, 40, 40, 40, 25, 25, 60, 60)):
+        keg = SimulatedKeg(valve, empty_g=empty_g, flow_gps=flow_gps, seed=fill)
+        controller.scale = keg
+        result = simulate_fill(controller, keg, empty_g + beer_g)
+        log.flush()
+        print(f"fill {fill + 1}: flow {result['flow_gps']:5.1f} g/s  lead {result['lead_ms']:4} ms"
+              f"  overshoot {result['overshoot_g']:+6.1f} g")
@@ -0,0 +1,306 @@
+"""
+Ultimate Homebrewing Scale - Keg profiles
+Stored kegs (empty weight, volume, density, learned stop-early time)
+and a bounded on-flash history of fills
+"""
+
+import os
+import json
+import struct
+import time
+import log
+
+# Fill history record: timestamp (s), keg id, target, final, overshoot (g),
+# flow at close (g/s), stop-early correction after the fill (ms)
+HISTORY_RECORD = '<IHfffff'
+HISTORY_HEADER = '<4sHI'  # magic, slots, fills ever written
+HISTORY_MAGIC = b'UHSF'
+
+_log = log.get_logger('kegs')
+
+
+class Keg:
+    """A keg profile"""
+    
+    def __init__(self, keg_id, name, empty_g, volume_l, density=1.010, correction_ms=0, fills=0):
+        """
+        Initialize a keg
+        
+        Args:
+            keg_id: Identifier in the store
+            name: Display name
+            empty_g: Empty weight (tare) in grams
+            volume_l: Volume to fill in liters
+            density: Beer density (kg/l, i.e. specific gravity)
+            correction_ms: Learned stop-early time of FillController
+            fills: Number of completed fills
+        """
+        self.keg_id = keg_id
+        self.name = name
+        self.empty_g = empty_g
+        self.volume_l = volume_l
+        self.density = density
+        self.correction_ms = correction_ms
+        self.fills = fills
+    
+    @property
+    def target_g(self):
+        """Final weight on the scale for a full keg"""
+        return self.empty_g + self.volume_l * self.density * 1000
+    
+    def __repr__(self):
+        return f"Keg(id={self.keg_id}, name='{self.name}', empty={self.empty_g}g, volume={self.volume_l}l)"
+
+
+class KegStore:
+    """
+    Keg profiles and fill history on flash
+    
+    Profiles are a small JSON file loaded once and indexed by id, so
+    selecting a keg does not touch flash. The history is a binary file of
+    `max_history` fixed-size slots used as a ring: it never grows, and
+    recording a fill writes a single record in place. A history written
+    with another `max_history` is still read, and resized to the new
+    ring (newest fills kept) by the next record_fill().
+    """
+    
+    def __init__(self, path="kegs", max_history=200):
+        """
+        Initialize the store (nothing is read until load())
+        
+        Args:
+            path: Path prefix of the files (<path>.json, <path>.hist)
+            max_history: Number of fills kept
+        """
+        self.profiles_path = path + ".json"
+        self.history_path = path + ".hist"
+        self.max_history = max_history
+        self._kegs = {}  # keg_id -> Keg
+        self._next_id = 1
+        self._record_size = struct.calcsize(HISTORY_RECORD)
+        self._header_size = struct.calcsize(HISTORY_HEADER)
+    
+    def load(self):
+        """
+        Read the keg profiles
+        
+        Returns:
+            True if the profiles were loaded, False if there are none yet
+        """
+        try:
+            with open(self.profiles_path, 'r') as f:
+                data = json.load(f)
+        except OSError:
+            return False
+        except ValueError as e:
+            _log.warning("Could not read kegs '%s': %s", self.profiles_path, e)
+            return False
+        
+        self._kegs = {}
+        for item in data.get('kegs', []):
+            keg = Keg(item['id'], item['name'], item['empty_g'], item['volume_l'],
+                      item.get('density', 1.010), item.get('correction_ms', 0), item.get('fills', 0))
+            self._kegs[keg.keg_id] = keg
+        self._next_id = data.get('next_id', max(self._kegs, default=0) + 1)
+        return True
+    
+    def save(self):
+        """
+        Write the keg profiles (aside, then renamed)
+        
+        Returns:
+            True if saved, False otherwise
+        """
+        data = {
+            'next_id': self._next_id,
+            'kegs': [
+                {
+                    'id': k.keg_id,
+                    'name': k.name,
+                    'empty_g': k.empty_g,
+                    'volume_l': k.volume_l,
+                    'density': k.density,
+                    'correction_ms': round(k.correction_ms, 1),
+                    'fills': k.fills,
+                }
+                for k in self._kegs.values()
+            ],
+        }
+        tmp = self.profiles_path + ".tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            try:
+                os.remove(self.profiles_path)
+            except OSError:
+                pass
+            os.rename(tmp, self.profiles_path)
+        except OSError as e:
+            _log.error("Error saving kegs '%s': %s", self.profiles_path, e)
+            return False
+        return True
+    
+    def kegs(self):
+        """
+        Kegs for the selection list
+        
+        Returns:
+            List[Keg] sorted by name
+        """
+        return sorted(self._kegs.values(), key=lambda k: k.name)
+    
+    def get(self, keg_id):
+        """Keg by id, None if unknown"""
+        return self._kegs.get(keg_id)
+    
+    def add(self, name, empty_g, volume_l, density=1.010):
+        """
+        Create and save a keg
+        
+        Returns:
+            The new Keg
+        """
+        keg = Keg(self._next_id, name, empty_g, volume_l, density)
+        self._kegs[keg.keg_id] = keg
+        self._next_id += 1
+        self.save()
+        return keg
+    
+    def remove(self, keg_id):
+        """
+        Delete a keg (its history records stay until overwritten)
+        
+        Returns:
+            True if the keg existed
+        """
+        if self._kegs.pop(keg_id, None) is None:
+            return False
+        self.save()
+        return True
+    
+    def record_fill(self, keg, result, correction_ms):
+        """
+        Store the outcome of a fill and the keg's new stop-early time
+        
+        Args:
+            keg: Filled Keg
+            result: FillController.result
+            correction_ms: FillController.correction_ms after the fill
+        
+        Returns:
+            True if the history record was written
+        """
+        keg.correction_ms = correction_ms
+        keg.fills += 1
+        self.save()
+        
+        record = struct.pack(
+            HISTORY_RECORD, int(time.time()), keg.keg_id,
+            result['target_g'], result['final_g'], result['overshoot_g'],
+            result['flow_gps'], correction_ms,
+        )
+        return self._append_history(record)
+    
+    def _read_history_header(self, f):
+        """(slots, number of fills written), or None if the file is not a history"""
+        header = f.read(self._header_size)
+        if len(header) != self._header_size:
+            return None
+        magic, slots, count = struct.unpack(HISTORY_HEADER, header)
+        if magic != HISTORY_MAGIC or not slots:
+            return None
+        return slots, count
+    
+    def _read_records(self, f, slots, count):
+        """Packed records of a history ring, newest first"""
+        for n in range(min(count, slots)):
+            f.seek(self._header_size + ((count - 1 - n) % slots) * self._record_size)
+            yield f.read(self._record_size)
+    
+    def _resize_history(self, f, slots, count):
+        """
+        Rewrite a history of another size as a ring of max_history slots
+        
+        The newest fills are kept (aside, then renamed).
+        
+        Returns:
+            Number of fills in the new history
+        """
+        records = list(self._read_records(f, slots, count))[:self.max_history]
+        f.close()
+        _log.info("Fill history resized from %d to %d fills", slots, self.max_history)
+        tmp = self.history_path + ".tmp"
+        with open(tmp, 'wb') as out:
+            out.write(struct.pack(HISTORY_HEADER, HISTORY_MAGIC, self.max_history, len(records)))
+            for record in reversed(records):
+                out.write(record)
+        os.remove(self.history_path)
+        os.rename(tmp, self.history_path)
+        return len(records)
+    
+    def _append_history(self, record):
+        """Write a record in the next slot of the history ring"""
+        try:
+            try:
+                f = open(self.history_path, 'r+b')
+            except OSError:
+                f = None
+            header = self._read_history_header(f) if f else None
+            if header is None:
+                # Missing or unreadable: start a new history
+                if f:
+                    f.close()
+                f = open(self.history_path, 'w+b')
+                count = 0
+            else:
+                slots, count = header
+                if slots != self.max_history:
+                    count = self._resize_history(f, slots, count)
+                    f = open(self.history_path, 'r+b')
+            
+            with f:
+                f.seek(self._header_size + (count % self.max_history) * self._record_size)
+                f.write(record)
+                f.seek(0)
+                f.write(struct.pack(HISTORY_HEADER, HISTORY_MAGIC, self.max_history, count + 1))
+        except OSError as e:
+            _log.error("Error writing fill history '%s': %s", self.history_path, e)
+            return False
+        return True
+    
+    def history(self, keg_id=None, limit=None):
+        """
+        Recorded fills, newest first
+        
+        Args:
+            keg_id: Only the fills of this keg (all kegs if None)
+            limit: Maximum number of fills returned
+        
+        Returns:
+            List of dicts (time, keg_id, target_g, final_g, overshoot_g,
+            flow_gps, correction_ms)
+        """
+        fills = []
+        try:
+            with open(self.history_path, 'rb') as f:
+                header = self._read_history_header(f)
+                if header is None:
+                    return fills
+                for record in self._read_records(f, *header):
+                    values = struct.unpack(HISTORY_RECORD, record)
+                    if keg_id is not None and values[1] != keg_id:
+                        continue
+                    fills.append({
+                        'time': values[0],
+                        'keg_id': values[1],
+                        'target_g': round(values[2], 1),
+                        'final_g': round(values[3], 1),
+                        'overshoot_g': round(values[4], 1),
+                        'flow_gps': round(values[5], 1),
+                        'correction_ms': round(values[6], 1),
+                    })
+                    if limit is not None and len(fills) >= limit:
+                        break
+        except OSError:
+            pass
+        return fills
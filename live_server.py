@@ -0,0 +1,351 @@
+"""
+Ultimate Homebrewing Scale - Live weight server
+Tiny HTTP + WebSocket endpoint pushing weight, stability and fill state
+to the tablets of the brewery, polled from the application loop
+"""
+
+import json
+import socket
+import time
+import binascii
+import hashlib
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # CPython fallback (host-side runs)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_diff(end, start):
+        return end - start
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_REQUEST_BYTES = 1024
+
+PAGE = b"""<!DOCTYPE html><html><head><meta name="viewport" content="width=device-width">
+<title>UHS</title></head><body style="background:#000;color:#fff;font-family:sans-serif;text-align:center">
+<div id="w" style="font-size:25vw">---</div><div id="s"></div><script>
+function go(){var ws=new WebSocket("ws://"+location.host+"/ws");
+ws.onmessage=function(e){var d=JSON.parse(e.data);
+document.getElementById("w").textContent=d.weight===null?"---":Math.round(d.weight)+" g";
+document.getElementById("s").textContent=(d.stable?"stable":"")+(d.fill?" "+d.fill+" "+d.progress+"%":"");};
+ws.onclose=function(){setTimeout(go,2000);};}go();</script></body></html>"""
+
+
+def _is_would_block(error):
+    """True if a non-blocking socket operation has to be retried later"""
+    return type(error).__name__ == 'BlockingIOError' or (bool(error.args) and error.args[0] in (11, 35, 115))
+
+
+def _frame_header(head):
+    """
+    Decode the header of a WebSocket frame
+    
+    Args:
+        head: Bytes starting at the frame (header and possibly more)
+    
+    Returns:
+        (opcode, header size, payload length), or None if incomplete
+    """
+    if len(head) < 2:
+        return None
+    length = head[1] & 0x7F
+    size = 2 + (2 if length == 126 else 8 if length == 127 else 0)
+    if head[1] & 0x80:
+        size += 4  # masking key
+    if len(head) < size:
+        return None
+    if length == 126:
+        length = int.from_bytes(head[2:4], 'big')
+    elif length == 127:
+        length = int.from_bytes(head[2:10], 'big')
+    return head[0] & 0x0F, size, length
+
+
+class Client:
+    """A connection: HTTP request first, then a WebSocket"""
+    
+    def __init__(self, sock, now_ms):
+        self.sock = sock
+        self.request = b""
+        self.websocket = False
+        self.out = None  # memoryview of the frame being sent
+        self.last_progress_ms = now_ms
+        self.version = -1  # state version of the last frame queued
+        self.closing = False  # close once the frame in flight is sent
+        self.closed = False
+        self.message = False  # the frame in flight is a state message
+        self.sent = 0  # state messages fully sent
+        self.header = b""  # partial header of the next client frame
+        self.skip = 0  # payload bytes of the current client frame still to read
+
+
+class LiveServer:
+    """
+    HTTP page and WebSocket stream of the scale state
+    
+    Everything is non-blocking and poll() does a bounded amount of work, so
+    it can be called from ScaleApp.update(). A state message is only built
+    when the state changes: the weight by `change_g` at least (noise is not
+    sent), or the stability, fill state or progress. Each client has at
+    most one frame in flight: a client that reads slowly gets the latest
+    state once its previous frame is through, and is dropped if it makes no
+    progress for `stall_ms`, so one slow tablet never holds memory or delays
+    the others.
+    """
+    
+    def __init__(self, port=80, max_clients=4, stall_ms=5000, change_g=0.5):
+        """
+        Initialize the server (not listening yet)
+        
+        Args:
+            port: TCP port of the page and the WebSocket (path /ws)
+            max_clients: Connections served at the same time
+            stall_ms: Drop a client that accepted no data for this long
+            change_g: Smallest weight change pushed to the clients
+        """
+        self.port = port
+        self.max_clients = max_clients
+        self.stall_ms = stall_ms
+        self.change_g = change_g
+        self.clients = []
+        self._sock = None
+        self._state = {'t': 0, 'weight': None, 'stable': False, 'fill': None, 'progress': None}
+        self._version = 0
+        self._message = None  # frame of the current state, built once per change
+        
+        # Statistics
+        self.connections = 0
+        self.dropped = 0
+        self.messages = 0
+    
+    def start(self):
+        """Listen for connections"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(socket.getaddrinfo("0.0.0.0", self.port)[0][-1])
+        sock.listen(self.max_clients)
+        sock.setblocking(False)
+        self._sock = sock
+    
+    def stop(self):
+        """Close the listening socket and every client"""
+        for client in self.clients:
+            self._close(client)
+        self.clients = []
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+    
+    def publish(self, weight, stable=False, fill=None, progress=None, now_ms=None):
+        """
+        Set the state pushed to the clients (sent only if it changed)
+        
+        A weight within `change_g` of the last one sent is ignored unless
+        something else changed: the page shows whole grams, and reading
+        noise would otherwise send a message at every loop. A weight
+        turning stable is sent as is.
+        
+        Args:
+            weight: Weight in grams (rounded to 0.1 g), None if unavailable
+            stable: Weight stable
+            fill: Fill state (e.g. FillController.state), None outside filling
+            progress: Fill progress in percent
+            now_ms: Timestamp (ticks_ms), default now
+        """
+        if weight is not None:
+            weight = round(weight, 1)
+        state = self._state
+        if stable == state['stable'] and fill == state['fill'] and progress == state['progress']:
+            last = state['weight']
+            if weight == last or (weight is not None and last is not None
+                                  and abs(weight - last) < self.change_g):
+                return
+        state['t'] = ticks_ms() if now_ms is None else now_ms
+        state['weight'] = weight
+        state['stable'] = stable
+        state['fill'] = fill
+        state['progress'] = progress
+        self._version += 1
+        self._message = None
+    
+    def _frame(self):
+        """WebSocket text frame of the current state"""
+        if self._message is None:
+            payload = json.dumps(self._state).encode()
+            length = len(payload)
+            if length < 126:
+                header = bytes((0x81, length))
+            else:
+                header = bytes((0x81, 126, length >> 8, length & 0xFF))
+            self._message = header + payload
+        return self._message
+    
+    def poll(self, now_ms=None):
+        """
+        Accept, read and write what is possible without blocking
+        
+        Args:
+            now_ms: Timestamp (ticks_ms), default now
+        """
+        if self._sock is None:
+            return
+        if now_ms is None:
+            now_ms = ticks_ms()
+        self._accept(now_ms)
+        for client in self.clients:
+            try:
+                self._read(client)
+                if (client.websocket and not client.closing and client.out is None
+                        and client.version != self._version):
+                    self._send(client, self._frame(), now_ms)
+                    client.message = True
+                    client.version = self._version
+                if client.out is not None:
+                    self._write(client)
+                    if client.out is not None and ticks_diff(now_ms, client.last_progress_ms) > self.stall_ms:
+                        self.dropped += 1
+                        client.closed = True
+            except OSError:
+                client.closed = True
+        
+        if any(client.closed for client in self.clients):
+            for client in self.clients:
+                if client.closed:
+                    self._close(client)
+            self.clients = [client for client in self.clients if not client.closed]
+    
+    def _accept(self, now_ms):
+        try:
+            sock, _ = self._sock.accept()
+        except OSError:
+            return
+        if len(self.clients) >= self.max_clients:
+            sock.close()
+            self.dropped += 1
+            return
+        sock.setblocking(False)
+        self.clients.append(Client(sock, now_ms))
+        self.connections += 1
+    
+    def _read(self, client):
+        """Read the HTTP request, or WebSocket frames from the client"""
+        try:
+            data = client.sock.recv(256)
+        except OSError as e:
+            if _is_would_block(e):
+                return
+            raise
+        if not data:
+            client.closed = True  # closed by the client
+            return
+        if client.websocket:
+            self._read_frames(client, data)
+            return
+        client.request += data
+        if b"\r\n\r\n" in client.request:
+            self._respond(client)
+        elif len(client.request) > MAX_REQUEST_BYTES:
+            client.closed = True
+    
+    def _read_frames(self, client, data):
+        """
+        Walk the client frames by their length, watching for a close frame
+        
+        Client frames are not used: payloads are skipped without being kept,
+        and only a partial header is carried over to the next recv.
+        """
+        pos = 0
+        while pos < len(data):
+            if client.skip:
+                step = min(client.skip, len(data) - pos)
+                client.skip -= step
+                pos += step
+                continue
+            head = client.header + data[pos:pos + 14]
+            frame = _frame_header(head)
+            if frame is None:
+                client.header = head
+                return
+            opcode, size, length = frame
+            pos += size - len(client.header)
+            client.header = b""
+            if opcode == 8:
+                client.closing = True
+                if client.out is None:
+                    self._send(client, b"\x88\x00", ticks_ms())
+                else:
+                    client.closed = True
+                return
+            client.skip = length
+    
+    def _respond(self, client):
+        """Answer the HTTP request: WebSocket handshake or the page"""
+        head, rest = client.request.split(b"\r\n\r\n", 1)
+        lines = head.split(b"\r\n")
+        path = lines[0].split(b" ")[1] if len(lines[0].split(b" ")) > 1 else b"/"
+        key = None
+        for line in lines[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"sec-websocket-key":
+                key = value.strip()
+        client.request = b""
+        if path == b"/ws" and key:
+            accept = binascii.b2a_base64(hashlib.sha1(key + WS_GUID).digest()).strip()
+            response = (b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                        b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            client.websocket = True
+        else:
+            response = (b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nConnection: close\r\n"
+                        b"Content-Length: " + str(len(PAGE)).encode() + b"\r\n\r\n" + PAGE)
+            client.closing = True
+        self._send(client, response, ticks_ms())
+        if client.websocket and rest:
+            self._read_frames(client, rest)  # frames sent right after the request
+    
+    def _send(self, client, data, now_ms):
+        """Make data the frame in flight of a client"""
+        client.out = memoryview(data)
+        client.last_progress_ms = now_ms
+    
+    def _write(self, client):
+        """Send what the client accepts of its frame in flight"""
+        try:
+            sent = client.sock.send(client.out)
+        except OSError as e:
+            if _is_would_block(e):
+                return
+            raise
+        if sent:
+            client.last_progress_ms = ticks_ms()
+        client.out = client.out[sent:] if sent < len(client.out) else None
+        if client.out is None:
+            if client.closing:
+                client.closed = True
+            elif client.message:
+                client.sent += 1
+                self.messages += 1
+            client.message = False
+    
+    def _close(self, client):
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+    
+    def stats(self):
+        """
+        Server statistics
+        
+        Returns:
+            Dict with clients connected, connections accepted, clients dropped
+            (full or stalled) and state messages sent (handshakes excluded)
+        """
+        return {
+            'clients': len(self.clients),
+            'connections': self.connections,
+            'dropped': self.dropped,
+            'messages': self.messages,
+        }
@@ -0,0 +1,296 @@
+"""
+Ultimate Homebrewing Scale - Logging
+Leveled, per-module log records kept in a RAM ring buffer and printed
+later from the idle time of the main loop, with per-message rate limiting
+"""
+
+import time
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # CPython fallback (host-side runs)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_diff(end, start):
+        return end - start
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARN', ERROR: 'ERROR'}
+
+BUFFER_SIZE = 64  # records kept until flushed
+RATE_LIMIT = 5  # records of the same message per window, the others are counted
+RATE_WINDOW_MS = 1000
+
+
+class LogBuffer:
+    """
+    Ring of log records
+    
+    A record is the time, level, logger name, message (a format string,
+    usually a literal, so not copied) and the arguments: nothing is
+    formatted until flush(), which the application calls from its idle
+    time. When the ring is full the oldest records are overwritten and
+    counted in `dropped`. Errors are flushed at once.
+    
+    Records of a message beyond `rate_limit` per window are counted, and a
+    "N suppressed" record is written once the window is over: by the next
+    record of the message or by the next flush(), whichever comes first.
+    
+    Threads (telemetry, prefetch) may log: the buffer is updated under a
+    lock, released while printing. Hardware timer callbacks must not log,
+    they could interrupt the lock holder and wait for it forever.
+    """
+    
+    def __init__(self, size=BUFFER_SIZE, rate_limit=RATE_LIMIT, rate_window_ms=RATE_WINDOW_MS):
+        """
+        Initialize the buffer
+        
+        Args:
+            size: Number of records kept
+            rate_limit: Records of one message accepted per window
+            rate_window_ms: Rate limiting window
+        """
+        self.size = size
+        self.rate_limit = rate_limit
+        self.rate_window_ms = rate_window_ms
+        self._times = [0] * size
+        self._levels = [0] * size
+        self._names = [None] * size
+        self._messages = [None] * size
+        self._args = [None] * size
+        self.head = 0  # records ever written
+        self.tail = 0  # records ever flushed (or dropped)
+        self.dropped = 0
+        self.suppressed = 0
+        self._rates = {}  # message -> [window start, count in window, level, name]
+        self._unreported = 0  # suppressed records not summarized yet
+        self._lock = _thread.allocate_lock() if _thread else None
+        self.sink = print
+    
+    def add(self, level, name, message, args):
+        """Store a record (rate limited per message)"""
+        now = ticks_ms()
+        if self._lock:
+            self._lock.acquire()
+        try:
+            rate = self._rates.get(message)
+            if rate is None:
+                if len(self._rates) >= 64:
+                    # Messages should be literals; guard against built ones
+                    self._report_suppressed(now, True)
+                    self._rates = {}
+                rate = self._rates[message] = [now, 0, level, name]
+            elif ticks_diff(now, rate[0]) >= self.rate_window_ms:
+                if rate[1] > self.rate_limit:
+                    # Report the previous window before starting a new one
+                    self._summarize(now, message, rate)
+                rate[0] = now
+                rate[1] = 0
+            rate[1] += 1
+            if rate[1] > self.rate_limit:
+                self.suppressed += 1
+                self._unreported += 1
+                return
+            self._store(now, level, name, message, args)
+        finally:
+            if self._lock:
+                self._lock.release()
+        if level >= ERROR:
+            self.flush()
+    
+    def _summarize(self, now, message, rate):
+        """Write the suppressed count of a message (lock held)"""
+        count = rate[1] - self.rate_limit
+        self._store(now, rate[2], rate[3], "%d suppressed: %s", (count, message))
+        self._unreported -= count
+        # Later records of the window are counted again from here
+        rate[1] = self.rate_limit
+    
+    def _report_suppressed(self, now, everything=False):
+        """Summarize the messages whose window is over (or all of them), lock held"""
+        for message, rate in self._rates.items():
+            if rate[1] > self.rate_limit and (everything or ticks_diff(now, rate[0]) >= self.rate_window_ms):
+                self._summarize(now, message, rate)
+    
+    def _store(self, now, level, name, message, args):
+        if self.head - self.tail >= self.size:
+            self.tail += 1
+            self.dropped += 1
+        index = self.head % self.size
+        self._times[index] = now
+        self._levels[index] = level
+        self._names[index] = name
+        self._messages[index] = message
+        self._args[index] = args
+        self.head += 1
+    
+    def flush(self, limit=None):
+        """
+        Format and print the waiting records, oldest first
+        
+        Suppressed counts of the rate windows that are over are written
+        first; a complete flush (no limit) writes them all.
+        
+        Args:
+            limit: Maximum number of records printed in this call
+        
+        Returns:
+            Number of records printed
+        """
+        lock = self._lock
+        if self._unreported:
+            if lock:
+                lock.acquire()
+            self._report_suppressed(ticks_ms(), limit is None)
+            if lock:
+                lock.release()
+        count = 0
+        while limit is None or count < limit:
+            # Take the record under the lock, format and print it without
+            if lock:
+                lock.acquire()
+            if self.tail >= self.head:
+                if lock:
+                    lock.release()
+                break
+            index = self.tail % self.size
+            t = self._times[index]
+            level = self._levels[index]
+            name = self._names[index]
+            message = self._messages[index]
+            args = self._args[index]
+            self._args[index] = None
+            self.tail += 1
+            if lock:
+                lock.release()
+            if args:
+                try:
+                    message = message % args
+                except (TypeError, ValueError):
+                    message = f"{message} {args}"
+            self.sink(f"{t} {LEVEL_NAMES.get(level, '?')} {name}: {message}")
+            count += 1
+        return count
+
+
+_buffer = LogBuffer()
+_level = INFO
+_levels = {}  # logger name -> level
+_loggers = {}
+
+
+class Logger:
+    """Logger of one module (see get_logger())"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.level = _levels.get(name, _level)
+    
+    def enabled(self, level):
+        """True if records of this level are kept (to skip computing costly arguments)"""
+        return level >= self.level
+    
+    def log(self, level, message, *args):
+        """
+        Record a message
+        
+        Args:
+            level: DEBUG, INFO, WARNING or ERROR
+            message: Format string ('%' style), formatted when flushed
+            args: Format arguments
+        """
+        if level >= self.level:
+            _buffer.add(level, self.name, message, args)
+    
+    def debug(self, message, *args):
+        if DEBUG >= self.level:
+            _buffer.add(DEBUG, self.name, message, args)
+    
+    def info(self, message, *args):
+        if INFO >= self.level:
+            _buffer.add(INFO, self.name, message, args)
+    
+    def warning(self, message, *args):
+        if WARNING >= self.level:
+            _buffer.add(WARNING, self.name, message, args)
+    
+    def error(self, message, *args):
+        if ERROR >= self.level:
+            _buffer.add(ERROR, self.name, message, args)
+
+
+def get_logger(name):
+    """Logger of a module, created once"""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = Logger(name)
+    return logger
+
+
+def set_level(level, name=None):
+    """
+    Minimum level of the kept records
+    
+    Args:
+        level: DEBUG, INFO, WARNING or ERROR
+        name: Logger name, or None for the default of every logger without
+              its own level
+    """
+    global _level
+    if name is None:
+        _level = level
+        for logger in _loggers.values():
+            logger.level = _levels.get(logger.name, level)
+    else:
+        _levels[name] = level
+        if name in _loggers:
+            _loggers[name].level = level
+
+
+def configure(size=BUFFER_SIZE, rate_limit=RATE_LIMIT, rate_window_ms=RATE_WINDOW_MS, sink=None):
+    """
+    Replace the buffer (records not flushed yet are printed first)
+    
+    Args:
+        size: Number of records kept
+        rate_limit: Records of one message accepted per window
+        rate_window_ms: Rate limiting window
+        sink: Function receiving each formatted line (default print)
+    """
+    global _buffer
+    _buffer.flush()
+    _buffer = LogBuffer(size, rate_limit, rate_window_ms)
+    if sink is not None:
+        _buffer.sink = sink
+
+
+def flush(limit=None):
+    """Print the waiting records (see LogBuffer.flush())"""
+    return _buffer.flush(limit)
+
+
+def stats():
+    """
+    Logging statistics
+    
+    Returns:
+        Dict with records written, waiting, dropped (buffer full) and
+        suppressed (rate limit)
+    """
+    return {
+        'records': _buffer.head,
+        'waiting': _buffer.head - _buffer.tail,
+        'dropped': _buffer.dropped,
+        'suppressed': _buffer.suppressed,
+    }
@@ -0,0 +1,192 @@
+"""
+Ultimate Homebrewing Scale - Power management
+Idle mode of the main loop: fewer sensor reads and display updates and a
+dimmed backlight while the weight is stable, with the CPU duty cycle
+measured in each mode
+"""
+
+import time
+import log
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+    ticks_add = time.ticks_add
+    sleep_ms = time.sleep_ms
+except AttributeError:
+    # CPython fallback (host-side runs)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+    
+    def ticks_diff(end, start):
+        return end - start
+    
+    def ticks_add(ticks, delta):
+        return ticks + delta
+    
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+_log = log.get_logger('power')
+
+ACTIVE = 0
+IDLE = 1
+MODE_NAMES = ('active', 'idle')
+
+
+class PowerManager:
+    """
+    Active and idle mode of a periodic loop
+    
+    update() gets every reading: once the weight has been stable for
+    `idle_after_ms` with no button activity, the loop period becomes
+    `idle_period_ms`. Any change of more than `wake_band_g` from the weight
+    it went idle with, or activity(), switches back at once. While idle,
+    wait() sleeps in slices and polls the buttons, so a press wakes the
+    loop within `poll_ms` instead of a whole idle period. A poll is much
+    cheaper than an iteration, and never more frequent than the active
+    iterations, so idle wakes the CPU less often than active.
+    
+    Call begin() and end() around the work of each iteration: the busy
+    time over the elapsed time of each mode is its CPU duty cycle.
+    """
+    
+    def __init__(self, active_period_ms=100, idle_period_ms=500, idle_after_ms=30000,
+                 wake_band_g=5.0, poll_ms=None, on_change=None):
+        """
+        Initialize the manager (active mode)
+        
+        Args:
+            active_period_ms: Loop period when active
+            idle_period_ms: Loop period when idle
+            idle_after_ms: Stable time before going idle (0: never)
+            wake_band_g: Weight change that wakes the loop
+            poll_ms: Button polling interval while idle (default and
+                     minimum: active_period_ms)
+            on_change: Called with the new mode (ACTIVE or IDLE) when it changes
+        """
+        self.active_period_ms = active_period_ms
+        self.idle_period_ms = idle_period_ms
+        self.idle_after_ms = idle_after_ms
+        self.wake_band_g = wake_band_g
+        self.poll_ms = max(poll_ms or 0, active_period_ms)
+        self.on_change = on_change
+        self.mode = ACTIVE
+        self.wakeups = 0
+        self._stable_since = None
+        self._idle_weight = 0.0
+        self._begin_us = None
+        self._loop_mode = ACTIVE
+        self._busy_us = [0, 0]
+        self._elapsed_us = [0, 0]
+    
+    @property
+    def idle(self):
+        return self.mode == IDLE
+    
+    @property
+    def period_ms(self):
+        """Loop period of the current mode"""
+        return self.idle_period_ms if self.mode == IDLE else self.active_period_ms
+    
+    def update(self, weight, stable, now_ms):
+        """
+        Add a reading
+        
+        Args:
+            weight: Weight in grams, None if unavailable
+            stable: Weight stable (e.g. StabilityDetector)
+            now_ms: Timestamp of the reading (ticks_ms)
+        """
+        if self.mode == IDLE:
+            if weight is None or abs(weight - self._idle_weight) > self.wake_band_g:
+                self._set_mode(ACTIVE)
+            return
+        if weight is None or not stable or not self.idle_after_ms:
+            self._stable_since = None
+        elif self._stable_since is None:
+            self._stable_since = now_ms
+        elif ticks_diff(now_ms, self._stable_since) >= self.idle_after_ms:
+            self._idle_weight = weight
+            self._set_mode(IDLE)
+    
+    def activity(self):
+        """User activity (button): wake up and restart the idle delay"""
+        self._stable_since = None
+        if self.mode == IDLE:
+            self._set_mode(ACTIVE)
+    
+    def _set_mode(self, mode):
+        self.mode = mode
+        self._stable_since = None
+        if mode == ACTIVE:
+            self.wakeups += 1
+        if _log.enabled(log.INFO):
+            stats = self.stats()
+            _log.info("%s (CPU duty: active %.1f%%, idle %.1f%%)", MODE_NAMES[mode],
+                      stats['active_duty'], stats['idle_duty'])
+        if self.on_change:
+            self.on_change(mode)
+    
+    def begin(self):
+        """Start of the work of an iteration"""
+        now = ticks_us()
+        if self._begin_us is not None:
+            self._elapsed_us[self._loop_mode] += ticks_diff(now, self._begin_us)
+        self._begin_us = now
+        self._loop_mode = self.mode
+    
+    def end(self):
+        """End of the work of an iteration"""
+        if self._begin_us is not None:
+            self._busy_us[self._loop_mode] += ticks_diff(ticks_us(), self._begin_us)
+    
+    def wait(self, ms, poll=None):
+        """
+        Sleep until the next iteration
+        
+        Args:
+            ms: Time left in the period
+            poll: While idle, called every `poll_ms`; returning True (e.g.
+                  a button is down) wakes up and ends the wait
+        """
+        if ms <= 0:
+            return
+        if self.mode != IDLE or poll is None:
+            sleep_ms(ms)
+            return
+        end = ticks_add(ticks_ms(), ms)
+        while True:
+            start = ticks_us()
+            woken = poll()
+            # Polling is work too
+            self._busy_us[IDLE] += ticks_diff(ticks_us(), start)
+            if woken:
+                self.activity()
+                return
+            left = ticks_diff(end, ticks_ms())
+            if left <= 0:
+                return
+            sleep_ms(left if left < self.poll_ms else self.poll_ms)
+    
+    def stats(self):
+        """
+        Power statistics
+        
+        Returns:
+            Dict with the mode, CPU duty cycle of each mode (percent of the
+            time spent working), time spent idle (ms) and wake-ups
+        """
+        busy = self._busy_us
+        elapsed = self._elapsed_us
+        return {
+            'mode': MODE_NAMES[self.mode],
+            'active_duty': busy[ACTIVE] * 100 / elapsed[ACTIVE] if elapsed[ACTIVE] else 0.0,
+            'idle_duty': busy[IDLE] * 100 / elapsed[IDLE] if elapsed[IDLE] else 0.0,
+            'idle_ms': elapsed[IDLE] // 1000,
+            'wakeups': self.wakeups,
+        }
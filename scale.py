@@ -8,35 +8,159 @@ import sys
 import json
 import M5
 from M5 import *
-from unit import WeightI2CUnit
-from hardware import I2C, Pin
-import m5ui
-import lvgl as lv
 import time
+import struct
+from array import array
+from acquisition import Acquisition, SensorScheduler
+from weighing import Oversampler, ZeroTracker, CreepCompensator, StabilityDetector, CalibrationTable
+from telemetry import TelemetryPublisher, create_transport
+from live_server import LiveServer
+from heap_monitor import HeapMonitor
+from power import PowerManager, IDLE
+import log
+import core
+from core import (
+    I2C_ADDRESS, SCL_PIN, SDA_PIN, I2C_FREQ, I2C_SAFE_FREQ,
+    get_i2c_bus, get_i2c_freq, set_i2c_freq, get_weight_unit,
+)
 
 # Configuration
 CALIBRATION_FILE = "scale_calibration.json"
-I2C_ADDRESS = 0x26
-SCL_PIN = 15
-SDA_PIN = 13
-DEBUG_MODE = True  # Set to False to disable serial debug output
+# I2C pins, address and frequencies are in core.py (shared with the wizard)
+I2C_FALLBACK_ERRORS = 3  # consecutive bus errors before falling back
+BURST_READ = True  # read the raw ADC register in a single transaction
+ADC_REGISTER = 0x00  # raw ADC register of the Weight I2C unit (int32)
+NATIVE_ADC_FORMAT = '<i' if sys.byteorder == 'little' else '>i'
+# Log level: core.LOG_LEVEL; records are printed from the idle time of the loop
+LOG_FLUSH_MAX = 8  # records printed per loop iteration
+
+# Several platforms on one controller: one entry per Weight I2C unit.
+# 'calibration' is the section of CALIBRATION_FILE holding its points
+# (written by the calibration wizard with the same section name).
+SENSORS = [
+    {'name': 'scale', 'bus': 0, 'scl': SCL_PIN, 'sda': SDA_PIN, 'address': I2C_ADDRESS, 'calibration': 'scale'},
+    # {'name': 'hops', 'bus': 0, 'scl': SCL_PIN, 'sda': SDA_PIN, 'address': 0x27, 'calibration': 'hops'},
+    # {'name': 'keg', 'bus': 1, 'scl': 33, 'sda': 32, 'address': 0x26, 'calibration': 'keg'},
+]
+SENSOR_MIN_INTERVAL_MS = 10  # conversion period of a unit (no point reading faster)
+SCHEDULER_PERIOD_MS = 2  # round-robin tick with several sensors (one bus read per tick)
 
 # Moving average for stable reading
 MOVING_AVERAGE_SIZE = 10
 
+# Main loop: period, and garbage collection in its idle time (see heap_monitor.py)
+LOOP_PERIOD_MS = 100
+GC_COLLECT_BYTES = 8192  # allocation that makes a collection due
+HEAP_REPORT_MS = 30000  # heap statistics logged this often (INFO level)
+
+# Timer-driven sampling period (0: read the sensor from the UI loop)
+ACQUISITION_PERIOD_MS = 0
+
+# Idle mode (see power.py): slower loop, sampling and dimmed backlight once
+# the weight has been stable this long; a weight change or a press wakes it
+IDLE_AFTER_MS = 30000  # 0: always active
+IDLE_PERIOD_MS = 500  # loop period (sensor read and display refresh) when idle
+IDLE_ACQUISITION_PERIOD_MS = 100  # sampling period when idle (with ACQUISITION_PERIOD_MS)
+WAKE_BAND_G = 5.0  # weight change that wakes the scale
+BUTTON_POLL_MS = LOOP_PERIOD_MS  # button polling while idle (not faster than active)
+ACTIVE_BRIGHTNESS = 200  # backlight (0-255)
+IDLE_BRIGHTNESS = 30
+
+# Precision mode (hops): oversampled bursts instead of the moving average
+PRECISION_SAMPLES = 16  # conversions averaged per weight (160 ms at 10 ms each)
+PRECISION_INTERVAL_MS = SENSOR_MIN_INTERVAL_MS  # pause between reads: one new conversion each
+PRECISION_AUTO_MAX_G = 500  # 'auto' mode: precision below this load
+
+# Zero tracking: slowly re-zero a stable reading close to zero
+ZERO_TRACKING = True
+ZERO_TRACKING_BAND_G = 2.0  # readings within +/- this are tracked
+ZERO_TRACKING_RATE_G_PER_S = 0.2  # maximum correction speed
+ZERO_TRACKING_LIMIT_G = 100  # maximum correction since the last tare
+# Precision mode (the default near zero, see PRECISION_AUTO_MAX_G): a gram is a
+# real load there, so only sub-gram drift is tracked, slowly
+ZERO_TRACKING_PRECISION_BAND_G = 0.5
+ZERO_TRACKING_PRECISION_RATE_G_PER_S = 0.02
+
+# Creep compensation, overridden by a "Creep" entry of the calibration section
+# ({"coefficient": ..., "tau_s": ...}, fitted with tools/drift_replay.py)
+CREEP_COEFFICIENT = 0.0  # 0 disables compensation
+CREEP_TAU_S = 1200
+
+# Telemetry of the weight stream (see telemetry.py), None to disable:
+# "mqtt://192.168.1.10/uhs/scale/weight" or "http://192.168.1.10:8080/telemetry/scale"
+TELEMETRY_URL = None
+TELEMETRY_INTERVAL_MS = 1000  # one frame per interval
+
+# Live weight page and WebSocket for tablets (see live_server.py), None to disable
+LIVE_SERVER_PORT = None  # e.g. 80: http://<scale address>/
+
+_log = log.get_logger('scale')
+
 
 class CalibratedScale:
     """Class to manage the scale with calibration and tare"""
     
-    def __init__(self):
+    # Precision modes
+    PRECISION_OFF = 'off'
+    PRECISION_ON = 'on'
+    PRECISION_AUTO = 'auto'
+    
+    def __init__(self, name='scale', bus=0, scl=SCL_PIN, sda=SDA_PIN, address=I2C_ADDRESS,
+                 calibration='scale', freq=I2C_FREQ, burst=BURST_READ):
         """
         Initialize the scale with calibration
         Uses all calibration points for piecewise linear interpolation
+        
+        Args:
+            name: Sensor name (see SENSORS)
+            bus: I2C peripheral id
+            scl: SCL pin
+            sda: SDA pin
+            address: I2C address of the Weight I2C unit
+            calibration: Section of CALIBRATION_FILE with the calibration points
+            freq: I2C bus frequency (see I2C_FREQ)
+            burst: Read the ADC register directly (see BURST_READ)
         """
+        self.name = name
+        self.bus = bus
+        self.scl = scl
+        self.sda = sda
+        self.address = address
+        self.calibration_section = calibration
+        self.freq = freq
+        self.burst = burst
+        self.i2c_bus = None
         self.weight_unit = None
-        self.calibration_points = []
+        self.bus_errors = 0
+        self._consecutive_errors = 0
+        self._reported_errors = 0  # bus_errors already logged
+        self._last_error = None
+        self._fall_back_due = False
+        self._adc_buf = bytearray(4)
+        self._adc_format = '<i'
+        self.calibration = None  # CalibrationTable
+        self.precision_table = None  # optional small-range segment
         self.tare_offset = 0
-        self.adc_buffer = []
+        self.acquisition = None
+        # Moving average: preallocated ring and running sum (no list operations)
+        self._avg_buf = array('i', [0] * max(MOVING_AVERAGE_SIZE, PRECISION_SAMPLES))
+        self._avg_pos = 0
+        self._avg_count = 0
+        self._avg_sum = 0
+        self._add_sample_cb = self._add_sample  # bound once, not on every drain
+        self._adc_word = array('i', [0])  # burst read target (native byte order)
+        self._debug_ms = 0
+        self._cursor = None
+        self.precision_mode = self.PRECISION_AUTO
+        self.precise = False  # precision currently in use
+        self._average_size = MOVING_AVERAGE_SIZE
+        self._last_weight = None
+        self.oversampler = None
+        self.zero_tracker = ZeroTracker(ZERO_TRACKING_BAND_G, ZERO_TRACKING_RATE_G_PER_S, ZERO_TRACKING_LIMIT_G,
+                                        fine_band_g=ZERO_TRACKING_PRECISION_BAND_G,
+                                        fine_rate_g_per_s=ZERO_TRACKING_PRECISION_RATE_G_PER_S)
+        self.zero_tracker.enabled = ZERO_TRACKING
+        self.creep = CreepCompensator(CREEP_COEFFICIENT, CREEP_TAU_S)
         
         # Initialize Weight Unit
         self._init_weight_unit()
@@ -44,24 +168,26 @@ class CalibratedScale:
         # Load calibration
         self._load_calibration()
         
-        if DEBUG_MODE:
-            print(f"Scale initialized with {len(self.calibration_points)} calibration points")
-            for pt in self.calibration_points:
-                print(f"  Point {pt['step']}: Weight={pt['weight']}g, ADC={pt['adc_average']}")
+        self.oversampler = Oversampler(self.read_raw_adc, PRECISION_SAMPLES, PRECISION_INTERVAL_MS)
+        
+        _log.info("Scale '%s' initialized with %d calibration points", name, len(self.calibration))
+        if _log.enabled(log.DEBUG):
+            for weight, adc in self.calibration.points():
+                _log.debug("  Point: Weight=%sg, ADC=%s", weight, adc)
     
     def _init_weight_unit(self):
         """Initialize the Unit Weight-I2C"""
         try:
-            # Create I2C bus object
-            i2c_bus = I2C(0, scl=Pin(SCL_PIN), sda=Pin(SDA_PIN), freq=100000)
+            # Shared I2C bus and Weight Unit driver (created once, see core)
+            self.i2c_bus = get_i2c_bus(self.bus, self.scl, self.sda, self.freq)
+            self.weight_unit = get_weight_unit(self.bus, self.scl, self.sda, self.address, self.freq)
             
-            # Initialize Weight Unit with I2C bus and address
-            self.weight_unit = WeightI2CUnit(i2c_bus, I2C_ADDRESS)
+            if self.burst:
+                self._check_burst()
             
-            if DEBUG_MODE:
-                print("Weight Unit initialized successfully")
+            _log.info("Weight Unit 0x%02x initialized successfully", self.address)
         except Exception as e:
-            print(f"Error initializing Weight Unit: {e}")
+            _log.error("Error initializing Weight Unit: %s", e)
             raise
     
     def _load_calibration(self):
@@ -70,25 +196,43 @@ class CalibratedScale:
             with open(CALIBRATION_FILE, 'r') as f:
                 data = json.load(f)
             
-            points = data['scale']['CalibrationPoints']
+            section = data[self.calibration_section]
+            
+            # All calibration points, sorted by ADC value (raises with fewer than 2)
+            self.calibration = CalibrationTable(section['CalibrationPoints'])
             
-            # Load all calibration points and sort by ADC value
-            self.calibration_points = sorted(points, key=lambda p: p['adc_average'])
+            # Optional finer calibration of the first grams (e.g. 0 / 50 / 100 g)
+            precision = section.get('PrecisionPoints', [])
+            self.precision_table = CalibrationTable(precision) if len(precision) >= 2 else None
             
-            if len(self.calibration_points) < 2:
-                raise ValueError("At least 2 calibration points required")
+            creep = section.get('Creep')
+            if creep:
+                self.creep.coefficient = creep['coefficient']
+                self.creep.tau_s = creep['tau_s']
             
-            if DEBUG_MODE:
-                print(f"Calibration loaded from {CALIBRATION_FILE}")
+            _log.info("Calibration loaded from %s", CALIBRATION_FILE)
             
         except Exception as e:
-            print(f"Error loading calibration: {e}")
+            _log.error("Error loading calibration: %s", e)
             raise
     
+    def _table_for(self, adc_value):
+        """Precision segment when in precision mode and within its range, else main calibration"""
+        table = self.precision_table
+        if self.precise and table is not None and table.contains(adc_value):
+            return table
+        return self.calibration
+    
+    def _grams_per_count(self, adc_value):
+        """Local slope of the calibration (grams per ADC count)"""
+        return self._table_for(adc_value).grams_per_count(adc_value)
+    
     def _adc_to_weight(self, adc_value):
         """
         Convert ADC value to weight (grams)
         Uses piecewise linear interpolation between calibration points
+        (the small-range precision segment in precision mode), see
+        CalibrationTable
         
         Args:
             adc_value: Raw ADC value
@@ -96,85 +240,281 @@ class CalibratedScale:
         Returns:
             Weight in grams (float)
         """
-        # Find the two calibration points that bracket the ADC value
-        # If ADC is outside range, extrapolate from nearest segment
-        
-        # If ADC is below lowest point, use first segment
-        if adc_value <= self.calibration_points[0]['adc_average']:
-            pt1 = self.calibration_points[0]
-            pt2 = self.calibration_points[1]
-        
-        # If ADC is above highest point, use last segment
-        elif adc_value >= self.calibration_points[-1]['adc_average']:
-            pt1 = self.calibration_points[-2]
-            pt2 = self.calibration_points[-1]
-        
-        # Otherwise, find bracketing points
-        else:
-            pt1 = self.calibration_points[0]
-            pt2 = self.calibration_points[1]
-            
-            for i in range(len(self.calibration_points) - 1):
-                if (self.calibration_points[i]['adc_average'] <= adc_value <= 
-                    self.calibration_points[i + 1]['adc_average']):
-                    pt1 = self.calibration_points[i]
-                    pt2 = self.calibration_points[i + 1]
-                    break
-        
-        # Linear interpolation between pt1 and pt2
-        adc1 = pt1['adc_average']
-        adc2 = pt2['adc_average']
-        weight1 = pt1['weight']
-        weight2 = pt2['weight']
-        
-        # Avoid division by zero
-        if adc2 == adc1:
-            return weight1
-        
-        # Interpolate: weight = weight1 + (weight2 - weight1) * (adc - adc1) / (adc2 - adc1)
-        weight = weight1 + (weight2 - weight1) * (adc_value - adc1) / (adc2 - adc1)
+        return self._table_for(adc_value).weight(adc_value)
+    
+    def _check_burst(self):
+        """
+        Check that the direct register read matches the unit driver
         
-        return weight
+        Selects the byte order that agrees with get_adc_raw, or disables
+        burst reads if neither does.
+        """
+        try:
+            expected = self.weight_unit.get_adc_raw
+            self.i2c_bus.readfrom_mem_into(self.address, ADC_REGISTER, self._adc_buf)
+        except Exception as e:
+            _log.warning("Burst read unavailable (%s), using the unit driver", e)
+            self.burst = False
+            return
+        
+        # Consecutive conversions differ by the noise only
+        tolerance = abs(expected) // 100 + 1000
+        for adc_format in ('<i', '>i'):
+            if abs(struct.unpack_from(adc_format, self._adc_buf)[0] - expected) <= tolerance:
+                self._adc_format = adc_format
+                return
+        _log.warning("Burst read does not match the unit driver, using the driver")
+        self.burst = False
     
     def read_raw_adc(self):
-        """Read raw ADC value from sensor"""
+        """
+        Read raw ADC value from sensor
+        
+        With burst reads the register is read in a single I2C transaction
+        into a preallocated buffer. Repeated bus errors lower the bus to
+        I2C_SAFE_FREQ.
+        
+        Also called from timer callbacks (Acquisition, SensorScheduler):
+        errors are only counted here, check_bus() logs them and falls back
+        from the main loop.
+        """
         try:
-            return self.weight_unit.get_adc_raw
+            if self.burst and self._adc_format == NATIVE_ADC_FORMAT:
+                # Straight into an int32 array: no tuple from struct.unpack
+                self.i2c_bus.readfrom_mem_into(self.address, ADC_REGISTER, self._adc_word)
+                value = self._adc_word[0]
+            elif self.burst:
+                self.i2c_bus.readfrom_mem_into(self.address, ADC_REGISTER, self._adc_buf)
+                value = struct.unpack_from(self._adc_format, self._adc_buf)[0]
+            else:
+                value = self.weight_unit.get_adc_raw
+            self._consecutive_errors = 0
+            return value
         except Exception as e:
-            if DEBUG_MODE:
-                print(f"Error reading ADC: {e}")
+            self.bus_errors += 1
+            self._consecutive_errors += 1
+            self._last_error = e
+            if self._consecutive_errors >= I2C_FALLBACK_ERRORS:
+                self._fall_back_due = True
             return None
     
-    def read_weight(self):
+    def check_bus(self):
+        """Log the ADC errors since the last call and fall back if they were repeated"""
+        errors = self.bus_errors - self._reported_errors
+        if errors:
+            self._reported_errors += errors
+            _log.debug("%d errors reading ADC, last: %s", errors, self._last_error)
+        if self._fall_back_due:
+            self._fall_back()
+    
+    def _fall_back(self):
+        """Lower the bus to the safe frequency after repeated errors"""
+        self._fall_back_due = False
+        self._consecutive_errors = 0
+        freq = get_i2c_freq(self.bus, self.scl, self.sda)
+        if freq is None or freq <= I2C_SAFE_FREQ:
+            return
+        _log.warning("I2C errors on 0x%02x, falling back to %d kHz", self.address, I2C_SAFE_FREQ // 1000)
+        i2c_bus = set_i2c_freq(self.bus, self.scl, self.sda, I2C_SAFE_FREQ)
+        if i2c_bus is not self.i2c_bus:
+            # The driver was re-created on the new bus by core
+            self.i2c_bus = i2c_bus
+            self.weight_unit = get_weight_unit(self.bus, self.scl, self.sda, self.address)
+    
+    def start_acquisition(self, period_ms=10, size=256):
         """
-        Read current weight with moving average for stability
+        Sample the sensor at a fixed period into a ring buffer
+        
+        read_weight() then averages the samples gathered since its last call
+        instead of reading the sensor. Other consumers (fill controller,
+        logger) get their own cursor with acquisition.cursor().
+        
+        Args:
+            period_ms: Sampling period
+            size: Ring buffer size (samples)
         
         Returns:
-            Weight in grams (float), or None on error
+            Acquisition instance
+        """
+        if self.acquisition is None:
+            self.acquisition = Acquisition(self.read_raw_adc, period_ms, size)
+            self._cursor = self.acquisition.cursor()
+            self.acquisition.start()
+        return self.acquisition
+    
+    def stop_acquisition(self):
+        """Go back to reading the sensor on demand"""
+        if self.acquisition is not None:
+            self.acquisition.stop()
+            self.acquisition = None
+        self._cursor = None
+    
+    def attach(self, scheduler, size=128, min_interval_ms=SENSOR_MIN_INTERVAL_MS):
         """
-        adc_value = self.read_raw_adc()
+        Sample this sensor through a SensorScheduler shared with other scales
         
-        if adc_value is None:
-            return None
+        read_weight() then averages the samples of its channel.
+        
+        Args:
+            scheduler: SensorScheduler
+            size: Ring buffer size of the channel
+            min_interval_ms: Minimum time between two reads of this sensor
+        
+        Returns:
+            The Channel of this sensor
+        """
+        channel = scheduler.add_channel(self.name, self.read_raw_adc, size, min_interval_ms)
+        self._cursor = channel.cursor()
+        return channel
+    
+    def _add_sample(self, t, adc_value):
+        """Add an ADC sample to the moving average (no allocation)"""
+        pos = self._avg_pos
+        if self._avg_count < self._average_size:
+            self._avg_count += 1
+        else:
+            # Window full: the slot written next holds the oldest sample
+            self._avg_sum -= self._avg_buf[pos]
+        self._avg_buf[pos] = adc_value
+        self._avg_sum += adc_value
+        self._avg_pos = (pos + 1) % self._average_size
+    
+    def _reset_average(self):
+        """Empty the moving average"""
+        self._avg_pos = 0
+        self._avg_count = 0
+        self._avg_sum = 0
+    
+    def set_precision_mode(self, mode):
+        """
+        Choose when oversampled precision readings are used
+        
+        Args:
+            mode: PRECISION_ON (Hop Assistant), PRECISION_OFF, or
+                PRECISION_AUTO (below PRECISION_AUTO_MAX_G)
+        
+        Returns:
+            Previous mode
+        """
+        previous = self.precision_mode
+        self.precision_mode = mode
+        return previous
+    
+    def _update_precision(self):
+        """Switch precision on or off according to the mode and the load"""
+        if self.precision_mode == self.PRECISION_ON:
+            precise = True
+        elif self.precision_mode == self.PRECISION_OFF or self._last_weight is None:
+            precise = False
+        else:
+            # Hysteresis so that the mode does not flicker at the threshold
+            limit = PRECISION_AUTO_MAX_G * (1.2 if self.precise else 1.0)
+            precise = abs(self._last_weight) < limit
+        
+        if precise != self.precise:
+            self.precise = precise
+            self._average_size = PRECISION_SAMPLES if precise else MOVING_AVERAGE_SIZE
+            # Averages of the other mode do not apply
+            self._reset_average()
+            _log.debug("Precision mode %s", 'on' if precise else 'off')
+    
+    def precision_report(self, sizes=(4, 8, 16, 32, 64, 128)):
+        """
+        Measure resolution versus settle time for several oversampling factors
+        
+        Keep the load still while measuring.
+        
+        Args:
+            sizes: Numbers of reads per burst to try
+        
+        Returns:
+            List of dicts (samples, conversions, settle_ms, resolution_g)
+        """
+        report = []
+        was_precise = self.precise
+        self.precise = True
+        oversampler = Oversampler(self.read_raw_adc, 1, PRECISION_INTERVAL_MS)
+        for count in sizes:
+            oversampler.resize(count)
+            mean = oversampler.sample()
+            if mean is None:
+                continue
+            report.append({
+                'samples': count,
+                'conversions': oversampler.conversions,
+                'settle_ms': oversampler.settle_ms,
+                'resolution_g': round(oversampler.noise * self._grams_per_count(mean), 3),
+            })
+            r = report[-1]
+            _log.info("  %4d reads (%d conversions): %5d ms -> %s g",
+                      count, r['conversions'], r['settle_ms'], r['resolution_g'])
+        self.precise = was_precise
+        return report
+    
+    def weight_from_adc(self, adc_value):
+        """
+        Convert an ADC sample to a tared weight (no moving average)
+        
+        Args:
+            adc_value: Raw ADC value (e.g. from an acquisition cursor)
         
-        # Add to moving average
-        self.adc_buffer.append(adc_value)
-        if len(self.adc_buffer) > MOVING_AVERAGE_SIZE:
-            self.adc_buffer.pop(0)
+        Returns:
+            Weight in grams (float)
+        """
+        return self._adc_to_weight(adc_value) - self.tare_offset
+    
+    def read_weight(self):
+        """
+        Read current weight with moving average for stability
         
-        # Calculate average
-        adc_avg = sum(self.adc_buffer) / len(self.adc_buffer)
+        Returns:
+            Weight in grams (float), or None on error
+        """
+        if self.bus_errors != self._reported_errors:
+            self.check_bus()
+        self._update_precision()
+        
+        if self._cursor is not None:
+            # Timer-driven sampling: take everything gathered since last call
+            self._cursor.drain(self._add_sample_cb)
+            if not self._avg_count:
+                return None
+            adc_avg = self._avg_sum / self._avg_count
+        elif self.precise:
+            # Burst of reads decimated to one value
+            adc_avg = self.oversampler.sample()
+            if adc_avg is None:
+                return None
+        else:
+            adc_value = self.read_raw_adc()
+            
+            if adc_value is None:
+                return None
+            
+            self._add_sample(0, adc_value)
+            adc_avg = self._avg_sum / self._avg_count
         
         # Convert to weight
         weight = self._adc_to_weight(adc_avg)
         
+        # Remove the modelled creep of the load cell
+        now_ms = time.ticks_ms()
+        weight = self.creep.update(weight, now_ms)
+        
         # Apply tare offset
         weight -= self.tare_offset
         
-        if DEBUG_MODE and len(self.adc_buffer) == MOVING_AVERAGE_SIZE:
-            # Debug every 10 samples to avoid overload
-            if int(time.time() * 10) % 10 == 0:
-                print(f"ADC: {adc_avg:.0f} | Weight: {weight:.1f}g | Tare: {self.tare_offset:.1f}g")
+        # Zero tracking (narrower and slower in precision mode)
+        correction = self.zero_tracker.update(weight, now_ms, self.precise)
+        if correction:
+            self.tare_offset += correction
+            weight -= correction
+        self._last_weight = weight
+        
+        if time.ticks_diff(now_ms, self._debug_ms) >= 1000 and _log.enabled(log.DEBUG):
+            # Once a second (a record is small, but the ring is shared)
+            self._debug_ms = now_ms
+            _log.debug("ADC: %.0f | Weight: %.1fg | Tare: %.1fg", adc_avg, weight, self.tare_offset)
         
         return weight
     
@@ -192,11 +532,55 @@ class CalibratedScale:
         
         if samples:
             # Average samples
-            self.tare_offset = sum(samples) / len(samples)
-            if DEBUG_MODE:
-                print(f"Tare set to: {self.tare_offset:.1f}g")
+            self.tare_to(sum(samples) / len(samples))
+            _log.info("Tare set to: %.1fg", self.tare_offset)
             return True
         return False
+    
+    def tare_to(self, offset):
+        """
+        Set the tare offset without reading the scale (non-blocking tare)
+        
+        The moving average stays valid, and zero tracking starts over from
+        the new zero (its correction budget and stability hold). The creep
+        model is kept: it follows the load on the cell, which a tare does
+        not change.
+        
+        Args:
+            offset: Gross weight (grams) that now reads as zero
+        """
+        self.tare_offset = offset
+        self.zero_tracker.reset()
+
+
+def create_scale(sensor):
+    """
+    Create the CalibratedScale of a sensor description (see SENSORS)
+    """
+    return CalibratedScale(sensor['name'], sensor.get('bus', 0), sensor.get('scl', SCL_PIN),
+                           sensor.get('sda', SDA_PIN), sensor.get('address', I2C_ADDRESS),
+                           sensor.get('calibration', sensor['name']), sensor.get('freq', I2C_FREQ))
+
+
+def create_scales(sensors=SENSORS, period_ms=SCHEDULER_PERIOD_MS):
+    """
+    Create a CalibratedScale per configured sensor, sampled round-robin
+    
+    Args:
+        sensors: Sensor descriptions (see SENSORS)
+        period_ms: Scheduler tick period (one bus read per tick)
+    
+    Returns:
+        Tuple (dict name -> CalibratedScale, SensorScheduler already started)
+    """
+    scheduler = SensorScheduler(period_ms)
+    scales = {}
+    for sensor in sensors:
+        scale = create_scale(sensor)
+        scale.attach(scheduler)
+        scales[scale.name] = scale
+    scheduler.start()
+    return scales, scheduler
 
 
 class ScaleApp:
@@ -207,81 +591,118 @@ class ScaleApp:
         Initialize the application
         Uses all calibration points for accurate measurements
         """
-        # Initialize M5Stack
-        M5.begin()
-        m5ui.init()
-        
-        # Initialize scale
-        self.scale = CalibratedScale()
+        # Initialize M5Stack (once, shared with the calibration wizard)
+        core.init_m5()
+        
+        # Initialize the scales: several platforms are sampled round-robin,
+        # one is shown at a time (the encoder switches platform)
+        self.scheduler = None
+        self.rotary = None
+        if len(SENSORS) > 1:
+            self.scales, self.scheduler = create_scales(SENSORS)
+            self.rotary = core.get_rotary()
+        else:
+            scale = create_scale(SENSORS[0])
+            self.scales = {scale.name: scale}
+        self.names = [sensor['name'] for sensor in SENSORS]
+        self.scale = self.scales[self.names[0]]
         
         # UI variables
-        self.page = None
+        self.screen = None
         self.weight_label = None
         self.status_label = None
+        self.wizards = {}  # per platform, created on its first calibration
+        self.telemetry = None
+        self.live = None
+        self.stability = StabilityDetector()
+        self.heap = HeapMonitor(GC_COLLECT_BYTES, HEAP_REPORT_MS)
+        self.power = PowerManager(LOOP_PERIOD_MS, IDLE_PERIOD_MS, IDLE_AFTER_MS, WAKE_BAND_G,
+                                  BUTTON_POLL_MS, on_change=self._power_mode_changed)
+        self._shown = None  # value on the weight label (rounded grams)
         
         # State
         self.is_taring = False
         self.tare_start_time = 0
         
+        if ACQUISITION_PERIOD_MS and self.scheduler is None:
+            self.scale.start_acquisition(ACQUISITION_PERIOD_MS)
+        core.set_backlight(ACTIVE_BRIGHTNESS)
+        
+        if TELEMETRY_URL:
+            self.telemetry = TelemetryPublisher(create_transport(TELEMETRY_URL), TELEMETRY_INTERVAL_MS)
+            self.telemetry.start()
+        
+        if LIVE_SERVER_PORT:
+            self.live = LiveServer(LIVE_SERVER_PORT)
+            self.live.start()
+        
         # Create interface
         self._create_ui()
         
-        if DEBUG_MODE:
-            print("Scale App initialized")
+        _log.info("Scale App initialized")
         
         # Perform initial tare
         self._initial_tare()
     
     def _create_ui(self):
-        """Create LVGL user interface"""
-        # Create page
-        self.page = m5ui.M5Page(bg_c=0x000000)
+        """Create LVGL user interface (built once, see core.get_screen)"""
+        self.screen = core.get_screen('scale', self._build_ui)
+        self.weight_label = self.screen.weight_label
+        self.status_label = self.screen.status_label
+        
+        # Load page
+        self.screen.show()
+    
+    def _build_ui(self):
+        """Build the scale screen"""
+        screen = core.Screen()
         
         # Weight label (large, centered)
-        self.weight_label = m5ui.M5Label(
-            "0",
-            x=60,
-            y=90,
-            text_c=0xFFFFFF,
-            bg_c=0x000000,
-            bg_opa=0,
-            font=self._get_font(48),
-            parent=self.page
-        )
+        screen.weight_label = core.label(screen.page, "0", 60, 90, 48)
         
         # Status label (small, bottom)
-        self.status_label = m5ui.M5Label(
-            "Press to tare",
-            x=60,
-            y=200,
-            text_c=0x888888,
-            bg_c=0x000000,
-            bg_opa=0,
-            font=self._get_font(14),
-            parent=self.page
-        )
+        screen.status_label = core.label(screen.page, "Press to tare", 60, 200, 14, 0x888888)
+        return screen
+    
+    def calibrate(self):
+        """
+        Calibrate the sensor of the platform shown and come back to weighing
         
-        # Load page
-        self.page.screen_load()
-    
-    def _get_font(self, preferred_size=16):
-        """Return an available LVGL font with fallbacks"""
-        candidates = [
-            f"font_montserrat_{preferred_size}",
-            f"font_montserrat_{preferred_size - 2}",
-            "font_montserrat_16",
-            "font_montserrat_14",
-            "font_montserrat_12",
-        ]
-        for name in candidates:
-            if hasattr(lv, name):
-                return getattr(lv, name)
-        return None
+        The wizard shares the sensor driver and fonts, and both screens are
+        kept: switching mode does not initialize hardware or rebuild the UI.
+        Sampling stops meanwhile, as the wizard reads the sensor itself.
+        """
+        scale = self.scale
+        wizard = self.wizards.get(scale.name)
+        if wizard is None:
+            try:
+                from ScaleCalibrationWizard import CalibrationWizard
+            except ImportError:
+                # Repository layout
+                sys.path.append('ScaleCalibration')
+                from ScaleCalibrationWizard import CalibrationWizard
+            wizard = self.wizards[scale.name] = CalibrationWizard(
+                scale.bus, scale.scl, scale.sda, scale.address, scale.calibration_section, CALIBRATION_FILE)
+        
+        acquiring = scale.acquisition is not None
+        if acquiring:
+            scale.stop_acquisition()
+        if self.scheduler:
+            self.scheduler.stop()
+        wizard.run()
+        
+        # New calibration points, then back to the scale screen
+        scale._load_calibration()
+        if acquiring:
+            scale.start_acquisition(ACQUISITION_PERIOD_MS)
+        if self.scheduler:
+            self.scheduler.start()
+        self.screen.show()
+        self._initial_tare()
     
     def _initial_tare(self):
         """Perform initial tare at startup"""
-        if DEBUG_MODE:
-            print("Performing initial tare...")
+        _log.info("Performing initial tare...")
         
         self.status_label.set_text("Initial tare...")
         
@@ -291,26 +712,31 @@ class ScaleApp:
                 M5.update()
                 time.sleep_ms(100)
             
-            # Perform tare
-            success = self.scale.tare()
+            # Perform tare (every platform)
+            success = True
+            for scale in self.scales.values():
+                success = scale.tare() and success
             
             if success:
                 self.status_label.set_text("Ready")
-                if DEBUG_MODE:
-                    print("Initial tare completed")
+                _log.info("Initial tare completed")
             else:
                 self.status_label.set_text("Tare error")
-                if DEBUG_MODE:
-                    print("Initial tare failed")
+                _log.warning("Initial tare failed")
             
             # Show message briefly then switch to normal
             time.sleep(1)
-            self.status_label.set_text("Press to tare")
+            self.status_label.set_text(self._status_text())
             
         except Exception as e:
-            if DEBUG_MODE:
-                print(f"Initial tare error: {e}")
-            self.status_label.set_text("Press to tare")
+            _log.error("Initial tare error: %s", e)
+            self.status_label.set_text(self._status_text())
+    
+    def _status_text(self):
+        """Idle status line (with the platform name when there are several)"""
+        if len(self.names) > 1:
+            return f"{self.scale.name} - Press to tare"
+        return "Press to tare"
     
     def _format_weight(self, weight):
         """
@@ -348,8 +774,14 @@ class ScaleApp:
         return sign + weight_str
     
     def _check_button(self):
-        """Check if button was pressed and handle tare"""
+        """Check if button was pressed and handle tare (held: calibration)"""
+        if M5.BtnA.wasHold() and not self.is_taring:
+            self.power.activity()
+            self.calibrate()
+            return
+        
         if M5.BtnA.wasPressed() and not self.is_taring:
+            self.power.activity()
             self.is_taring = True
             self.tare_start_time = time.ticks_ms()
             self.status_label.set_text("Taring...")
@@ -363,8 +795,7 @@ class ScaleApp:
                 else:
                     self.status_label.set_text("Tare error")
             except Exception as e:
-                if DEBUG_MODE:
-                    print(f"Tare error: {e}")
+                _log.error("Tare error: %s", e)
                 self.status_label.set_text("Tare error")
     
     def update(self):
@@ -376,32 +807,98 @@ class ScaleApp:
             # Check if tare message should be reset
             if self.is_taring and time.ticks_diff(time.ticks_ms(), self.tare_start_time) > 2000:
                 self.is_taring = False
-                self.status_label.set_text("Press to tare")
+                self.status_label.set_text(self._status_text())
+            
+            if self.rotary and not self.is_taring:
+                self._check_platform()
             
             # Update weight display (unless taring in progress)
             if not self.is_taring:
                 weight = self.scale.read_weight()
-                weight_text = self._format_weight(weight)
-                self.weight_label.set_text(weight_text)
+                shown = None if weight is None else round(weight)
+                if shown != self._shown:
+                    # Text built (and label redrawn) only when the displayed value changes
+                    self._shown = shown
+                    self.weight_label.set_text(self._format_weight(weight))
+                if self.telemetry:
+                    self.telemetry.add(weight)
+                now = time.ticks_ms()
+                stable = weight is not None and self.stability.update(weight, now)
+                self.power.update(weight, stable, now)
+                if self.live:
+                    self.live.publish(weight, stable)
+            
+            # Serve the tablets (non-blocking)
+            if self.live:
+                self.live.poll()
         except Exception as e:
-            if DEBUG_MODE:
-                print(f"Update error: {e}")
+            _log.error("Update error: %s", e)
+    
+    def _check_platform(self):
+        """Show the next (or previous) platform when the encoder turns"""
+        steps = self.rotary.get_rotary_value()
+        if not steps:
+            return
+        self.rotary.reset_rotary_value()
+        self.power.activity()
+        index = (self.names.index(self.scale.name) + steps) % len(self.names)
+        self.scale = self.scales[self.names[index]]
+        self.stability.reset()
+        self._shown = None  # redraw the weight of the new platform
+        self.status_label.set_text(self._status_text())
+        _log.info("Platform: %s", self.scale.name)
+    
+    def _power_mode_changed(self, mode):
+        """Apply an idle or active mode change (PowerManager callback)"""
+        idle = mode == IDLE
+        core.set_backlight(IDLE_BRIGHTNESS if idle else ACTIVE_BRIGHTNESS)
+        if ACQUISITION_PERIOD_MS and self.scale.acquisition is not None:
+            self.scale.stop_acquisition()
+            self.scale.start_acquisition(IDLE_ACQUISITION_PERIOD_MS if idle else ACQUISITION_PERIOD_MS)
+        if self.scheduler:
+            # Each sensor read at the idle sampling period or so
+            self.scheduler.stop()
+            if idle:
+                self.scheduler.period_ms = max(SCHEDULER_PERIOD_MS, IDLE_ACQUISITION_PERIOD_MS // len(self.names))
+            else:
+                self.scheduler.period_ms = SCHEDULER_PERIOD_MS
+            self.scheduler.start()
+        if not idle:
+            # The average spans several idle periods: start over so the
+            # display follows the new load at once
+            for scale in self.scales.values():
+                scale._reset_average()
+    
+    def _button_down(self):
+        """Button poll while idle (the press only wakes the scale up)"""
+        M5.update()
+        return M5.BtnA.isPressed()
     
     def run(self):
         """Main application loop"""
-        if DEBUG_MODE:
-            print("Scale App running...")
+        _log.info("Scale App running...")
         
+        heap = self.heap
+        power = self.power
         try:
             while True:
+                start = time.ticks_ms()
+                period = power.period_ms
+                power.begin()
+                heap.begin()
                 M5.update()  # Update M5 first to get button state
                 self.update()
-                time.sleep_ms(100)  # Update every 100ms
+                heap.end()
+                
+                # Idle slot: pending log records, garbage collection if due,
+                # then wait for the next period (polling the button when idle)
+                log.flush(LOG_FLUSH_MAX)
+                heap.idle(period - time.ticks_diff(time.ticks_ms(), start))
+                power.end()
+                power.wait(period - time.ticks_diff(time.ticks_ms(), start), self._button_down)
         except Exception as e:
-            if DEBUG_MODE:
-                print(f"Main loop error: {e}")
-                import sys
-                sys.print_exception(e)
+            _log.error("Main loop error: %s", e)
+            sys.print_exception(e)
             raise
 
 
@@ -413,8 +910,10 @@ if __name__ == "__main__":
         app = ScaleApp()
         app.run()
     except KeyboardInterrupt:
+        log.flush()
         print("\nApplication stopped by user")
     except Exception as e:
+        log.flush()
         print(f"Fatal error: {e}")
         import sys
         sys.print_exception(e)
@@ -0,0 +1,479 @@
+"""
+Ultimate Homebrewing Scale - Telemetry
+Batches the weight stream into compact delta-encoded frames and publishes
+them over MQTT or HTTP from a background thread
+"""
+
+import sys
+import socket
+import struct
+import time
+from array import array
+import log
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_diff = time.ticks_diff
+    sleep_ms = time.sleep_ms
+except AttributeError:
+    # CPython fallback (host-side runs)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_diff(end, start):
+        return end - start
+    
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+# Frame: header, then (dt_ms, dweight) of the following samples as varints
+# (weight deltas zigzag-encoded). A 1 s frame of 10 Hz readings is ~30 bytes.
+FRAME_VERSION = 1
+FRAME_HEADER = '<BBHIi'  # version, progress (%), samples, first t_ms, first weight
+NO_PROGRESS = 255
+WEIGHT_RESOLUTION_G = 0.1  # weights are sent in steps of this
+
+_log = log.get_logger('telemetry')
+
+
+def _put_varint(buf, value):
+    """Append an unsigned LEB128 varint"""
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _get_varint(data, pos):
+    """Read an unsigned varint, returns (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_frame(times, weights, count, progress=None):
+    """
+    Encode a batch of samples
+    
+    Args:
+        times: Sample timestamps (ticks_ms)
+        weights: Weights in WEIGHT_RESOLUTION_G steps (integers)
+        count: Number of samples used from times/weights (at least 1)
+        progress: Fill progress in percent, or None
+    
+    Returns:
+        Frame bytes
+    """
+    buf = bytearray(struct.pack(FRAME_HEADER, FRAME_VERSION,
+                                NO_PROGRESS if progress is None else max(0, min(100, int(progress))),
+                                count, times[0] & 0xFFFFFFFF, weights[0]))
+    for i in range(1, count):
+        _put_varint(buf, ticks_diff(times[i], times[i - 1]))
+        delta = weights[i] - weights[i - 1]
+        _put_varint(buf, delta * 2 if delta >= 0 else -delta * 2 - 1)
+    return bytes(buf)
+
+
+def decode_frame(data):
+    """
+    Decode a frame (dashboard or test side)
+    
+    Returns:
+        Dict with progress (None if not sent) and samples: list of (t_ms, weight_g)
+    
+    Raises:
+        ValueError: Not a frame of this version
+    """
+    version, progress, count, t, weight = struct.unpack_from(FRAME_HEADER, data)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unknown frame version {version}")
+    samples = [(t, round(weight * WEIGHT_RESOLUTION_G, 1))]
+    pos = struct.calcsize(FRAME_HEADER)
+    for _ in range(count - 1):
+        dt, pos = _get_varint(data, pos)
+        delta, pos = _get_varint(data, pos)
+        t += dt
+        weight += delta >> 1 if not delta & 1 else -((delta + 1) >> 1)
+        samples.append((t, round(weight * WEIGHT_RESOLUTION_G, 1)))
+    return {
+        'progress': None if progress == NO_PROGRESS else progress,
+        'samples': samples,
+    }
+
+
+class FrameQueue:
+    """
+    Bounded queue of frames between the weighing loop and the sender
+    
+    put() never blocks: when the link is down long enough to fill the
+    queue, the oldest frame is dropped (counted in `dropped`).
+    """
+    
+    def __init__(self, size=8):
+        """
+        Initialize the queue
+        
+        Args:
+            size: Maximum number of frames waiting
+        """
+        self.size = size
+        self._frames = []
+        self._lock = _thread.allocate_lock() if _thread else None
+        self.dropped = 0
+    
+    def _acquire(self):
+        if self._lock:
+            self._lock.acquire()
+    
+    def _release(self):
+        if self._lock:
+            self._lock.release()
+    
+    def put(self, frame):
+        """Queue a frame, dropping the oldest one if full"""
+        self._acquire()
+        if len(self._frames) >= self.size:
+            self._frames.pop(0)
+            self.dropped += 1
+        self._frames.append(frame)
+        self._release()
+    
+    def put_back(self, frame):
+        """Return an unsent frame to the head of the queue (dropped if full)"""
+        self._acquire()
+        if len(self._frames) >= self.size:
+            self.dropped += 1
+        else:
+            self._frames.insert(0, frame)
+        self._release()
+    
+    def get(self):
+        """Oldest frame, None if empty"""
+        self._acquire()
+        frame = self._frames.pop(0) if self._frames else None
+        self._release()
+        return frame
+    
+    def __len__(self):
+        return len(self._frames)
+
+
+class HTTPTransport:
+    """POST each frame (application/octet-stream) over a persistent connection"""
+    
+    def __init__(self, url, timeout_ms=3000):
+        """
+        Initialize the transport (no connection is opened yet)
+        
+        Args:
+            url: Endpoint, e.g. "http://192.168.1.10:8080/telemetry/scale"
+            timeout_ms: Deadline of a request
+        """
+        try:
+            from http_session import HTTPSession
+        except ImportError:
+            # Repository layout: the API modules are in api/
+            sys.path.append('api')
+            from http_session import HTTPSession
+        scheme, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        self.path = "/" + path
+        self.session = HTTPSession(f"{scheme}://{host}",
+                                   {"Content-Type": "application/octet-stream"}, timeout_ms)
+    
+    def send(self, frame):
+        """
+        Send a frame
+        
+        Raises:
+            OSError: The server did not accept it
+            BrewingAPIError: Connection failed or timed out
+        """
+        response = self.session.request("POST", self.path, frame)
+        if response.status_code >= 300:
+            raise OSError(f"HTTP {response.status_code}")
+    
+    def close(self):
+        self.session.close()
+
+
+class MQTTTransport:
+    """
+    Publish each frame to an MQTT topic (MQTT 3.1.1, QoS 0)
+    
+    Only CONNECT and PUBLISH are needed, so the client is a few packets on
+    a plain socket; it reconnects on the next frame after an error.
+    """
+    
+    def __init__(self, host, topic, port=1883, client_id="uhs", timeout_ms=3000):
+        """
+        Initialize the transport (no connection is opened yet)
+        
+        Args:
+            host: Broker address
+            topic: Topic of the frames, e.g. "uhs/scale/weight"
+            port: Broker port
+            client_id: MQTT client identifier
+            timeout_ms: Socket timeout
+        """
+        self.host = host
+        self.port = port
+        self.topic = topic.encode()
+        self.client_id = client_id.encode()
+        self.timeout_ms = timeout_ms
+        self._sock = None
+        self.connect_count = 0
+    
+    @staticmethod
+    def _packet(header, body):
+        """Fixed header, remaining length and body of a control packet"""
+        packet = bytearray([header])
+        _put_varint(packet, len(body))
+        return bytes(packet) + body
+    
+    @staticmethod
+    def _string(value):
+        return struct.pack('!H', len(value)) + value
+    
+    def _write(self, data):
+        if hasattr(self._sock, "sendall"):
+            self._sock.sendall(data)
+        else:
+            self._sock.write(data)
+    
+    def _connect(self):
+        """Open the connection and wait for CONNACK"""
+        addr_info = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+        sock = socket.socket(addr_info[0], socket.SOCK_STREAM, addr_info[2])
+        sock.settimeout(self.timeout_ms / 1000)
+        try:
+            sock.connect(addr_info[-1])
+            self._sock = sock
+            # Protocol "MQTT" level 4, clean session, no keep-alive
+            body = self._string(b"MQTT") + b"\x04\x02\x00\x00" + self._string(self.client_id)
+            self._write(self._packet(0x10, body))
+            connack = sock.recv(4)
+        except Exception:
+            self._sock = None
+            sock.close()
+            raise
+        if len(connack) != 4 or connack[0] != 0x20 or connack[3] != 0:
+            self.close()
+            raise OSError(f"MQTT connection refused: {connack}")
+        self.connect_count += 1
+    
+    def send(self, frame):
+        """
+        Publish a frame
+        
+        Raises:
+            OSError: Connection failed (closed, retried on the next frame)
+        """
+        if self._sock is None:
+            self._connect()
+        try:
+            self._write(self._packet(0x30, self._string(self.topic) + frame))
+        except OSError:
+            self.close()
+            raise
+    
+    def close(self):
+        """Disconnect from the broker"""
+        if self._sock is not None:
+            try:
+                self._write(b"\xe0\x00")  # DISCONNECT
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+
+
+def create_transport(url, timeout_ms=3000):
+    """
+    Transport for a telemetry URL
+    
+    Args:
+        url: "mqtt://host[:port]/topic" or "http://host[:port]/path"
+    
+    Raises:
+        ValueError: Unknown scheme
+    """
+    scheme = url.split("://", 1)[0]
+    if scheme == "mqtt":
+        host, _, topic = url[7:].partition("/")
+        port = 1883
+        if ":" in host:
+            host, port = host.split(":", 1)
+            port = int(port)
+        return MQTTTransport(host, topic, port, timeout_ms=timeout_ms)
+    if scheme in ("http", "https"):
+        return HTTPTransport(url, timeout_ms)
+    raise ValueError(f"Unknown telemetry scheme: {scheme}")
+
+
+class TelemetryPublisher:
+    """
+    Weight stream publisher
+    
+    add() stores a sample in preallocated arrays and, every `interval_ms`
+    (or `max_samples`), encodes them into a frame put in a FrameQueue. It
+    never touches the network: a background thread sends the frames and
+    backs off while the transport fails, so a slow or absent server costs
+    the weighing loop nothing but dropped frames.
+    """
+    
+    def __init__(self, transport, interval_ms=1000, max_samples=50, queue_size=8,
+                 retry_ms=1000, max_retry_ms=30000):
+        """
+        Initialize the publisher (not started)
+        
+        Args:
+            transport: HTTPTransport or MQTTTransport (anything with send(frame))
+            interval_ms: Publishing cadence (one frame per interval)
+            max_samples: Samples per frame at most (a frame is closed earlier if full)
+            queue_size: Frames kept while the link is down
+            retry_ms: First pause after a failed send
+            max_retry_ms: Longest pause between retries
+        """
+        self.transport = transport
+        self.interval_ms = interval_ms
+        self.max_samples = max_samples
+        self.queue = FrameQueue(queue_size)
+        self.retry_ms = retry_ms
+        self.max_retry_ms = max_retry_ms
+        self._times = array('i', [0] * max_samples)
+        self._weights = array('i', [0] * max_samples)
+        self._count = 0
+        self.progress = None
+        self.running = False
+        self._worker_running = False  # set by start(), cleared by the worker under _state_lock
+        self._state_lock = _thread.allocate_lock() if _thread else None
+        
+        # Statistics
+        self.samples = 0
+        self.frames = 0
+        self.sent = 0
+        self.sent_bytes = 0
+        self.errors = 0
+    
+    def add(self, weight, now_ms=None, progress=None):
+        """
+        Add a weight reading (weighing loop side, no network I/O)
+        
+        Args:
+            weight: Weight in grams (None readings are ignored)
+            now_ms: Timestamp (ticks_ms), default now
+            progress: Fill progress in percent, kept until changed
+        """
+        if weight is None:
+            return
+        if now_ms is None:
+            now_ms = ticks_ms()
+        if progress is not None:
+            self.progress = progress
+        if self._count and ticks_diff(now_ms, self._times[0]) >= self.interval_ms:
+            self.flush()
+        self._times[self._count] = now_ms
+        self._weights[self._count] = int(round(weight / WEIGHT_RESOLUTION_G))
+        self._count += 1
+        self.samples += 1
+        if self._count >= self.max_samples:
+            self.flush()
+    
+    def flush(self):
+        """Close the current batch into a frame"""
+        if not self._count:
+            return
+        self.queue.put(encode_frame(self._times, self._weights, self._count, self.progress))
+        self._count = 0
+        self.frames += 1
+    
+    def send_pending(self):
+        """
+        Send the queued frames (sender side)
+        
+        Returns:
+            False if a send failed (the frame is queued again)
+        """
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return True
+            try:
+                self.transport.send(frame)
+            except Exception as e:
+                self.errors += 1
+                self.queue.put_back(frame)
+                _log.warning("Telemetry send error: %s", e)
+                return False
+            self.sent += 1
+            self.sent_bytes += len(frame)
+    
+    def start(self):
+        """Start the sender thread (or keep the one still stopping)"""
+        if _thread is None:
+            raise RuntimeError("No thread available for telemetry")
+        self._state_lock.acquire()
+        try:
+            self.running = True
+            if self._worker_running:
+                return
+            self._worker_running = True
+        finally:
+            self._state_lock.release()
+        _thread.start_new_thread(self._worker, ())
+    
+    def stop(self):
+        """Stop the sender thread after its current send"""
+        self.running = False
+    
+    def _worker(self):
+        """Background thread: send frames, back off while the transport fails"""
+        pause_ms = self.retry_ms
+        while True:
+            while self.running:
+                if self.send_pending():
+                    pause_ms = self.retry_ms
+                    sleep_ms(self.interval_ms // 4 or 1)
+                else:
+                    sleep_ms(pause_ms)
+                    pause_ms = min(pause_ms * 2, self.max_retry_ms)
+            # Leave only if start() was not called again meanwhile: it
+            # counts on this thread when it sees _worker_running
+            self._state_lock.acquire()
+            try:
+                if not self.running:
+                    self.transport.close()
+                    self._worker_running = False
+                    return
+            finally:
+                self._state_lock.release()
+    
+    def stats(self):
+        """
+        Publisher statistics
+        
+        Returns:
+            Dict with samples, frames built, frames sent, bytes sent, send
+            errors, frames dropped and waiting
+        """
+        return {
+            'samples': self.samples,
+            'frames': self.frames,
+            'sent': self.sent,
+            'sent_bytes': self.sent_bytes,
+            'errors': self.errors,
+            'dropped': self.queue.dropped,
+            'queued': len(self.queue),
+        }
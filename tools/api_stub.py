@@ -0,0 +1,632 @@
+"""
+Ultimate Homebrewing Scale - Brewfather API stand-in
+Local keep-alive HTTP server (runs on a computer) answering the batch
+requests of api/brewfather_api.py from an in-memory set of batches, with
+a simulated connection handshake, latency and scripted faults
+
+Usage:
+    python tools/api_stub.py [PORT]       # server on 8081 by default
+    python tools/api_stub.py --selftest   # API client checks against the stand-in
+"""
+
+import os
+import sys
+import json
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'api'))
+
+from brewfather_api import BrewfatherAPI
+from recipe_store import RecipeStore
+from prefetcher import RecipePrefetcher
+from snapshot_store import SnapshotStore, SnapshotAPI
+from resilience import RetryPolicy, CircuitBreaker
+from brewing_software_api import BrewingAPIError, APIHTTPError, APITimeoutError, CircuitOpenError
+
+REASONS = {200: 'OK', 401: 'Unauthorized', 404: 'Not Found', 429: 'Too Many Requests',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class BrewfatherStub:
+    """
+    Brewfather v2 stand-in serving `batches` over keep-alive HTTP
+    
+    Listing (/v2/batches with status, order_by, limit and start_after) and
+    recipe (/v2/batches/<id>) requests are answered as by Brewfather. Each
+    new connection first waits `handshake_ms` (the cost of a TLS handshake
+    on the device), each response `latency_ms`. `faults` is consumed one
+    entry per request: an HTTP status to answer instead, 'close' to drop
+    the connection without answering, 'stall' to answer nothing for
+    `stall_ms`.
+    """
+    
+    def __init__(self, port=0, handshake_ms=0, latency_ms=0, stall_ms=3000):
+        self.batches = {}  # batch_id -> Brewfather batch dict
+        self.handshake_ms = handshake_ms
+        self.latency_ms = latency_ms
+        self.stall_ms = stall_ms
+        self.faults = []
+        self.connections = 0
+        self.requests = []  # (path, time received)
+        self.lock = threading.Lock()
+        self._clock_ms = 1700000000000
+        
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', port))
+        self._server.listen(4)
+        self.port = self._server.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}/v2"
+        threading.Thread(target=self._accept, daemon=True).start()
+    
+    def close(self):
+        """Stop listening (new connections are refused)"""
+        try:
+            # Wakes up the accept() in progress, which would keep the port open
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+    
+    # ------------------------------------------------------------------
+    # Data
+    # ------------------------------------------------------------------
+    
+    def put_batch(self, batch_id, name, status='Planning', malts=(), hops=(), same_time=False):
+        """
+        Add or modify a batch (its modification time is now)
+        
+        Args:
+            malts: (name, kg) pairs
+            hops: (name, g) pairs
+            same_time: Same modification time as the previous change
+        """
+        with self.lock:
+            if not same_time:
+                self._clock_ms += 1000
+            self.batches[batch_id] = {
+                '_id': batch_id,
+                'status': status,
+                '_timestamp_ms': self._clock_ms,
+                'recipe': {
+                    'name': name,
+                    'fermentables': [{'name': m, 'type': 'Grain', 'color': 5.0, 'amount': kg}
+                                     for m, kg in malts],
+                    'hops': [{'name': h, 'amount': g, 'use': 'Boil', 'time': 60} for h, g in hops],
+                },
+            }
+    
+    def delete_batch(self, batch_id):
+        with self.lock:
+            del self.batches[batch_id]
+    
+    def _list(self, query):
+        with self.lock:
+            batches = list(self.batches.values())
+        if 'status' in query:
+            batches = [b for b in batches if b['status'] == query['status']]
+        key = query.get('order_by', '_id')
+        descending = query.get('order_by_direction') == 'desc'
+        batches.sort(key=lambda b: b[key], reverse=descending)
+        if 'start_after' in query:
+            after = query['start_after']
+            if key == '_timestamp_ms':
+                after = int(after)
+            batches = [b for b in batches if (b[key] < after if descending else b[key] > after)]
+        batches = batches[:int(query.get('limit', 10))]
+        return [{'_id': b['_id'], 'status': b['status'], '_timestamp_ms': b['_timestamp_ms'],
+                 'recipe': {'name': b['recipe']['name']}} for b in batches]
+    
+    def _answer(self, path):
+        """(status, JSON body) of a request path"""
+        url = urlsplit(path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        if parts[:2] != ['v2', 'batches'] or len(parts) > 3:
+            return 404, {'message': 'Not found'}
+        if len(parts) == 2:
+            return 200, self._list(query)
+        with self.lock:
+            batch = self.batches.get(parts[2])
+        if batch is None:
+            return 404, {'message': 'Batch not found'}
+        return 200, {'_id': batch['_id'], 'recipe': batch['recipe']}
+    
+    # ------------------------------------------------------------------
+    # Server
+    # ------------------------------------------------------------------
+    
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    
+    def _handle(self, conn):
+        with self.lock:
+            self.connections += 1
+        stream = conn.makefile('rb')
+        time.sleep(self.handshake_ms / 1000)
+        with conn:
+            try:
+                while True:
+                    request_line = stream.readline()
+                    if not request_line:
+                        return
+                    path = request_line.split()[1].decode()
+                    authorized = False
+                    while True:
+                        line = stream.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        authorized = authorized or line.lower().startswith(b"authorization: basic ")
+                    with self.lock:
+                        self.requests.append((path, time.monotonic()))
+                        fault = self.faults.pop(0) if self.faults else None
+                    if fault == 'close':
+                        return
+                    if fault == 'stall':
+                        time.sleep(self.stall_ms / 1000)
+                        return
+                    time.sleep(self.latency_ms / 1000)
+                    if fault is not None:
+                        status, body = fault, {'message': 'Injected fault'}
+                    elif not authorized:
+                        status, body = 401, {'message': 'Unauthorized'}
+                    else:
+                        status, body = self._answer(path)
+                    content = json.dumps(body).encode()
+                    conn.sendall(f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                                 f"Content-Type: application/json\r\n"
+                                 f"Content-Length: {len(content)}\r\n\r\n".encode() + content)
+            except (ConnectionError, OSError, ValueError, IndexError):
+                return
+
+
+# ----------------------------------------------------------------------
+# Self-test
+# ----------------------------------------------------------------------
+
+def _client(stub, **kwargs):
+    return BrewfatherAPI("user", "key", base_url=stub.url, **kwargs)
+
+
+def _fill(stub, count=120):
+    for i in range(count):
+        stub.put_batch(f"b{i:03}", f"Recipe {i}", malts=[("Pale Ale", 4.5), ("Munich", 0.5 + i / 100)],
+                       hops=[("Cascade", 30)])
+
+
+def check_keep_alive(handshake_ms=150, latency_ms=20):
+    """Batch listing (3 pages) and 5 recipes over one connection"""
+    stub = BrewfatherStub(handshake_ms=handshake_ms, latency_ms=latency_ms)
+    _fill(stub)
+    report = {}
+    for mode in ('keep-alive', 'reconnect'):
+        stub.connections = 0
+        api = _client(stub)
+        
+        def call(fn, *args):
+            result = fn(*args)
+            if mode == 'reconnect':
+                api.close()  # as a new connection per request
+            return result
+        
+        begin = time.perf_counter()
+        batches = []
+        for batch in api.iter_batches():
+            batches.append(batch)
+            if mode == 'reconnect' and len(batches) % api.PAGE_SIZE == 0:
+                api.close()
+        if mode == 'reconnect':
+            api.close()
+        ingredients = [call(api.get_ingredients, b.batch_id) for b in batches[:5]]
+        elapsed_ms = (time.perf_counter() - begin) * 1000
+        api.close()
+        stats = api.session.stats()
+        report[mode] = (stats, stub.connections, elapsed_ms)
+        ok = (len(batches) == 120 and ingredients[4][0][1].amount == 0.54
+              and stats['requests'] == 8 and stats['handshakes'] == stub.connections)
+        print(f"keep-alive: {mode:<10} {stats['requests']} requests, {stats['handshakes']} handshakes, "
+              f"avg {stats['avg_latency_ms']} ms per request, {elapsed_ms:.0f} ms in total")
+        if not ok:
+            print(f"keep-alive: {mode}: wrong results")
+            stub.close()
+            return False
+    stub.close()
+    single = report['keep-alive'][0]['handshakes'] == 1 and report['keep-alive'][1] == 1
+    if not single:
+        print("keep-alive: more than one handshake")
+    return single and report['reconnect'][0]['handshakes'] == 8
+
+
+def check_sync():
+    """RecipeStore incremental and full sync"""
+    stub = BrewfatherStub()
+    _fill(stub, 6)
+    store = RecipeStore(_client(stub))
+    failures = []
+    
+    def expect(what, condition):
+        if not condition:
+            failures.append(what)
+    
+    expect("first sync lists all", store.sync() == 6 and len(store.get_batches()) == 6)
+    for batch in store.get_batches():
+        store.get_ingredients(batch.batch_id)
+    
+    stub.put_batch("b001", "Recipe 1 v2", malts=[("Pilsner", 5.0)])  # modified
+    stub.put_batch("b002", "Recipe 2", status='Brewing')  # left Planning
+    stub.put_batch("b006", "Recipe 6", malts=[("Wheat", 2.0)])  # new
+    stub.delete_batch("b003")
+    requests = len(stub.requests)
+    changes = store.sync()
+    listed = {b.batch_id: b.name for b in store.get_batches()}
+    expect("incremental sync merges 3 changes", changes == 3)
+    expect("modified batch updated", listed.get("b001") == "Recipe 1 v2")
+    expect("non-Planning batch dropped", "b002" not in listed)
+    expect("new batch added", "b006" in listed)
+    expect("deletion not seen incrementally", "b003" in listed)
+    expect("one listing request", len(stub.requests) == requests + 1)
+    
+    requests = len(stub.requests)
+    expect("unchanged recipe kept", store.get_ingredients("b000")[0][1].amount == 0.5)
+    expect("modified recipe refetched", store.get_ingredients("b001")[0][0].name == "Pilsner")
+    expect("only the modified recipe fetched", len(stub.requests) == requests + 1)
+    
+    changes = store.sync(full=True)
+    listed = [b.batch_id for b in store.get_batches()]
+    expect("full listing removes the deleted batch", changes == 1 and "b003" not in listed)
+    expect("full listing keeps the others", listed == ["b000", "b001", "b004", "b005", "b006"])
+    expect("recipes survive the full listing", "b000" in store._ingredients)
+    
+    # Three changes sharing a timestamp across a page boundary (pages of 4)
+    since = store.last_sync_ms
+    stub.put_batch("b010", "Recipe 10")
+    for i in range(11, 14):
+        stub.put_batch(f"b0{i}", f"Recipe {i}", same_time=i > 11)
+    for i in range(14, 17):
+        stub.put_batch(f"b0{i}", f"Recipe {i}")
+    changed = [b.batch_id for b in store.api.iter_batches_modified_since(since, page_size=4)]
+    expect("ties across pages listed once", sorted(changed) == [f"b0{i}" for i in range(10, 17)])
+    
+    store.close()
+    stub.close()
+    print(f"sync: {len(stub.requests)} requests, {len(failures) or 'no'} failures")
+    for what in failures:
+        print(f"sync: FAILED: {what}")
+    return not failures
+
+
+def _fails(call, error_type):
+    """(raised error_type, milliseconds taken) of a call expected to fail"""
+    begin = time.perf_counter()
+    try:
+        call()
+        raised = False
+    except error_type:
+        raised = True
+    return raised, (time.perf_counter() - begin) * 1000
+
+
+def check_resilience():
+    """Retries, backoff, deadlines, DNS caching and circuit breaker"""
+    stub = BrewfatherStub(stall_ms=2000)
+    _fill(stub, 3)
+    failures = []
+    
+    def expect(what, condition):
+        if not condition:
+            failures.append(what)
+    
+    # Transient faults are retried with a growing, jittered backoff
+    api = _client(stub, retry=RetryPolicy(base_delay_ms=200, breaker=CircuitBreaker()))
+    stub.faults = [503, 429]
+    first = len(stub.requests)
+    malts, _ = api.get_ingredients("b001")
+    times = [t for _, t in stub.requests[first:]]
+    gaps = [round((b - a) * 1000) for a, b in zip(times, times[1:])]
+    expect("retried until success", len(times) == 3 and malts[0].name == "Pale Ale")
+    expect("backoff 100-200 ms then 200-400 ms", len(gaps) == 2 and 100 <= gaps[0] <= 260 and 200 <= gaps[1] <= 460)
+    expect("success keeps the circuit closed", api.retry.breaker.failures == 0)
+    print(f"resilience: retry after 503 and 429: 3 attempts, backoff {gaps} ms")
+    
+    # A kept-alive connection closed by the server is reopened at once
+    stub.faults = ['close']
+    first, connections = len(stub.requests), stub.connections
+    api.get_ingredients("b001")
+    expect("closed connection reopened without backoff",
+           len(stub.requests) == first + 2 and stub.connections == connections + 1
+           and stub.requests[-1][1] - stub.requests[-2][1] < 0.05)
+    
+    # Permanent errors are not retried
+    stub.faults = [404]
+    first = len(stub.requests)
+    raised, _ = _fails(lambda: api.get_ingredients("b001"), APIHTTPError)
+    expect("404 raised without retry", raised and len(stub.requests) == first + 1)
+    api.close()
+    
+    # A request stalled by the server ends at the request deadline
+    api = _client(stub, timeout_ms=300, retry=RetryPolicy(max_attempts=1))
+    stub.faults = ['stall']
+    raised, elapsed_ms = _fails(lambda: api.get_ingredients("b001"), APITimeoutError)
+    expect("request deadline", raised and 250 <= elapsed_ms <= 600)
+    print(f"resilience: stalled request: timeout after {elapsed_ms:.0f} ms (deadline 300 ms)")
+    api.close()
+    
+    # Retries of stalled requests end at the call deadline
+    api = _client(stub, timeout_ms=400, retry=RetryPolicy(max_attempts=5, base_delay_ms=50, deadline_ms=1000))
+    stub.faults = ['stall'] * 5
+    raised, elapsed_ms = _fails(lambda: api.get_ingredients("b001"), APITimeoutError)
+    expect("call deadline", raised and elapsed_ms <= 1300)
+    print(f"resilience: stalled retries: gave up after {elapsed_ms:.0f} ms (deadline 1000 ms)")
+    stub.faults = []
+    api.close()
+    
+    # The server address is resolved once, not on every reconnection
+    lookups = []
+    getaddrinfo = socket.getaddrinfo
+    socket.getaddrinfo = lambda *args: lookups.append(args) or getaddrinfo(*args)
+    try:
+        api = _client(stub)
+        for _ in range(3):
+            api.get_ingredients("b001")
+            api.close()
+    finally:
+        socket.getaddrinfo = getaddrinfo
+    expect("one DNS lookup for 3 connections", len(lookups) == 1)
+    
+    # A slow DNS lookup ends at the request deadline, the next request reuses it
+    lookups = []
+    socket.getaddrinfo = lambda *args: lookups.append(args) or time.sleep(0.6) or getaddrinfo(*args)
+    try:
+        api = _client(stub, timeout_ms=300, retry=RetryPolicy(max_attempts=1))
+        raised, elapsed_ms = _fails(lambda: api.get_ingredients("b001"), APITimeoutError)
+        expect("DNS lookup bounded by the request deadline", raised and 250 <= elapsed_ms <= 450)
+        time.sleep(0.4)
+        api.get_ingredients("b001")
+        expect("pending DNS lookup reused", len(lookups) == 1)
+        print(f"resilience: slow DNS lookup (600 ms): timeout after {elapsed_ms:.0f} ms (deadline 300 ms)")
+        api.close()
+    finally:
+        socket.getaddrinfo = getaddrinfo
+    
+    # The breaker counts failed calls, not attempts
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_ms=500)
+    api = _client(stub, retry=RetryPolicy(max_attempts=3, base_delay_ms=20, breaker=breaker))
+    stub.faults = [503] * 3
+    first = len(stub.requests)
+    raised, _ = _fails(lambda: api.get_ingredients("b001"), APIHTTPError)
+    expect("first failed call: 3 attempts, 1 failure, closed",
+           raised and len(stub.requests) == first + 3 and breaker.failures == 1
+           and breaker.state == CircuitBreaker.CLOSED)
+    stub.faults = [503] * 3
+    _fails(lambda: api.get_ingredients("b001"), APIHTTPError)
+    expect("second failed call opens the circuit", breaker.state == CircuitBreaker.OPEN)
+    first = len(stub.requests)
+    raised, elapsed_ms = _fails(lambda: api.get_ingredients("b001"), CircuitOpenError)
+    expect("open circuit fails fast", raised and len(stub.requests) == first and elapsed_ms < 50)
+    time.sleep(0.55)
+    stub.faults = [503] * 3
+    first = len(stub.requests)
+    raised, _ = _fails(lambda: api.get_ingredients("b001"), APIHTTPError)
+    expect("failed trial call: 1 attempt, open again",
+           raised and len(stub.requests) == first + 1 and breaker.state == CircuitBreaker.OPEN)
+    time.sleep(0.55)
+    stub.faults = []
+    api.get_ingredients("b001")
+    expect("successful trial call closes", breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0)
+    print(f"resilience: breaker: opened after 2 failed calls (6 attempts), trial calls not retried")
+    api.close()
+    
+    stub.close()
+    print(f"resilience: {len(failures) or 'no'} failures")
+    for what in failures:
+        print(f"resilience: FAILED: {what}")
+    return not failures
+
+
+def _wait_until(condition, timeout_ms=3000):
+    deadline = time.monotonic() + timeout_ms / 1000
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def check_prefetch():
+    """RecipePrefetcher hits, misses, cancel, in-flight wait, memory budget and eviction"""
+    stub = BrewfatherStub(latency_ms=100)
+    _fill(stub, 6)
+    api = _client(stub)
+    batches = api.get_batches()
+    failures = []
+    
+    def expect(what, condition):
+        if not condition:
+            failures.append(what)
+    
+    def recipe_requests():
+        return sum(1 for path, _ in stub.requests if path.startswith('/v2/batches/'))
+    
+    def stopped(prefetcher):
+        return _wait_until(lambda: not prefetcher._worker_running)
+    
+    # The first batches are fetched in the background, then served locally
+    prefetcher = RecipePrefetcher(api, count=3)
+    prefetcher.start(batches)
+    expect("three batches prefetched", stopped(prefetcher) and prefetcher.prefetched == 3
+           and all(prefetcher.is_ready(b.batch_id) for b in batches[:3]))
+    requests = recipe_requests()
+    malts, _ = prefetcher.select(batches[1].batch_id)
+    expect("prefetched batch is a hit without request",
+           prefetcher.hits == 1 and recipe_requests() == requests and malts[1].amount == 0.51)
+    malts, _ = prefetcher.select(batches[4].batch_id)
+    expect("other batch is a miss fetched at once",
+           prefetcher.misses == 1 and recipe_requests() == requests + 1 and malts[1].amount == 0.54)
+    print(f"prefetch: {prefetcher.prefetched} prefetched, {prefetcher.hits} hit, {prefetcher.misses} miss")
+    
+    # cancel() drops the queue, the request in flight completes
+    prefetcher = RecipePrefetcher(api, count=4)
+    requests = recipe_requests()
+    prefetcher.start(batches)
+    time.sleep(0.05)
+    prefetcher.cancel()
+    expect("cancel stops after the request in flight",
+           stopped(prefetcher) and prefetcher.prefetched == 1 and recipe_requests() == requests + 1)
+    
+    # select() of the batch in flight waits for it instead of a second request
+    prefetcher = RecipePrefetcher(api, count=3)
+    requests = recipe_requests()
+    prefetcher.start(batches)
+    time.sleep(0.05)
+    prefetcher.select(batches[0].batch_id)
+    expect("batch in flight awaited, not requested twice",
+           prefetcher.hits == 1 and stopped(prefetcher) and recipe_requests() == requests + 1)
+    
+    # Low free heap: nothing is prefetched, select() still works
+    prefetcher = RecipePrefetcher(api, count=3, min_free_bytes=30000)
+    prefetcher.mem_free = lambda: 20000
+    requests = recipe_requests()
+    prefetcher.start(batches)
+    expect("no prefetch below min_free_bytes",
+           stopped(prefetcher) and prefetcher.prefetched == 0 and recipe_requests() == requests)
+    prefetcher.select(batches[2].batch_id)
+    expect("select works without prefetch", prefetcher.misses == 1)
+    
+    # The least recently used recipe is dropped beyond max_items
+    prefetcher = RecipePrefetcher(api, count=0, max_items=2)
+    for batch in (batches[0], batches[1], batches[0], batches[2]):
+        prefetcher.select(batch.batch_id)
+    expect("least recently used evicted",
+           prefetcher.evicted == 1 and prefetcher.is_ready(batches[0].batch_id)
+           and not prefetcher.is_ready(batches[1].batch_id))
+    
+    api.close()
+    stub.close()
+    print(f"prefetch: {len(failures) or 'no'} failures")
+    for what in failures:
+        print(f"prefetch: FAILED: {what}")
+    return not failures
+
+
+def _raises(call, error_type):
+    try:
+        call()
+    except error_type:
+        return True
+    return False
+
+
+def check_snapshot():
+    """Offline snapshot: round trip, offline fallback and damaged files"""
+    stub = BrewfatherStub()
+    _fill(stub, 4)
+    workdir = tempfile.mkdtemp(prefix='uhs-snapshot-')
+    path = os.path.join(workdir, 'recipes')
+    failures = []
+    
+    def expect(what, condition):
+        if not condition:
+            failures.append(what)
+    
+    def offline_client():
+        # Nothing listens on the stand-in port anymore
+        return _client(stub, timeout_ms=500, retry=RetryPolicy(max_attempts=1))
+    
+    # Round trip: batches and the recipes read during the session
+    store = RecipeStore(_client(stub), path)
+    store.sync()
+    for batch_id in ("b000", "b001", "b002"):
+        store.get_ingredients(batch_id)
+    expect("snapshot saved", store.save())
+    store.close()
+    stub.close()
+    
+    store = RecipeStore(offline_client(), path)
+    expect("snapshot loaded", store.load())
+    expect("batches restored", [b.batch_id for b in store.get_batches()] == ["b000", "b001", "b002", "b003"])
+    malts, hops = store.get_ingredients("b001")
+    expect("recipe restored", [(m.name, m.amount) for m in malts] == [("Pale Ale", 4.5), ("Munich", 0.51)]
+           and hops[0].name == "Cascade" and hops[0].amount == 30)
+    
+    # Offline fallback: the sync fails, the snapshot keeps serving
+    expect("sync fails offline", _raises(store.sync, BrewingAPIError))
+    expect("snapshot recipes served offline", store.get_ingredients("b002")[0][1].amount == 0.52)
+    expect("recipe never read fails offline", _raises(lambda: store.get_ingredients("b003"), BrewingAPIError))
+    store.close()
+    offline = SnapshotAPI(path)
+    expect("SnapshotAPI lists the batches", len(offline.get_batches()) == 4)
+    expect("SnapshotAPI serves a recipe", offline.get_malts("b000")[1].amount == 0.5)
+    expect("SnapshotAPI unknown recipe is an API error",
+           _raises(lambda: offline.get_ingredients("b003"), BrewingAPIError))
+    
+    # A damaged record (same size) is reported as missing, not as a crash
+    with open(path + ".dat", 'r+b') as f:
+        f.seek(offline.store._index["b001"][2])
+        f.write(b"{garbage")
+    expect("damaged record unavailable offline", _raises(lambda: offline.get_ingredients("b001"), BrewingAPIError))
+    expect("other records still readable", offline.get_malts("b002")[1].amount == 0.52)
+    
+    # Truncated, missing or foreign files are not loaded
+    with open(path + ".dat", 'r+b') as f:
+        f.truncate(10)
+    expect("truncated data rejected", not SnapshotStore(path).load())
+    with open(path + ".idx", 'r') as f:
+        index = f.read()
+    with open(path + ".idx", 'w') as f:
+        f.write(index[:len(index) - 20])
+    expect("truncated index rejected", not SnapshotStore(path).load())
+    with open(path + ".idx", 'w') as f:
+        f.write("not a snapshot\n")
+    expect("foreign index rejected", not SnapshotStore(path).load())
+    os.remove(path + ".idx")
+    expect("missing snapshot rejected", not SnapshotStore(path).load())
+    expect("empty offline backend", SnapshotAPI(path).get_batches() == [])
+    
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+    print(f"snapshot: {len(failures) or 'no'} failures")
+    for what in failures:
+        print(f"snapshot: FAILED: {what}")
+    return not failures
+
+
+CHECKS = [check_keep_alive, check_sync, check_resilience, check_prefetch, check_snapshot]
+
+
+def selftest():
+    ok = True
+    for check in CHECKS:
+        ok = check() and ok
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main(argv):
+    if argv and argv[0] == '--selftest':
+        sys.exit(0 if selftest() else 1)
+    if argv and not argv[0].isdigit():
+        print(__doc__)
+        return
+    stub = BrewfatherStub(int(argv[0]) if argv else 8081)
+    _fill(stub, 12)
+    print(f"Serving {len(stub.batches)} batches at {stub.url}, Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,424 @@
+"""
+Ultimate Homebrewing Scale - Calibration analysis
+Judges the calibration of a scale from raw ADC captures (runs on a
+computer, needs NumPy): linearity error, hysteresis, noise floor and
+repeatability, and where to put the calibration points
+
+A capture records the raw ADC while reference weights are put on and taken
+off the platform (ideally up and down the whole range twice), each left
+still for a few seconds. Formats:
+    - text: one "t_ms adc" (or "adc") line per reading; '#' and '[' lines skipped
+    - .bin: little-endian int32 ADC values
+    - .npy: 1-D array of ADC values
+
+Usage:
+    python tools/cal_analysis.py scale_calibration.json capture.txt [...]
+        --refs 0 500 1000 2000 5000 10000 20000 [--section scale] [--points N]
+    python tools/cal_analysis.py --synthetic capture.bin calibration.json
+"""
+
+import sys
+import json
+import time
+
+import numpy as np
+
+BLOCK = 16  # samples per block: plateaus are found on block statistics
+MIN_PLATEAU_BLOCKS = 4  # shorter still periods are ignored (settling, bumps)
+STILL_NOISE_FACTOR = 3.0  # a block is still if its spread is below this x the typical one
+JUMP_NOISE_FACTOR = 6.0  # block means further apart than this x sample noise: new plateau
+REF_TOLERANCE = 0.1  # plateau matched to a reference within this fraction (+ 20 g)
+DISPLAY_AVERAGE = 10  # moving average of the scale display (MOVING_AVERAGE_SIZE)
+
+
+def load_calibration(path, section='scale'):
+    """
+    Calibration points of a section of scale_calibration.json
+    
+    Returns:
+        (adc, weight) arrays sorted by ADC value
+    """
+    with open(path, 'r') as f:
+        points = json.load(f)[section]['CalibrationPoints']
+    # [weight, adc] pairs, or {'weight', 'adc_average'} dicts of older files
+    pairs = np.array([(p['weight'], p['adc_average']) if isinstance(p, dict) else p[:2] for p in points],
+                     dtype=np.float64)
+    pairs = pairs[np.argsort(pairs[:, 1])]
+    return pairs[:, 1].copy(), pairs[:, 0].copy()
+
+
+def load_capture(path):
+    """Raw ADC values of a capture (float64 array)"""
+    if path.endswith('.npy'):
+        return np.load(path).astype(np.float64).ravel()
+    if path.endswith('.bin'):
+        return np.fromfile(path, dtype='<i4').astype(np.float64)
+    with open(path, 'r') as f:
+        text = f.read()
+    if '#' in text or '[' in text:
+        text = '\n'.join(line for line in text.splitlines() if line[:1] not in ('#', '['))
+    first = text.lstrip().split('\n', 1)[0]
+    columns = len(first.split())
+    values = np.fromstring(text, sep=' ')
+    return values.reshape(-1, columns)[:, -1] if columns > 1 else values
+
+
+def to_grams(adc, cal_adc, cal_weight):
+    """
+    Piecewise-linear conversion of the scale (CalibratedScale._adc_to_weight),
+    extrapolated from the end segments, for a whole array at once
+    """
+    i = np.clip(np.searchsorted(cal_adc, adc) - 1, 0, len(cal_adc) - 2)
+    x0 = cal_adc[i]
+    span = cal_adc[i + 1] - x0
+    slope = np.divide(cal_weight[i + 1] - cal_weight[i], span, out=np.zeros_like(span), where=span != 0)
+    return cal_weight[i] + (adc - x0) * slope
+
+
+def find_plateaus(adc, block=BLOCK, min_blocks=MIN_PLATEAU_BLOCKS):
+    """
+    Still periods of a capture
+    
+    The capture is cut into blocks; a block is still when its spread is
+    close to the typical one, and consecutive still blocks with close
+    means form a plateau. Everything is computed on arrays, so millions of
+    samples take a fraction of a second.
+    
+    Returns:
+        Dict of arrays, one entry per plateau: start and end (sample
+        index), samples, mean and std (ADC counts)
+    """
+    count = len(adc) // block
+    blocks = adc[:count * block].reshape(count, block)
+    means = blocks.mean(axis=1)
+    variances = blocks.var(axis=1)
+    noise = np.sqrt(np.median(variances)) + 1e-9
+    still = np.sqrt(variances) < STILL_NOISE_FACTOR * noise
+    
+    # A plateau starts after a moving block or where the mean jumps
+    jump = np.abs(np.diff(means, prepend=means[0])) > JUMP_NOISE_FACTOR * noise
+    starts = still & (jump | ~np.concatenate(([False], still[:-1])))
+    label = np.cumsum(starts)
+    label[~still] = 0
+    sizes = np.bincount(label)
+    keep = np.flatnonzero(sizes >= min_blocks)
+    keep = keep[keep > 0]
+    
+    sums = np.bincount(label, weights=means)[keep]
+    var_sums = np.bincount(label, weights=variances)[keep]
+    index = np.arange(count)
+    first = np.full(len(sizes), count)
+    np.minimum.at(first, label, index)
+    last = np.zeros(len(sizes), dtype=np.int64)
+    np.maximum.at(last, label, index)
+    return {
+        'start': first[keep] * block,
+        'end': (last[keep] + 1) * block,
+        'samples': sizes[keep] * block,
+        'mean': sums / sizes[keep],
+        'std': np.sqrt(var_sums / sizes[keep]),
+    }
+
+
+def match_references(grams, refs):
+    """
+    Reference weight of each plateau and the direction of the load change
+    
+    Returns:
+        (ref index, direction) arrays: index -1 if no reference is close,
+        direction +1 loading, -1 unloading
+    """
+    nearest = np.abs(grams[:, None] - refs[None, :]).argmin(axis=1)
+    close = np.abs(grams - refs[nearest]) <= REF_TOLERANCE * refs[nearest] + 20
+    ref_index = np.where(close, nearest, -1)
+    direction = np.ones(len(grams), dtype=np.int64)
+    previous = None
+    for k, r in enumerate(ref_index):
+        if r < 0:
+            continue
+        if previous is not None:
+            direction[k] = direction[previous] if r == ref_index[previous] else (1 if r > ref_index[previous] else -1)
+        previous = k
+    return ref_index, direction
+
+
+def merge_visits(plateaus, ref_index, direction):
+    """
+    Join consecutive plateaus matched to the same reference
+    
+    A bump during a hold splits it into two plateaus: they are one visit of
+    the reference. Unmatched plateaus are left out.
+    
+    Returns:
+        (plateaus, ref_index, direction) of the visits
+    """
+    keep = ref_index >= 0
+    ref_index = ref_index[keep]
+    direction = direction[keep]
+    new = np.diff(ref_index, prepend=-2) != 0
+    group = np.cumsum(new) - 1
+    samples = plateaus['samples'][keep]
+    total = np.bincount(group, weights=samples)
+    
+    def weighted(values):
+        return np.bincount(group, weights=values * samples) / total
+    
+    visits = {
+        'start': plateaus['start'][keep][new],
+        'end': plateaus['end'][keep][np.append(new[1:], True)],
+        'samples': total.astype(np.int64),
+        'mean': weighted(plateaus['mean'][keep]),
+        'std': np.sqrt(weighted(plateaus['std'][keep] ** 2)),
+    }
+    return visits, ref_index[new], direction[new]
+
+
+def interpolation_errors(x, y):
+    """
+    Error of a straight line between each pair of candidate points
+    
+    Returns:
+        Matrix e[i, j]: largest |error| (grams) at the candidates between
+        i and j when only i and j are calibration points
+    """
+    m = len(x)
+    errors = np.zeros((m, m))
+    for i in range(m - 1):
+        j = np.arange(i + 1, m)
+        # Line through (x[i], y[i]) and (x[j], y[j]), evaluated at every k in between
+        slope = (y[j] - y[i]) / (x[j] - x[i])
+        k = np.arange(m)
+        predicted = y[i] + slope[:, None] * (x[None, :] - x[i])
+        inside = (k[None, :] > i) & (k[None, :] < j[:, None])
+        errors[i, i + 1:] = np.where(inside, np.abs(predicted - y[None, :]), 0).max(axis=1)
+    return errors
+
+
+def best_points(x, y, count):
+    """
+    Calibration points minimizing the largest interpolation error
+    
+    Exact search (dynamic programming) among the candidates, both ends
+    always included.
+    
+    Args:
+        x: Candidate ADC values (sorted)
+        y: Reference weights at those values
+        count: Number of calibration points
+    
+    Returns:
+        (indices of the chosen candidates, largest error in grams)
+    """
+    m = len(x)
+    count = max(2, min(count, m))
+    errors = interpolation_errors(x, y)
+    # cost[j]: best largest error covering candidates 0..j with the points used so far
+    cost = errors[0].copy()
+    cost[0] = np.inf
+    choice = []
+    for _ in range(count - 2):
+        total = np.maximum(cost[:, None], errors)
+        total[np.tril_indices(m)] = np.inf
+        choice.append(total.argmin(axis=0))
+        cost = total.min(axis=0)
+    end = m - 1
+    error = cost[end] if count > 2 else errors[0, end]
+    chosen = [end]
+    for previous in reversed(choice):
+        chosen.append(previous[chosen[-1]])
+    chosen.append(0)
+    return sorted(set(chosen)), float(error)
+
+
+def analyse(adc, cal_adc, cal_weight, refs):
+    """
+    Calibration quality from a capture
+    
+    Args:
+        adc: Raw ADC samples
+        cal_adc, cal_weight: Calibration points (sorted by ADC)
+        refs: Reference weights used in the capture (grams)
+    
+    Returns:
+        Dict with the plateaus, visits of the references, per-reference
+        table, summary metrics (grams) and the candidates for point placement
+    """
+    refs = np.sort(np.asarray(refs, dtype=np.float64))
+    plateaus = find_plateaus(adc)
+    grams = to_grams(plateaus['mean'], cal_adc, cal_weight)
+    ref_index, direction = match_references(grams, refs)
+    matched = int((ref_index >= 0).sum())
+    if not matched:
+        raise ValueError("No plateau matches the reference weights")
+    
+    # Noise of the lightest plateau, raw and through the display average
+    lightest = int(np.argmin(np.where(ref_index >= 0, grams, np.inf)))
+    samples = adc[plateaus['start'][lightest]:plateaus['end'][lightest]]
+    sums = np.cumsum(np.concatenate(([0.0], samples)))
+    averaged = (sums[DISPLAY_AVERAGE:] - sums[:-DISPLAY_AVERAGE]) / DISPLAY_AVERAGE
+    gpc = abs(to_grams(plateaus['mean'][lightest] + 1, cal_adc, cal_weight) - grams[lightest])
+    
+    visits, ref_index, direction = merge_visits(plateaus, ref_index, direction)
+    grams = to_grams(visits['mean'], cal_adc, cal_weight)
+    # Local slope of the calibration at each visit
+    grams_per_count = np.abs(to_grams(visits['mean'] + 1, cal_adc, cal_weight) - grams)
+    full_scale = refs[-1] - refs[0]
+    
+    table = []
+    for r, ref in enumerate(refs):
+        mine = ref_index == r
+        if not mine.any():
+            continue
+        up = mine & (direction > 0)
+        down = mine & (direction < 0)
+        row = {
+            'ref_g': ref,
+            'visits': int(mine.sum()),
+            # Loading visits, like the calibration wizard
+            'adc': float(visits['mean'][up if up.any() else mine].mean()),
+            'error_g': float(grams[up if up.any() else mine].mean() - ref),
+            'hysteresis_g': float(grams[down].mean() - grams[up].mean()) if up.any() and down.any() else None,
+            'repeatability_g': None,
+            'noise_g': float(np.median(visits['std'][mine] * grams_per_count[mine])),
+        }
+        spreads = [grams[d].std(ddof=1) for d in (up, down) if d.sum() >= 2]
+        if spreads:
+            row['repeatability_g'] = float(max(spreads))
+        table.append(row)
+    
+    measured_refs = np.array([row['ref_g'] for row in table])
+    measured_adc = np.array([row['adc'] for row in table])
+    
+    # Best straight line through the load cell response (calibration independent)
+    fit = np.polyfit(measured_refs, measured_adc, 1)
+    nonlinearity = (measured_adc - np.polyval(fit, measured_refs)) / fit[0]
+    
+    def largest(key):
+        values = [abs(row[key]) for row in table if row[key] is not None]
+        return max(values) if values else None
+    
+    return {
+        'plateaus': plateaus,
+        'matched': matched,
+        'visits': visits,
+        'table': table,
+        'full_scale_g': full_scale,
+        'linearity_g': largest('error_g'),
+        'nonlinearity_g': float(np.abs(nonlinearity).max()),
+        'hysteresis_g': largest('hysteresis_g'),
+        'repeatability_g': largest('repeatability_g'),
+        'noise_g': float(samples.std() * gpc),
+        'noise_pp_g': float(np.ptp(samples) * gpc),
+        'display_noise_g': float(averaged.std() * gpc) if len(averaged) > 1 else None,
+        'candidates': (measured_adc, measured_refs),
+    }
+
+
+def synthetic_capture(capture_path, calibration_path, refs=(0, 500, 1000, 2000, 5000, 10000, 15000, 20000),
+                      rate_hz=100, hold_s=5, cycles=2):
+    """
+    Write a capture of a slightly non-linear load cell with hysteresis, and
+    a 4-point calibration (0 / 500 / 5000 / 20000 g) of the same cell
+    """
+    rng = np.random.default_rng(1)
+    full_scale = max(refs)
+    
+    def response(weight, unloading=False):
+        # 40 counts/g, 0.05 % bow and 0.02 % of full scale hysteresis
+        bow = 0.0005 * full_scale * 4 * (weight / full_scale) * (1 - weight / full_scale)
+        hysteresis = 0.0002 * full_scale * np.sin(np.pi * weight / full_scale) if unloading else 0.0
+        return 8000000 + 40 * (weight + bow + hysteresis)
+    
+    hold = int(hold_s * rate_hz)
+    ramp = int(0.5 * rate_hz)
+    parts = []
+    previous = response(0)
+    sequence = list(refs) + list(reversed(refs[:-1]))
+    for _ in range(cycles):
+        for k, weight in enumerate(sequence):
+            level = response(weight, unloading=k >= len(refs))
+            parts.append(np.linspace(previous, level, ramp))
+            parts.append(np.full(hold, level))
+            previous = level
+    adc = np.concatenate(parts) + rng.normal(0, 12, sum(len(p) for p in parts))
+    np.round(adc).astype('<i4').tofile(capture_path)
+    
+    points = [[weight, round(float(response(weight)), 1)] for weight in (0, 500, 5000, 20000)]
+    with open(calibration_path, 'w') as f:
+        json.dump({'scale': {'CalibrationPoints': points}}, f)
+    return len(adc)
+
+
+def _option(argv, name, default):
+    if name not in argv:
+        return default
+    i = argv.index(name)
+    values = []
+    for value in argv[i + 1:]:
+        if value.startswith('--'):
+            break
+        values.append(value)
+    return values
+
+
+def main(argv):
+    if len(argv) >= 3 and argv[0] == '--synthetic':
+        samples = synthetic_capture(argv[1], argv[2])
+        print(f"Synthetic capture ({samples} samples) written to {argv[1]}, calibration to {argv[2]}")
+        print(f"python tools/cal_analysis.py {argv[2]} {argv[1]} --refs 0 500 1000 2000 5000 10000 15000 20000")
+        return
+    refs = _option(argv, '--refs', None)
+    files = []
+    for value in argv:
+        if value.startswith('--'):
+            break
+        files.append(value)
+    if len(files) < 2 or not refs:
+        print(__doc__)
+        return
+    section = _option(argv, '--section', ['scale'])[0]
+    cal_adc, cal_weight = load_calibration(files[0], section)
+    count = int(_option(argv, '--points', [len(cal_adc)])[0])
+    
+    begin = time.perf_counter()
+    adc = np.concatenate([load_capture(path) for path in files[1:]])
+    loaded = time.perf_counter()
+    result = analyse(adc, cal_adc, cal_weight, [float(r) for r in refs])
+    done = time.perf_counter()
+    
+    fs = result['full_scale_g']
+    print(f"{len(adc)} samples loaded in {loaded - begin:.2f} s, analysed in {done - loaded:.2f} s: "
+          f"{len(result['plateaus']['mean'])} plateaus, {result['matched']} matched to a reference")
+    print(f"{'reference':>10}  {'visits':>8}  {'error':>8}  {'hysteresis':>10}  {'repeat.':>8}  {'noise':>7}")
+    for row in result['table']:
+        hysteresis = f"{row['hysteresis_g']:+8.2f} g" if row['hysteresis_g'] is not None else f"{'-':>10}"
+        repeat = f"{row['repeatability_g']:6.2f} g" if row['repeatability_g'] is not None else f"{'-':>8}"
+        print(f"{row['ref_g']:8.0f} g  {row['visits']:8}  {row['error_g']:+6.2f} g  {hysteresis}  "
+              f"{repeat}  {row['noise_g']:5.2f} g")
+    
+    def line(label, value, note=""):
+        if value is None:
+            print(f"{label:<30} -")
+        else:
+            print(f"{label:<30} {value:7.2f} g  ({value / fs * 100:.3f} % FS){note}")
+    print()
+    line("Linearity error (max)", result['linearity_g'])
+    line("Load cell non-linearity", result['nonlinearity_g'], ", best straight line")
+    line("Hysteresis (max)", result['hysteresis_g'])
+    line("Repeatability (max std)", result['repeatability_g'])
+    line("Noise floor (std)", result['noise_g'], f", {result['noise_pp_g']:.1f} g peak-to-peak")
+    line(f"Display noise ({DISPLAY_AVERAGE}-sample avg)", result['display_noise_g'])
+    
+    # Point placement among the measured references
+    x, y = result['candidates']
+    print(f"\nCalibration points (current: {len(cal_adc)}, "
+          f"{', '.join(f'{w:.0f}' for w in cal_weight)} g)")
+    for k in range(2, len(x) + 1):
+        chosen, error = best_points(x, y, k)
+        mark = "  <-" if k == count else ""
+        print(f"  {k:2} points: max interpolation error {error:6.2f} g  at "
+              f"{', '.join(f'{y[i]:.0f}' for i in chosen)} g{mark}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,171 @@
+"""
+Ultimate Homebrewing Scale - Drift replay
+Replays a long capture through creep compensation and zero tracking
+(runs on a computer) and reports the drift of each static load
+
+Captures are text files with one "t_ms gross_weight_g" line per reading
+(Grain Assistant recordings work too: their JSON first line is skipped).
+
+Usage:
+    python tools/drift_replay.py capture.rec [--creep COEFF TAU_S] [--fit]
+    python tools/drift_replay.py --synthetic capture.rec
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from weighing import ZeroTracker, CreepCompensator
+
+STATIC_MIN_MS = 5 * 60000  # segments shorter than this are not reported
+LOADED_MIN_G = 500  # segments below this are "empty" (zero tracking)
+STEP_G = 50  # a change of this between two readings starts a new segment
+
+
+def load_capture(path):
+    """Read (t_ms, gross_g) samples"""
+    samples = []
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip() or line[0] in '[#':
+                continue
+            t_ms, gross = line.split()[:2]
+            samples.append((int(t_ms), float(gross)))
+    return samples
+
+
+def replay(samples, coefficient=0.0, tau_s=1200, zero_tracking=True):
+    """
+    Run the scale pipeline (creep, tare at start, zero tracking) on a capture
+    
+    Returns:
+        List of static segments: dicts with start/end (ms), load (g), drift
+        of the raw and of the compensated weight (g)
+    """
+    creep = CreepCompensator(coefficient, tau_s)
+    tracker = ZeroTracker()
+    tracker.enabled = zero_tracking
+    tare = samples[0][1]
+    segments = []
+    current = None
+    previous = None
+    
+    for t_ms, gross in samples:
+        weight = creep.update(gross, t_ms) - tare
+        correction = tracker.update(weight, t_ms)
+        tare += correction
+        weight -= correction
+        
+        # Static segments: no load step between consecutive readings
+        raw = gross - samples[0][1]
+        if previous is not None and abs(raw - previous) > STEP_G:
+            if current is not None:
+                segments.append(current)
+            current = None
+        elif current is None:
+            current = {'start': t_ms, 'raw0': raw, 'net0': weight}
+        else:
+            current.update(end=t_ms, raw1=raw, net1=weight)
+        previous = raw
+    if current is not None:
+        segments.append(current)
+    
+    static = []
+    for seg in segments:
+        if 'end' not in seg or seg['end'] - seg['start'] < STATIC_MIN_MS:
+            continue
+        loaded = abs(seg['raw0']) >= LOADED_MIN_G
+        static.append({
+            'start': seg['start'],
+            'end': seg['end'],
+            'load_g': seg['raw0'],
+            'loaded': loaded,
+            'raw_drift_g': seg['raw1'] - seg['raw0'],
+            # Empty platform: the reading itself should stay at zero
+            'drift_g': seg['net1'] - seg['net0'] if loaded else seg['net1'],
+        })
+    return static
+
+
+def fit_creep(samples):
+    """Grid search of the creep model minimizing the drift of static loads"""
+    best = (None, 0.0, 1200)
+    for tau_s in (300, 600, 1200, 1800, 2700, 3600):
+        for step in range(0, 41):
+            coefficient = step * 0.00005
+            segments = [s for s in replay(samples, coefficient, tau_s, False) if s['loaded']]
+            error = sum(s['drift_g'] ** 2 for s in segments)
+            if best[0] is None or error < best[0]:
+                best = (error, coefficient, tau_s)
+    return best[1], best[2]
+
+
+def synthetic_capture(path, load_g=25000, coefficient=0.0008, tau_s=1200, hours=2):
+    """Write a capture: empty, keg for `hours` with creep, empty again, plus slow zero drift"""
+    import random
+    rng = random.Random(1)
+    creep = 0.0
+    zero = 0.0
+    with open(path, 'w') as f:
+        for t_s in range(0, int(hours * 3600) + 1800, 1):
+            loaded = 600 <= t_s < 600 + hours * 3600
+            load = load_g if loaded else 0.0
+            creep += (coefficient * load - creep) / tau_s
+            zero += 0.001  # temperature drift of the zero: ~4 g/h
+            gross = load + creep + zero + rng.gauss(0, 0.2)  # filtered reading
+            f.write(f"{t_s * 1000} {gross:.1f}\n")
+
+
+def _usage(message=None):
+    if message:
+        print(f"drift_replay: {message}", file=sys.stderr)
+    print(__doc__.split("Usage:")[1].rstrip(), file=sys.stderr if message else sys.stdout)
+    return 2 if message else 0
+
+
+def main(argv):
+    if not argv or argv[0] in ('-h', '--help'):
+        return _usage()
+    if argv[0] == '--synthetic':
+        if len(argv) != 2:
+            return _usage("--synthetic needs one output file")
+        synthetic_capture(argv[1])
+        print(f"Synthetic capture written to {argv[1]}")
+        return 0
+    if argv[0].startswith('-'):
+        return _usage(f"unknown option {argv[0]}")
+    
+    coefficient, tau_s = 0.0, 1200
+    options = argv[1:]
+    while options:
+        option = options.pop(0)
+        if option == '--creep':
+            try:
+                coefficient, tau_s = float(options.pop(0)), float(options.pop(0))
+            except (IndexError, ValueError):
+                return _usage("--creep needs COEFF and TAU_S numbers")
+        elif option != '--fit':
+            return _usage(f"unknown option {option}")
+    try:
+        samples = load_capture(argv[0])
+    except (OSError, ValueError) as e:
+        print(f"drift_replay: cannot read {argv[0]}: {e}", file=sys.stderr)
+        return 1
+    if not samples:
+        print(f"drift_replay: no readings in {argv[0]}", file=sys.stderr)
+        return 1
+    if '--fit' in argv:
+        coefficient, tau_s = fit_creep(samples)
+        print(f'Fitted creep: "Creep": {{"coefficient": {coefficient:.5f}, "tau_s": {tau_s}}}')
+    
+    uncompensated = replay(samples, 0.0, tau_s, False)
+    compensated = replay(samples, coefficient, tau_s, True)
+    print(f"{'segment':>17}  {'load':>9}  {'raw drift':>9}  {'compensated':>11}")
+    for raw, comp in zip(uncompensated, compensated):
+        span = f"{raw['start'] // 60000}-{raw['end'] // 60000} min"
+        print(f"{span:>17}  {raw['load_g']:7.0f} g  {raw['drift_g']:+7.1f} g  {comp['drift_g']:+9.1f} g")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,22 @@
+"""
+Ultimate Homebrewing Scale - Firmware emulator
+Runs scale.py, the calibration wizard and the other device modules on a
+computer, with stand-ins for the UIFlow2 modules, a headless screen
+recorder and a virtual clock: minutes of device time take milliseconds
+
+Usage:
+    python -m tools.emulator [calibration|fill|idle|drift|platforms|grain|small_hop|all] [--echo] [--wrap]
+
+From Python (repository root on sys.path):
+    from tools.emulator import Emulator
+    with Emulator() as emu:
+        import scale
+        app = scale.ScaleApp()
+        emu.script(operator())  # generator: yield ms, or a condition
+        emu.run(app.run, timeout_ms=60000)
+"""
+
+from .clock import VirtualClock, TICKS_PERIOD, ticks_diff, ticks_add
+from .device import Emulator, StopEmulation
+from .models import LoadCell, Keg
+from .ui import UIRecorder
@@ -0,0 +1,64 @@
+"""
+Ultimate Homebrewing Scale - Emulator scenarios from the command line
+
+Usage:
+    python -m tools.emulator [calibration|fill|idle|drift|platforms|grain|small_hop|all] [--echo] [--wrap]
+    
+    --echo  print the screen changes with their device time
+    --wrap  boot one minute before the ticks_ms() wraparound
+"""
+
+import sys
+import time
+
+from .clock import TICKS_PERIOD
+from .device import Emulator
+from .scenarios import SCENARIOS
+
+
+def _duration(ms):
+    seconds = ms / 1000
+    if seconds < 120:
+        return f"{seconds:.1f} s"
+    return f"{int(seconds // 60)} min {int(seconds % 60)} s"
+
+
+def main(argv):
+    echo = '--echo' in argv
+    start_ms = TICKS_PERIOD - 60000 if '--wrap' in argv else 0
+    names = [arg for arg in argv if not arg.startswith('--')] or ['all']
+    if names == ['all']:
+        names = list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            print(f"unknown scenario {name!r} (one of: {', '.join(SCENARIOS)}, all)")
+            return 2
+    
+    failed = 0
+    for name in names:
+        emu = Emulator(start_ms=start_ms, echo=echo)
+        wall = time.perf_counter()
+        try:
+            with emu:
+                summary = SCENARIOS[name](emu)
+        except AssertionError as e:
+            print(f"{name}: FAILED: {e}")
+            failed += 1
+            continue
+        wall = time.perf_counter() - wall
+        device_ms = emu.now_ms
+        print(f"{name}: {summary.pop('reason')} after {_duration(device_ms)} of device time "
+              f"in {wall:.2f} s ({device_ms / 1000 / wall:.0f}x)")
+        for key, value in summary.items():
+            if isinstance(value, list) and value and isinstance(value[0], (dict, str)):
+                print(f"  {key}:")
+                for item in value:
+                    print(f"    {item}")
+            else:
+                print(f"  {key}: {value}")
+        print(f"  I2C transactions: {emu.i2c_transactions}, screen updates: {len(emu.ui.timeline)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,174 @@
+"""
+Ultimate Homebrewing Scale - Emulator virtual clock
+MicroPython ticks (with their wraparound) on a simulated time base that
+only moves when the firmware sleeps or spends modeled time, so minutes of
+device time run in milliseconds
+"""
+
+import time
+import heapq
+
+# MicroPython ticks_ms()/ticks_us() wrap around at 2**30
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+
+def ticks_diff(end, start):
+    """Signed difference of two ticks values (MicroPython semantics)"""
+    return ((end - start + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def ticks_add(ticks, delta):
+    """Ticks value `delta` after `ticks` (MicroPython semantics)"""
+    return (ticks + delta) & TICKS_MAX
+
+
+class _Task:
+    __slots__ = ('due_us', 'period_us', 'callback', 'active')
+    
+    def __init__(self, due_us, period_us, callback):
+        self.due_us = due_us
+        self.period_us = period_us
+        self.callback = callback
+        self.active = True
+
+
+class VirtualClock:
+    """
+    Simulated time base
+    
+    `now_us` is the time since the emulated boot. Sleeping advances it at
+    once, running the tasks due in between in time order: hardware timer
+    callbacks, scripted events, physical models. A task that consumes time
+    itself (an I2C read in a timer callback) only moves the clock forward,
+    like an interrupt delaying the code it preempted.
+    """
+    
+    def __init__(self, start_ms=0):
+        """
+        Initialize the clock
+        
+        Args:
+            start_ms: Time at boot; close to TICKS_PERIOD to test wraparound
+        """
+        self.now_us = start_ms * 1000
+        self.slept_us = 0  # total time spent in sleep calls
+        self.on_advance = None  # called after each top-level advance
+        self._queue = []
+        self._seq = 0
+        self._depth = 0
+    
+    @property
+    def now_ms(self):
+        return self.now_us // 1000
+    
+    def ticks_ms(self):
+        return (self.now_us // 1000) & TICKS_MAX
+    
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+    
+    def sleep_ms(self, ms):
+        if ms > 0:
+            self.slept_us += int(ms * 1000)
+            self.advance(int(ms * 1000))
+    
+    def sleep_us(self, us):
+        if us > 0:
+            self.slept_us += int(us)
+            self.advance(int(us))
+    
+    def sleep(self, seconds):
+        self.sleep_ms(seconds * 1000)
+    
+    def call_at(self, due_us, callback, period_us=0):
+        """
+        Run a callback at a time since boot
+        
+        Args:
+            due_us: Time of the first call
+            callback: Function without arguments
+            period_us: Repeat this often (0: once)
+        
+        Returns:
+            Task handle for cancel()
+        """
+        task = _Task(max(due_us, self.now_us), period_us, callback)
+        self._push(task)
+        return task
+    
+    def call_later(self, delay_us, callback, period_us=0):
+        """call_at() relative to now"""
+        return self.call_at(self.now_us + delay_us, callback, period_us)
+    
+    def cancel(self, task):
+        task.active = False
+    
+    def _push(self, task):
+        self._seq += 1
+        heapq.heappush(self._queue, (task.due_us, self._seq, task))
+    
+    def advance(self, us):
+        """
+        Move time forward, running the tasks due on the way
+        
+        Args:
+            us: Duration (microseconds)
+        """
+        end = self.now_us + us
+        if self._depth:
+            # Time consumed inside a task: no nested dispatch
+            self.now_us = end
+            return
+        queue = self._queue
+        self._depth += 1
+        try:
+            while queue and queue[0][0] <= end:
+                due, _, task = heapq.heappop(queue)
+                if not task.active:
+                    continue
+                if due > self.now_us:
+                    self.now_us = due
+                if task.period_us:
+                    task.due_us = due + task.period_us
+                    self._push(task)
+                else:
+                    task.active = False
+                task.callback()
+        finally:
+            self._depth -= 1
+        if end > self.now_us:
+            self.now_us = end
+        if self.on_advance:
+            self.on_advance()
+    
+    def install(self):
+        """
+        Replace the time functions the firmware uses by this clock
+        
+        Returns:
+            The replaced attributes, for uninstall()
+        """
+        names = ('ticks_ms', 'ticks_us', 'ticks_diff', 'ticks_add', 'sleep_ms', 'sleep_us', 'sleep', 'time')
+        saved = {name: getattr(time, name, None) for name in names}
+        epoch = time.time() - self.now_us / 1000000
+        time.ticks_ms = self.ticks_ms
+        time.ticks_us = self.ticks_us
+        time.ticks_diff = ticks_diff
+        time.ticks_add = ticks_add
+        time.sleep_ms = self.sleep_ms
+        time.sleep_us = self.sleep_us
+        time.sleep = self.sleep
+        time.time = lambda: epoch + self.now_us / 1000000
+        return saved
+    
+    @staticmethod
+    def uninstall(saved):
+        """Restore the time functions replaced by install()"""
+        for name, value in saved.items():
+            if value is None:
+                if hasattr(time, name):
+                    delattr(time, name)
+            else:
+                setattr(time, name, value)
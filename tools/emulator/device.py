@@ -0,0 +1,357 @@
+"""
+Ultimate Homebrewing Scale - Emulator
+The emulated device (clock, buttons, encoder, pins, I2C sensors, screen),
+the install of the firmware stand-in modules, and the scripting of
+end-to-end scenarios
+"""
+
+import os
+import sys
+import tempfile
+import importlib
+
+from .clock import VirtualClock
+from .ui import UIRecorder
+from .models import LoadCell
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FIRMWARE_MODULES = ('M5', 'm5ui', 'lvgl', 'hardware', 'unit', 'machine')
+
+HOLD_MS = 500  # M5Unified button hold threshold
+UPDATE_US = 100  # time spent in M5.update() (keeps polling loops moving)
+
+_current = None
+
+
+def current():
+    """Installed Emulator (used by the firmware stand-ins)"""
+    if _current is None:
+        raise RuntimeError("no emulator installed")
+    return _current
+
+
+class StopEmulation(BaseException):
+    """
+    Ends Emulator.run() from inside the firmware
+    
+    A BaseException, like KeyboardInterrupt, so the `except Exception`
+    handlers of the firmware loops do not catch it.
+    """
+    
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Button:
+    """
+    Physical button and its M5Unified state
+    
+    press()/release() change the contact; M5.update() samples it, and the
+    was*() edges stay set until the next update, as on the device. A
+    press shorter than the update interval can be missed, also as on the
+    device.
+    """
+    
+    def __init__(self, clock, name):
+        self.clock = clock
+        self.name = name
+        self.down = False
+        self._down_ms = 0
+        self._pressed = False
+        self._was_pressed = False
+        self._was_released = False
+        self._was_clicked = False
+        self._was_hold = False
+        self._holding = False
+    
+    def press(self):
+        self.down = True
+    
+    def release(self):
+        self.down = False
+    
+    def sample(self):
+        now = self.clock.now_ms
+        down = self.down
+        self._was_pressed = down and not self._pressed
+        self._was_released = self._pressed and not down
+        self._was_clicked = self._was_released and not self._holding
+        self._was_hold = False
+        if self._was_pressed:
+            self._down_ms = now
+        if down and not self._holding and now - self._down_ms >= HOLD_MS:
+            self._holding = True
+            self._was_hold = True
+        if not down:
+            self._holding = False
+        self._pressed = down
+    
+    # M5Unified Button_Class interface
+    def isPressed(self):
+        return self._pressed
+    
+    def isReleased(self):
+        return not self._pressed
+    
+    def isHolding(self):
+        return self._holding
+    
+    def wasPressed(self):
+        return self._was_pressed
+    
+    def wasReleased(self):
+        return self._was_released
+    
+    def wasClicked(self):
+        return self._was_clicked
+    
+    def wasHold(self):
+        return self._was_hold
+
+
+class PinState:
+    """Level of a GPIO, shared by the Pin objects of the same number"""
+    
+    def __init__(self, clock, number):
+        self.clock = clock
+        self.number = number
+        self.value = 0
+        self.changed_us = 0
+        self.changes = 0
+    
+    def set(self, value):
+        value = 1 if value else 0
+        if value != self.value:
+            self.value = value
+            self.changed_us = self.clock.now_us
+            self.changes += 1
+
+
+class Emulator:
+    """
+    Emulated M5Stack running the firmware on a virtual clock
+    
+    Use as a context manager: install() replaces the time functions and
+    registers the stand-ins of M5, m5ui, lvgl, hardware, unit and machine,
+    then firmware modules (scale, core, the wizard...) are imported as on
+    the device. Firmware modules already imported are dropped first, so
+    they bind the virtual clock, and again on exit.
+    
+    Scripts are generators: yielding a number waits that many milliseconds
+    of device time, yielding a function waits until it returns True.
+    """
+    
+    def __init__(self, start_ms=0, seed=1, echo=False, workdir=None):
+        """
+        Initialize the device (one Weight I2C unit on bus 0 at 0x26)
+        
+        Args:
+            start_ms: Ticks at boot (close to clock.TICKS_PERIOD: wraparound test)
+            seed: Sensor noise random seed
+            echo: Print the screen changes as they happen
+            workdir: Directory the firmware runs in (files it writes), a
+                     new temporary directory if None
+        """
+        self.clock = VirtualClock(start_ms)
+        self.clock.on_advance = self._check
+        self.ui = UIRecorder(self.clock, echo, start_ms)
+        self.buttons = {name: Button(self.clock, name) for name in 'ABC'}
+        self.rotary = 0
+        self.pins = {}
+        self.i2c_devices = {}
+        self.i2c_transactions = 0
+        self.workdir = workdir or tempfile.mkdtemp(prefix='uhs-emulator-')
+        self.sensor = self.add_sensor(0, 0x26, seed=seed)
+        self._start_ms = start_ms
+        self._watches = []
+        self._stop = None
+        self._deadline_us = None
+        self._saved_time = None
+        self._saved_cwd = None
+        self._saved_path = None
+    
+    # ------------------------------------------------------------------
+    # Device
+    # ------------------------------------------------------------------
+    
+    @property
+    def now_ms(self):
+        """Device time since boot (ms)"""
+        return self.clock.now_ms - self._start_ms
+    
+    def add_sensor(self, bus=0, address=0x26, **model):
+        """
+        Connect a Weight I2C unit
+        
+        Args:
+            bus: I2C peripheral id
+            address: I2C address
+            model: LoadCell parameters
+        
+        Returns:
+            The LoadCell
+        """
+        sensor = LoadCell(self.clock, **model)
+        self.i2c_devices[(bus, address)] = sensor
+        return sensor
+    
+    def pin(self, number):
+        """State of a GPIO (created on first use)"""
+        state = self.pins.get(number)
+        if state is None:
+            state = self.pins[number] = PinState(self.clock, number)
+        return state
+    
+    def i2c_read(self, bus, address, register, length, freq):
+        """
+        Register read on an emulated bus
+        
+        Takes the transfer time at `freq` (9 bits per byte: address and
+        register written, address and data read).
+        """
+        self.i2c_transactions += 1
+        self.clock.advance((length + 3) * 9 * 1000000 // freq + 20)
+        device = self.i2c_devices.get((bus, address))
+        if device is None:
+            raise OSError(19)  # ENODEV, as an unanswered address on the device
+        return device.read_register(register, length)
+    
+    def update(self):
+        """M5.update(): sample the buttons"""
+        self.clock.advance(UPDATE_US)
+        for button in self.buttons.values():
+            button.sample()
+    
+    # ------------------------------------------------------------------
+    # Install
+    # ------------------------------------------------------------------
+    
+    def install(self):
+        """Run firmware code on this emulator from now on"""
+        global _current
+        if _current is not None:
+            raise RuntimeError("an emulator is already installed")
+        _current = self
+        self._saved_time = self.clock.install()
+        self._saved_cwd = os.getcwd()
+        self._saved_path = list(sys.path)
+        _drop_firmware_modules()
+        for name in FIRMWARE_MODULES:
+            sys.modules[name] = importlib.import_module('.firmware.' + name, __package__)
+        for path in (REPO_DIR, os.path.join(REPO_DIR, 'ScaleCalibration')):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+        os.chdir(self.workdir)
+        return self
+    
+    def uninstall(self):
+        """Restore the host environment"""
+        global _current
+        if _current is not self:
+            return
+        _drop_firmware_modules()
+        for name in FIRMWARE_MODULES:
+            sys.modules.pop(name, None)
+        os.chdir(self._saved_cwd)
+        sys.path[:] = self._saved_path
+        VirtualClock.uninstall(self._saved_time)
+        _current = None
+    
+    def __enter__(self):
+        return self.install()
+    
+    def __exit__(self, *exc):
+        self.uninstall()
+        return False
+    
+    # ------------------------------------------------------------------
+    # Scripting
+    # ------------------------------------------------------------------
+    
+    def at(self, ms, action, *args):
+        """Call action(*args) at a device time (ms since boot)"""
+        self.clock.call_at((self._start_ms + ms) * 1000, lambda: action(*args))
+    
+    def after(self, ms, action, *args):
+        """Call action(*args) in `ms` of device time"""
+        self.clock.call_later(int(ms * 1000), lambda: action(*args))
+    
+    def when(self, condition, action, *args):
+        """Call action(*args) once, the first time condition() is True"""
+        self._watches.append((condition, lambda: action(*args)))
+    
+    def script(self, generator):
+        """
+        Play a scenario script alongside the firmware
+        
+        Args:
+            generator: Yields milliseconds to wait or conditions to wait for
+        """
+        def resume():
+            try:
+                wait = next(generator)
+            except StopIteration:
+                return
+            if callable(wait):
+                self.when(wait, resume)
+            else:
+                self.after(wait, resume)
+        resume()
+    
+    def press(self, button='A', duration_ms=100):
+        """Press and release a button (held if longer than HOLD_MS)"""
+        self.buttons[button].press()
+        self.after(duration_ms, self.buttons[button].release)
+    
+    def turn(self, steps):
+        """Turn the rotary encoder (positive: clockwise)"""
+        self.rotary += steps
+    
+    def set_load(self, grams, ramp_ms=0):
+        """Static load on the default sensor"""
+        self.sensor.set_load(grams, ramp_ms)
+    
+    def stop(self, reason='stopped'):
+        """End run() at the next clock advance"""
+        self._stop = reason
+    
+    def run(self, main, until=None, timeout_ms=None):
+        """
+        Run firmware code until it returns, `until` is True, stop() is
+        called or `timeout_ms` of device time have passed
+        
+        Returns:
+            (reason, return value of main or None)
+        """
+        if until is not None:
+            self.when(until, self.stop, 'until')
+        self._stop = None
+        self._deadline_us = self.clock.now_us + timeout_ms * 1000 if timeout_ms else None
+        try:
+            return 'returned', main()
+        except StopEmulation as e:
+            return e.reason, None
+        finally:
+            self._deadline_us = None
+    
+    def _check(self):
+        if self._watches:
+            fired = [watch for watch in self._watches if watch[0]()]
+            for watch in fired:
+                self._watches.remove(watch)
+                watch[1]()
+        if self._stop is not None:
+            reason, self._stop = self._stop, None
+            raise StopEmulation(reason)
+        if self._deadline_us is not None and self.clock.now_us >= self._deadline_us:
+            raise StopEmulation('timeout')
+
+
+def _drop_firmware_modules():
+    """Forget the modules imported from the repository (except the emulator)"""
+    package = __package__.split('.')[0]
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if path and name.split('.')[0] != package and os.path.abspath(path).startswith(REPO_DIR + os.sep):
+            del sys.modules[name]
@@ -0,0 +1,42 @@
+"""
+Emulated M5 module: buttons and display backlight (M5Unified interface)
+"""
+
+from ..device import current
+
+__all__ = ['begin', 'update', 'BtnA', 'BtnB', 'BtnC', 'Lcd']
+
+
+def begin():
+    pass
+
+
+def update():
+    current().update()
+
+
+class _ButtonProxy:
+    """Forwards to the button of the installed emulator"""
+    
+    def __init__(self, name):
+        self._name = name
+    
+    def __getattr__(self, attr):
+        return getattr(current().buttons[self._name], attr)
+
+
+class _Lcd:
+    def setBrightness(self, level):
+        current().ui.set_brightness(level)
+    
+    def width(self):
+        return 320
+    
+    def height(self):
+        return 240
+
+
+BtnA = _ButtonProxy('A')
+BtnB = _ButtonProxy('B')
+BtnC = _ButtonProxy('C')
+Lcd = _Lcd()
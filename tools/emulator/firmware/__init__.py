@@ -0,0 +1,6 @@
+"""
+Ultimate Homebrewing Scale - Emulator firmware modules
+Stand-ins of the UIFlow2 modules the firmware imports (M5, m5ui, lvgl,
+hardware, unit, machine), registered under their device names by
+Emulator.install()
+"""
@@ -0,0 +1,63 @@
+"""
+Emulated hardware module: I2C, Pin and the rotary encoder
+"""
+
+from ..device import current
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._state = current().pin(id)
+        if value is not None:
+            self._state.set(value)
+    
+    def value(self, value=None):
+        if value is None:
+            return self._state.value
+        self._state.set(value)
+    
+    def on(self):
+        self._state.set(1)
+    
+    def off(self):
+        self._state.set(0)
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+    
+    def init(self, scl=None, sda=None, freq=400000):
+        self.freq = freq
+    
+    def scan(self):
+        return sorted(address for bus, address in current().i2c_devices if bus == self.id)
+    
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return current().i2c_read(self.id, addr, memaddr, nbytes, self.freq)
+    
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        view = memoryview(buf).cast('B')
+        view[:] = current().i2c_read(self.id, addr, memaddr, len(view), self.freq)
+    
+    def writeto_mem(self, addr, memaddr, buf):
+        current().i2c_read(self.id, addr, memaddr, 0, self.freq)
+
+
+class Rotary:
+    def get_rotary_value(self):
+        return current().rotary
+    
+    def reset_rotary_value(self):
+        current().rotary = 0
+    
+    def get_rotary_status(self):
+        return current().rotary != 0
@@ -0,0 +1,40 @@
+"""
+Emulated lvgl module: progress bar and Montserrat fonts
+"""
+
+from ..device import current
+from ..ui import Widget
+
+
+class _Font:
+    def __init__(self, size):
+        self.size = size
+    
+    def __repr__(self):
+        return f"<font montserrat {self.size}>"
+
+
+for _size in range(10, 50, 2):
+    globals()[f"font_montserrat_{_size}"] = _Font(_size)
+
+
+class bar:
+    def __init__(self, parent=None):
+        page = getattr(parent, '_page', None)
+        self._widget = Widget(current().ui, 'bar', page)
+    
+    def set_size(self, width, height):
+        self._widget.size = (width, height)
+    
+    def set_pos(self, x, y):
+        self._widget.x = x
+        self._widget.y = y
+    
+    def set_range(self, low, high):
+        self._widget.range = (low, high)
+    
+    def set_value(self, value, anim=False):
+        current().ui.set_value(self._widget, value)
+    
+    def get_value(self):
+        return self._widget.value
@@ -0,0 +1,39 @@
+"""
+Emulated m5ui module: pages and labels, recorded by the UIRecorder
+"""
+
+from ..device import current
+from ..ui import Page, Widget
+
+
+def init():
+    pass
+
+
+def deinit():
+    pass
+
+
+class M5Page:
+    def __init__(self, bg_c=0x000000):
+        self._page = Page(current().ui)
+        self.bg_c = bg_c
+    
+    def screen_load(self):
+        current().ui.load(self._page)
+
+
+class M5Label:
+    def __init__(self, text='', x=0, y=0, text_c=0xFFFFFF, bg_c=0x000000, bg_opa=0, font=None, parent=None):
+        page = parent._page if parent is not None else None
+        self._widget = Widget(current().ui, 'label', page, x, y, text, font)
+        self.text_c = text_c
+    
+    def set_text(self, text):
+        current().ui.set_text(self._widget, text)
+    
+    def get_text(self):
+        return self._widget.text
+    
+    def set_text_color(self, color, opa=255, part=0):
+        self.text_c = color
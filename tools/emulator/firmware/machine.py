@@ -0,0 +1,29 @@
+"""
+Emulated machine module: hardware timers on the virtual clock
+"""
+
+from ..device import current
+from .hardware import Pin
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+    
+    def __init__(self, id=0):
+        self.id = id
+        self._task = None
+    
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        clock = current().clock
+        period_us = int(period * 1000)
+        self._task = clock.call_later(period_us, lambda: callback(self),
+                                      period_us if mode == Timer.PERIODIC else 0)
+    
+    def deinit(self):
+        if self._task is not None:
+            current().clock.cancel(self._task)
+            self._task = None
@@ -0,0 +1,16 @@
+"""
+Emulated unit module: Weight I2C unit driver
+"""
+
+ADC_REGISTER = 0x00
+
+
+class WeightI2CUnit:
+    def __init__(self, i2c, address=0x26):
+        self.i2c = i2c
+        self.address = address
+    
+    @property
+    def get_adc_raw(self):
+        data = self.i2c.readfrom_mem(self.address, ADC_REGISTER, 4)
+        return int.from_bytes(data, 'little', signed=True)
@@ -0,0 +1,151 @@
+"""
+Ultimate Homebrewing Scale - Emulator physical models
+Load cell behind the Weight I2C unit, and a keg filled through the
+solenoid valve output
+"""
+
+import random
+
+ADC_REGISTER = 0x00  # raw ADC, int32 little endian (see scale.py)
+
+
+class LoadCell:
+    """
+    Weight I2C unit with its load cell
+    
+    The ADC converts every `conversion_ms`; reads in between return the
+    same conversion. A conversion is
+        
+        offset + counts_per_g * load + curvature * load**2 + noise
+    
+    where the load is the static load (set_load(), optionally ramped)
+    plus the weight of the attached models (e.g. a Keg).
+    """
+    
+    def __init__(self, clock, offset=84000, counts_per_g=176.0, curvature=-2e-5,
+                 noise_counts=40, conversion_ms=10, seed=1):
+        """
+        Initialize the sensor (empty platform)
+        
+        Args:
+            clock: VirtualClock
+            offset: ADC counts with nothing on the platform
+            counts_per_g: Sensitivity
+            curvature: Non-linearity (counts per g squared)
+            noise_counts: Standard deviation of the conversion noise
+            conversion_ms: ADC conversion period
+            seed: Noise random seed
+        """
+        self.clock = clock
+        self.offset = offset
+        self.counts_per_g = counts_per_g
+        self.curvature = curvature
+        self.noise_counts = noise_counts
+        self.conversion_us = conversion_ms * 1000
+        self.models = []
+        self.reads = 0
+        self._random = random.Random(seed)
+        self._load_from = 0.0
+        self._load_to = 0.0
+        self._ramp_start_us = 0
+        self._ramp_us = 0
+        self._conversion = None
+        self._value = 0
+    
+    def set_load(self, grams, ramp_ms=0):
+        """Static load, reached linearly over `ramp_ms`"""
+        self._load_from = self.load_g
+        self._load_to = float(grams)
+        self._ramp_start_us = self.clock.now_us
+        self._ramp_us = ramp_ms * 1000
+    
+    @property
+    def load_g(self):
+        """Weight on the platform now (grams)"""
+        elapsed = self.clock.now_us - self._ramp_start_us
+        if elapsed >= self._ramp_us:
+            load = self._load_to
+        else:
+            load = self._load_from + (self._load_to - self._load_from) * elapsed / self._ramp_us
+        for model in self.models:
+            load += model.weight_g
+        return load
+    
+    def adc(self, grams):
+        """Noise-free ADC value of a load"""
+        return self.offset + self.counts_per_g * grams + self.curvature * grams * grams
+    
+    def read_adc(self):
+        """Latest conversion"""
+        self.reads += 1
+        conversion = self.clock.now_us // self.conversion_us
+        if conversion != self._conversion:
+            self._conversion = conversion
+            noise = self._random.gauss(0, self.noise_counts) if self.noise_counts else 0
+            self._value = int(round(self.adc(self.load_g) + noise))
+        return self._value
+    
+    def read_register(self, register, length):
+        """I2C register read (raw ADC at ADC_REGISTER, zeros elsewhere)"""
+        if register == ADC_REGISTER:
+            return self.read_adc().to_bytes(4, 'little', signed=True)[:length] + bytes(max(0, length - 4))
+        return bytes(length)
+
+
+class Keg:
+    """
+    Counter-pressure keg on the platform, filled through a valve output
+    
+    The valve follows the pin after `latency_ms`. While open the flow
+    rises towards `flow_gps`; once closed it decays with `coast_ms`
+    (pressure equalizing). Same dynamics as keg_filler.SimulatedKeg, but
+    driven by the emulated pin and clock.
+    """
+    
+    def __init__(self, clock, pin, empty_g=4500, flow_gps=15, latency_ms=80, coast_ms=300,
+                 step_ms=10):
+        """
+        Initialize the keg (empty, valve closed) and start its model
+        
+        Args:
+            clock: VirtualClock
+            pin: Emulated valve pin state (Emulator.pin())
+            empty_g: Empty keg weight
+            flow_gps: Flow rate with the valve open
+            latency_ms: Valve response time
+            coast_ms: Flow decay time once closed
+            step_ms: Model time step
+        """
+        self.clock = clock
+        self.pin = pin
+        self.empty_g = empty_g
+        self.flow_gps = flow_gps
+        self.latency_us = latency_ms * 1000
+        self.coast_ms = coast_ms
+        self.step_ms = step_ms
+        self.beer_g = 0.0
+        self.flow = 0.0
+        self.is_open = False
+        self._task = clock.call_later(0, self._step, step_ms * 1000)
+    
+    @property
+    def weight_g(self):
+        return self.empty_g + self.beer_g
+    
+    def empty(self):
+        """Swap for an empty keg"""
+        self.beer_g = 0.0
+        self.flow = 0.0
+    
+    def stop(self):
+        """Stop the model"""
+        self.clock.cancel(self._task)
+    
+    def _step(self):
+        if self.clock.now_us - self.pin.changed_us >= self.latency_us:
+            self.is_open = bool(self.pin.value)
+        dt = self.step_ms
+        tau = 200 if self.is_open else self.coast_ms
+        goal = self.flow_gps if self.is_open else 0.0
+        self.flow += (goal - self.flow) * min(1.0, dt / tau)
+        self.beer_g += self.flow * dt / 1000
@@ -0,0 +1,408 @@
+"""
+Ultimate Homebrewing Scale - Emulator scenarios
+End-to-end runs of the unmodified firmware on an Emulator: each function
+installs nothing itself, it expects to be called inside `with Emulator()`
+and returns a summary dict
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+
+from .models import Keg
+from .device import REPO_DIR
+
+CALIBRATION_FILE = "scale_calibration.json"  # in the emulator working directory
+CALIBRATION_WEIGHTS = (0, 500, 1000, 2000, 5000, 10000, 20000, 30000)
+VALVE_PIN = 26  # any free GPIO: the repository has no fixed valve pin
+GRAIN_BILL = (("Pale Ale", 4.5), ("Munich", 1.2), ("Crystal 60", 0.35), ("Chocolate", 0.12))
+GRAIN_RECORDING = "grain_session.rec"  # in the emulator working directory
+KEG_STORE = "kegs"  # keg profiles and fill history, in the emulator working directory
+HOP_RECORDING = "hop_session.rec"
+
+
+def write_calibration(emu, weights=CALIBRATION_WEIGHTS, section='scale'):
+    """Calibration file matching the default sensor model exactly"""
+    points = [[w, round(emu.sensor.adc(w), 1)] for w in weights]
+    with open(CALIBRATION_FILE, 'w') as f:
+        json.dump({section: {'CalibrationPoints': points}}, f)
+    return points
+
+
+def _quiet(level_name='WARNING'):
+    """Log level applied by core.init_m5() (the firmware default is INFO)"""
+    import core
+    import log
+    core.LOG_LEVEL = getattr(log, level_name)
+    log.set_level(core.LOG_LEVEL)
+
+
+def shown_weight(ui):
+    """Weight on the screen shown ("1 234" label), None if there is none"""
+    for text in ui.texts():
+        if re.fullmatch(r"-?\d{1,3}( \d{3})*", text):
+            return int(text.replace(" ", ""))
+    return None
+
+
+def calibration(emu, points=(0, 500, 5000, 20000), adjust_steps=-3):
+    """
+    Four-point manual calibration with the wizard (30 s per point)
+    
+    The operator script waits for each step on the screen, puts the
+    target weight shown on the platform, lets it settle and presses the
+    button. The heaviest weight is first adjusted with the encoder (as
+    when the reference weight at hand differs from the default point).
+    Then the scale application reads a weight with the saved calibration.
+    """
+    _quiet()
+    import ScaleCalibrationWizard
+    ui = emu.ui
+    placed = []
+    
+    def operator():
+        for step in range(len(points)):
+            yield lambda step=step: ui.find(f"Step {step + 1}/")
+            if step == len(points) - 1:
+                for _ in range(abs(adjust_steps)):
+                    emu.turn(1 if adjust_steps > 0 else -1)
+                    yield 150
+            grams = int(ui.search(r"Target (\d+)g"))
+            placed.append(grams)
+            emu.set_load(grams, ramp_ms=2000)
+            yield 5000
+            emu.press()
+    
+    wizard = ScaleCalibrationWizard.CalibrationWizard(filename=CALIBRATION_FILE, points=list(points))
+    emu.script(operator())
+    reason, _ = emu.run(wizard.run, timeout_ms=30 * 60000)
+    
+    saved = json.load(open(CALIBRATION_FILE))['scale']['CalibrationPoints']
+    sensor = emu.sensor
+    errors = [round((adc - sensor.adc(w)) / sensor.counts_per_g, 2) for w, adc in saved]
+    
+    # The scale application on the new calibration
+    import scale
+    weight_scale = scale.CalibratedScale()
+    emu.set_load(1234)
+    for _ in range(20):
+        weight = weight_scale.read_weight()
+        time.sleep_ms(100)
+    return {
+        'reason': reason,
+        'placed_g': placed,
+        'saved': saved,
+        'point_error_g': errors,
+        'check': f"1234 g read as {weight:.1f} g",
+    }
+
+
+def keg_fill(emu, fills=3, beer_g=19000, flow_gps=15):
+    """
+    Keg fills (about 21 minutes each at 15 g/s) through the valve output
+    
+    The fill loop is the firmware's: FillController on a CalibratedScale
+    reading the emulated Weight I2C unit every 100 ms, driving a
+    hardware.Pin. The keg model fills while the pin is high (after the
+    valve latency), so the overshoot comes from the real control loop,
+    its filter lag and its learned correction.
+    
+    The keg is a KegStore profile, reopened for every fill: the learned
+    correction comes back from flash and each fill is recorded. The
+    history holds 2 fills, so the third one wraps the ring; the store is
+    then reopened with room for 5 fills, keeping the history.
+    """
+    write_calibration(emu)
+    _quiet()
+    import scale
+    from hardware import Pin
+    from keg_filler import FillController
+    from keg_store import KegStore
+    keg = Keg(emu.clock, emu.pin(VALVE_PIN), flow_gps=flow_gps)
+    emu.sensor.models.append(keg)
+    store = KegStore(KEG_STORE, max_history=2)
+    keg_id = store.add("Cornelius 19L", empty_g=keg.empty_g, volume_l=beer_g / 1000, density=1.0).keg_id
+    
+    def firmware():
+        weight_scale = scale.CalibratedScale()
+        valve = Pin(VALVE_PIN, Pin.OUT)
+        results = []
+        for _ in range(fills):
+            keg.empty()
+            store = KegStore(KEG_STORE, max_history=2)
+            store.load()
+            profile = store.get(keg_id)
+            controller = FillController(weight_scale, valve, correction_ms=profile.correction_ms)
+            for _ in range(20):
+                weight_scale.read_weight()
+                time.sleep_ms(100)
+            controller.start(profile.target_g, time.ticks_ms())
+            while controller.state in (FillController.FILLING, FillController.SETTLING):
+                controller.update(time.ticks_ms())
+                time.sleep_ms(100)
+            store.record_fill(profile, controller.result, controller.correction_ms)
+            result = dict(controller.result)
+            result['true_beer_g'] = round(keg.beer_g, 1)
+            results.append(result)
+        return results
+    
+    reason, results = emu.run(firmware, timeout_ms=fills * 3600000)
+    keg.stop()
+    assert reason == 'returned', f"fills did not complete ({reason})"
+    
+    store = KegStore(KEG_STORE, max_history=2)
+    store.load()
+    profile = store.get(keg_id)
+    history = store.history(keg_id)
+    assert profile.fills == fills and profile.correction_ms != 0, f"keg profile not updated: {profile.__dict__}"
+    assert [h['final_g'] for h in history] == [r['final_g'] for r in results[:-3:-1]], \
+        f"history ring does not hold the last 2 fills: {history}"
+    assert history[0]['correction_ms'] == round(profile.correction_ms, 1)
+    
+    # More room: the 2 fills are kept and the next one is added
+    store = KegStore(KEG_STORE, max_history=5)
+    store.load()
+    assert len(store.history()) == 2, "history lost when reopened with another size"
+    store.record_fill(store.get(keg_id), results[-1], profile.correction_ms)
+    assert [h['final_g'] for h in store.history()] == [results[-1]['final_g']] + [h['final_g'] for h in history], \
+        f"resized history: {store.history()}"
+    # Less room: only the newest fill stays
+    store = KegStore(KEG_STORE, max_history=1)
+    store.load()
+    store.record_fill(store.get(keg_id), results[0], profile.correction_ms)
+    assert [h['final_g'] for h in store.history()] == [results[0]['final_g']], "shrunk history"
+    
+    return {'reason': reason, 'fills': results, 'valve_changes': emu.pin(VALVE_PIN).changes,
+            'correction_ms': round(profile.correction_ms, 1), 'history': history}
+
+
+def idle(emu, load_g=1500, change_g=200):
+    """
+    Scale application idle mode: a load settles, the scale goes idle,
+    a button press wakes it, it goes idle again and a load change wakes it
+    """
+    write_calibration(emu)
+    _quiet('INFO')
+    import log
+    import scale
+    lines = []
+    log.configure(sink=lines.append)
+    ui = emu.ui
+    events = {}
+    
+    def operator():
+        yield 2000
+        emu.set_load(load_g, ramp_ms=1000)
+        yield lambda: app.power.idle
+        events['idle_at_s'] = emu.now_ms / 1000
+        events['idle_backlight'] = ui.brightness
+        yield 10000
+        start = emu.now_ms
+        emu.press()
+        yield lambda: not app.power.idle
+        events['press_wake_ms'] = emu.now_ms - start
+        yield lambda: app.power.idle
+        start = emu.now_ms
+        emu.set_load(load_g + change_g)
+        yield lambda: shown_weight(ui) == load_g + change_g
+        events['load_shown_ms'] = emu.now_ms - start
+        yield 1000
+        emu.stop('done')
+    
+    app = scale.ScaleApp()
+    emu.script(operator())
+    reason, _ = emu.run(app.run, timeout_ms=10 * 60000)
+    log.flush()
+    power = app.power.stats()
+    events['reason'] = reason
+    events['power'] = power
+    events['redraws'] = ui.redraws
+    events['log'] = [line for line in lines if ' power: ' in line]
+    assert reason == 'done', f"scenario did not complete ({reason})"
+    assert power['idle_duty'] < power['active_duty'], \
+        f"idle duty {power['idle_duty']:.2f}% not below active {power['active_duty']:.2f}%"
+    assert events['press_wake_ms'] <= app.power.poll_ms + 10, "press woke the scale late"
+    return events
+
+
+def drift(emu, drift_g=5.0, minutes=10):
+    """
+    Zero drift of the empty platform with the default configuration
+    (precision mode near zero): zero tracking has to follow it
+    """
+    write_calibration(emu)
+    _quiet()
+    import scale
+    
+    def operator():
+        yield 1000
+        emu.set_load(drift_g, ramp_ms=minutes * 60000)
+        yield minutes * 60000 + 30000
+        emu.stop('done')
+    
+    app = scale.ScaleApp()
+    emu.script(operator())
+    reason, _ = emu.run(app.run, timeout_ms=(minutes + 5) * 60000)
+    weight_scale = app.scale
+    tracked_g = weight_scale.zero_tracker.total_g
+    shown_g = weight_scale._last_weight
+    assert weight_scale.precise, "expected the default precision mode near zero"
+    assert abs(shown_g) < 0.5, f"drift not tracked: reading {shown_g:.2f} g"
+    assert tracked_g > drift_g - 0.5, f"tracked {tracked_g:.2f} g of {drift_g} g"
+    return {
+        'reason': reason,
+        'drift_g': drift_g,
+        'tracked_g': round(tracked_g, 2),
+        'reading_g': round(shown_g, 2),
+    }
+
+
+def platforms(emu, bucket_g=1500, hops_g=42):
+    """
+    Two Weight I2C units (bucket and hop tray) on one bus: the scale
+    application samples both round-robin and the encoder switches the
+    platform shown
+    """
+    hops = emu.add_sensor(0, 0x27, seed=3)
+    points = write_calibration(emu)
+    with open(CALIBRATION_FILE, 'w') as f:
+        json.dump({'scale': {'CalibrationPoints': points}, 'hops': {'CalibrationPoints': points}}, f)
+    _quiet()
+    import scale
+    scale.SENSORS[:] = [
+        {'name': 'scale', 'bus': 0, 'address': 0x26, 'calibration': 'scale'},
+        {'name': 'hops', 'bus': 0, 'address': 0x27, 'calibration': 'hops'},
+    ]
+    ui = emu.ui
+    events = {}
+    
+    def operator():
+        yield 2000
+        emu.set_load(bucket_g, ramp_ms=1000)
+        hops.set_load(hops_g, ramp_ms=1000)
+        yield lambda: shown_weight(ui) == bucket_g
+        events['bucket_shown_s'] = emu.now_ms / 1000
+        emu.turn(1)
+        yield lambda: shown_weight(ui) == hops_g and ui.find("hops")
+        events['hops_shown_s'] = emu.now_ms / 1000
+        emu.turn(1)
+        yield lambda: shown_weight(ui) == bucket_g
+        yield 500
+        emu.stop('done')
+    
+    app = scale.ScaleApp()
+    emu.script(operator())
+    reason, _ = emu.run(app.run, timeout_ms=5 * 60000)
+    channels = app.scheduler.stats()['channels']
+    app.scheduler.stop()
+    assert reason == 'done', f"scenario did not complete ({reason})"
+    assert all(channel['samples'] and not channel['errors'] for channel in channels.values()), \
+        f"a sensor was not sampled: {channels}"
+    events['reason'] = reason
+    events['channels'] = channels
+    return events
+
+
+def grain(emu, bill=GRAIN_BILL, scoop_g=600, seed=2):
+    """
+    Grain Assistant session on the scale, recorded then replayed
+    
+    The brewer pours each malt into the same bucket in scoops (up to
+    `scoop_g`, about 1.5 s each, 10% spread), watching the remaining weight
+    shown and pausing between scoops, then smaller scoops near the target.
+    The session runs on a CalibratedScale at the application loop rate and
+    records its readings; replay() of the recording must weigh the same.
+    """
+    write_calibration(emu)
+    _quiet()
+    sys.path.insert(0, os.path.join(REPO_DIR, 'api'))
+    import scale
+    from brewing_software_api import Malt
+    from grain_assistant import GrainWeighingSession, replay
+    pour = random.Random(seed)
+    state = {'poured_g': 0.0}
+    
+    def firmware():
+        weight_scale = scale.CalibratedScale()
+        for _ in range(20):
+            weight_scale.read_weight()
+            time.sleep_ms(scale.LOOP_PERIOD_MS)
+        weight_scale.tare()
+        session = state['session'] = GrainWeighingSession(
+            weight_scale, [Malt(name, 0, kg) for name, kg in bill], record_path=GRAIN_RECORDING)
+        emu.script(operator())
+        while session.update(time.ticks_ms()) != 'done':
+            time.sleep_ms(scale.LOOP_PERIOD_MS)
+        return session
+    
+    def operator():
+        yield 3000  # reads the first target
+        session = state['session']
+        while not session.done:
+            index = session.index
+            remaining = session.remaining_g
+            if remaining > session.tolerance_g:
+                scoop = min(scoop_g, remaining * 0.8 if remaining > 100 else remaining)
+                state['poured_g'] += scoop * pour.uniform(0.9, 1.1)
+                emu.set_load(state['poured_g'], ramp_ms=1500)
+                yield 1500 + pour.randint(1000, 3000)
+            else:
+                yield lambda: session.index != index
+                yield pour.randint(2000, 5000)  # next bag
+    
+    reason, session = emu.run(firmware, timeout_ms=30 * 60000)
+    assert reason == 'returned', f"session did not complete ({reason})"
+    now_ms = time.ticks_ms()
+    replayed = replay(GRAIN_RECORDING)
+    # Same advances, within a few readings (recorded to 0.1 g)
+    assert replayed.done and len(replayed.log) == len(session.log), "replay did not complete"
+    for live, again in zip(session.log, replayed.log):
+        assert abs(again['duration_ms'] - live['duration_ms']) <= 500 \
+            and abs(again['actual_g'] - live['actual_g']) < 0.5, \
+            f"replay differs from the session: {again} instead of {live}"
+    return {
+        'reason': reason,
+        'log': session.log,
+        'malts_per_min': round(session.malts_per_minute(now_ms), 2),
+        'replay_malts_per_min': round(replayed.malts_per_minute(replayed.last_ms), 2),
+        'recording': os.path.join(emu.workdir, GRAIN_RECORDING),
+    }
+
+
+def small_hop(emu, hop_g=1.0, empty_s=6, seed=4):
+    """
+    Replay of a 1 g hop addition (tolerance 1 g)
+    
+    The platform stays empty and stable for `empty_s` after the tare, then
+    the hop is added: the addition must only complete with the hop on the
+    platform, not on the stable empty reading.
+    """
+    sys.path.insert(0, os.path.join(REPO_DIR, 'api'))
+    from grain_assistant import replay
+    from hop_assistant import HopWeighingSession
+    noise = random.Random(seed)
+    with open(HOP_RECORDING, 'w') as f:
+        f.write(json.dumps([["Citra", hop_g]]) + '\n')
+        for now_ms in range(0, (empty_s + 5) * 1000, 100):
+            gross = hop_g if now_ms >= empty_s * 1000 else 0.0
+            f.write(f"{now_ms} {gross + noise.gauss(0, 0.05):.1f}\n")
+    session = replay(HOP_RECORDING, HopWeighingSession)
+    assert session.done, "the hop addition did not complete"
+    record = session.log[0]
+    assert record['duration_ms'] >= empty_s * 1000 and abs(record['actual_g'] - hop_g) < 0.2, \
+        f"the hop addition completed without the hop: {record}"
+    return {'reason': 'replayed', 'log': session.log, 'recording': os.path.join(emu.workdir, HOP_RECORDING)}
+
+
+SCENARIOS = {
+    'calibration': calibration,
+    'fill': keg_fill,
+    'idle': idle,
+    'drift': drift,
+    'platforms': platforms,
+    'grain': grain,
+    'small_hop': small_hop,
+}
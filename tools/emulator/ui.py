@@ -0,0 +1,132 @@
+"""
+Ultimate Homebrewing Scale - Emulator UI recorder
+Headless stand-in for the screen: keeps the pages and widgets the
+firmware creates, which page is shown, and a timeline of every change
+"""
+
+import re
+
+
+class Widget:
+    """A label or bar of a page"""
+    
+    def __init__(self, recorder, kind, page, x=0, y=0, text='', font=None):
+        self.recorder = recorder
+        self.kind = kind
+        self.page = page
+        self.x = x
+        self.y = y
+        self.text = text
+        self.font = font
+        self.value = 0
+        self.range = (0, 100)
+        self.id = len(recorder.widgets)
+        recorder.widgets.append(self)
+        if page is not None:
+            page.widgets.append(self)
+    
+    def __repr__(self):
+        if self.kind == 'bar':
+            return f"<bar {self.value}/{self.range[1]} at {self.x},{self.y}>"
+        return f"<label {self.text!r} at {self.x},{self.y}>"
+
+
+class Page:
+    """A screen of widgets"""
+    
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.id = len(recorder.pages)
+        self.widgets = []
+        recorder.pages.append(self)
+    
+    def texts(self):
+        """Label texts, top to bottom then left to right"""
+        labels = [w for w in self.widgets if w.kind == 'label']
+        labels.sort(key=lambda w: (w.y, w.x))
+        return [w.text for w in labels]
+
+
+class UIRecorder:
+    """
+    What the display would show
+    
+    Every visible change (label text, bar value, page load, backlight) is
+    appended to `timeline` as (time_ms, page id, description), and
+    printed as it happens with `echo`. `redraws` counts the text updates,
+    unchanged ones included, as the firmware pays for them.
+    """
+    
+    def __init__(self, clock, echo=False, origin_ms=0):
+        self.clock = clock
+        self.echo = echo
+        self.origin_ms = origin_ms  # timeline times are since boot
+        self.pages = []
+        self.widgets = []
+        self.active = None
+        self.brightness = None
+        self.timeline = []
+        self.redraws = 0
+    
+    def record(self, page, change):
+        entry = (self.clock.now_ms - self.origin_ms, page.id if page is not None else None, change)
+        self.timeline.append(entry)
+        if self.echo:
+            print("%10.3f s  [page %s] %s" % (entry[0] / 1000, entry[1], change))
+    
+    def set_text(self, widget, text):
+        self.redraws += 1
+        if text != widget.text:
+            widget.text = text
+            self.record(widget.page, repr(text))
+    
+    def set_value(self, widget, value):
+        if value != widget.value:
+            widget.value = value
+            self.record(widget.page, f"bar {value}")
+    
+    def load(self, page):
+        if page is not self.active:
+            self.active = page
+            self.record(page, "shown")
+    
+    def set_brightness(self, level):
+        if level != self.brightness:
+            self.brightness = level
+            self.record(self.active, f"backlight {level}")
+    
+    def texts(self):
+        """Label texts of the page shown"""
+        return self.active.texts() if self.active else []
+    
+    def text(self):
+        """Page shown, as one string (lines of the labels)"""
+        return "\n".join(self.texts())
+    
+    def find(self, text):
+        """True if a label of the page shown contains `text`"""
+        return any(text in t for t in self.texts())
+    
+    def search(self, pattern):
+        """
+        First regular expression match in the page shown
+        
+        Returns:
+            The first group (or the whole match), None if not found
+        """
+        match = re.search(pattern, self.text())
+        if match is None:
+            return None
+        return match.group(1) if match.groups() else match.group(0)
+    
+    def render(self):
+        """Text dump of the page shown"""
+        if self.active is None:
+            return "(no page)"
+        lines = [f"[page {self.active.id}] backlight {self.brightness}"]
+        for widget in sorted(self.active.widgets, key=lambda w: (w.y, w.x)):
+            if widget.kind == 'bar':
+                lines.append(f"  {widget.y:3} [{'#' * (widget.value // 10):10}] {widget.value}")
+            elif widget.text:
+                lines.append(f"  {widget.y:3} " + widget.text.replace("\n", " | "))
+        return "\n".join(lines)
@@ -0,0 +1,78 @@
+"""
+Ultimate Homebrewing Scale - I2C sample rate measurement
+Run on the M5Stack (calibrated scale): reports the samples per second
+achievable on the Weight I2C unit for each bus frequency and read mode
+"""
+
+import sys
+sys.path.append('..')  # Access scale.py from parent directory
+
+import time
+import scale
+import log
+from scale import CalibratedScale, set_i2c_freq, get_weight_unit
+
+FREQUENCIES = (100000, 400000)
+DURATION_MS = 2000
+
+
+def measure(weight_scale, duration_ms=DURATION_MS):
+    """
+    Read the sensor as fast as possible
+    
+    Args:
+        weight_scale: CalibratedScale
+        duration_ms: Measurement duration
+    
+    Returns:
+        Dict with reads per second, distinct conversions per second and errors
+    """
+    reads = 0
+    errors = 0
+    conversions = 0
+    previous = None
+    start = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), start) < duration_ms:
+        value = weight_scale.read_raw_adc()
+        if value is None:
+            errors += 1
+            continue
+        reads += 1
+        if value != previous:
+            conversions += 1
+            previous = value
+    elapsed_s = time.ticks_diff(time.ticks_ms(), start) / 1000
+    return {
+        'reads_per_s': round(reads / elapsed_s),
+        'conversions_per_s': round(conversions / elapsed_s),
+        'errors': errors,
+    }
+
+
+def main():
+    # Count errors instead of falling back or printing them
+    log.set_level(log.ERROR)
+    scale.I2C_FALLBACK_ERRORS = 1 << 30
+    
+    weight_scale = CalibratedScale(freq=FREQUENCIES[0])
+    burst_available = weight_scale.burst
+    
+    print("freq      mode     reads/s  conversions/s  errors")
+    for freq in FREQUENCIES:
+        weight_scale.i2c_bus = set_i2c_freq(weight_scale.bus, weight_scale.scl, weight_scale.sda, freq)
+        weight_scale.weight_unit = get_weight_unit(weight_scale.bus, weight_scale.scl, weight_scale.sda,
+                                                   weight_scale.address)
+        for burst in (False, True):
+            if burst and not burst_available:
+                continue
+            weight_scale.burst = burst
+            result = measure(weight_scale)
+            mode = "burst" if burst else "driver"
+            print(f"{freq // 1000:4} kHz  {mode:<7} {result['reads_per_s']:8} "
+                  f"{result['conversions_per_s']:14} {result['errors']:7}")
+    
+    print("reads/s is the bus limit, conversions/s the sensor limit (new values)")
+
+
+if __name__ == "__main__":
+    main()
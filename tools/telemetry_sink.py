@@ -0,0 +1,222 @@
+"""
+Ultimate Homebrewing Scale - Telemetry sink
+Local stand-in MQTT broker and HTTP server (runs on a computer) that
+decode the telemetry frames of the scale
+
+Usage:
+    python tools/telemetry_sink.py mqtt [PORT]     # broker on 1883 by default
+    python tools/telemetry_sink.py http [PORT]     # server on 8080 by default
+    python tools/telemetry_sink.py --selftest      # publisher against both sinks
+"""
+
+import os
+import sys
+import socket
+import struct
+import threading
+import time
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'api'))
+
+from telemetry import decode_frame, TelemetryPublisher, create_transport
+
+
+class Sink:
+    """Frames received by a stand-in server"""
+    
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.frames = []  # (topic or path, decoded frame, received time)
+        self.bytes = 0
+        self.lock = threading.Lock()
+    
+    def receive(self, where, payload):
+        frame = decode_frame(payload)
+        with self.lock:
+            self.frames.append((where, frame, time.monotonic()))
+            self.bytes += len(payload)
+        if self.verbose:
+            first, last = frame['samples'][0], frame['samples'][-1]
+            progress = f", {frame['progress']}%" if frame['progress'] is not None else ""
+            print(f"{where}: {len(frame['samples'])} samples in {len(payload)} bytes, "
+                  f"{first[1]} -> {last[1]} g{progress}")
+    
+    def samples(self):
+        with self.lock:
+            return [s for _, frame, _ in self.frames for s in frame['samples']]
+
+
+def _read_exact(conn, length):
+    data = b""
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def _serve(port, handler):
+    """Accept connections on a thread, one thread per connection"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(4)
+    
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=handler, args=(conn,), daemon=True).start()
+    threading.Thread(target=accept, daemon=True).start()
+    return server
+
+
+def mqtt_broker(sink, port=1883):
+    """Minimal broker: CONNACK to CONNECT, decode PUBLISH payloads"""
+    def handle(conn):
+        with conn:
+            try:
+                while True:
+                    header = _read_exact(conn, 1)[0]
+                    length, shift = 0, 0
+                    while True:
+                        byte = _read_exact(conn, 1)[0]
+                        length |= (byte & 0x7F) << shift
+                        shift += 7
+                        if byte < 0x80:
+                            break
+                    body = _read_exact(conn, length)
+                    kind = header >> 4
+                    if kind == 1:  # CONNECT
+                        conn.sendall(b"\x20\x02\x00\x00")
+                    elif kind == 3:  # PUBLISH (QoS 0)
+                        topic_len = struct.unpack_from('!H', body)[0]
+                        sink.receive(body[2:2 + topic_len].decode(), body[2 + topic_len:])
+                    elif kind == 14:  # DISCONNECT
+                        return
+            except (ConnectionError, OSError):
+                return
+    return _serve(port, handle)
+
+
+def http_server(sink, port=8080):
+    """Minimal keep-alive HTTP server accepting POSTed frames"""
+    def handle(conn):
+        stream = conn.makefile('rb')
+        with conn:
+            try:
+                while True:
+                    request_line = stream.readline()
+                    if not request_line:
+                        return
+                    path = request_line.split()[1].decode()
+                    length = 0
+                    while True:
+                        line = stream.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode().partition(":")
+                        if name.strip().lower() == 'content-length':
+                            length = int(value)
+                    sink.receive(path, stream.read(length))
+                    conn.sendall(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+            except (ConnectionError, OSError, ValueError, IndexError):
+                return
+    return _serve(port, handle)
+
+
+def selftest():
+    """Publish a synthetic fill to both sinks, then with the server down"""
+    ok = True
+    for kind, start, port in (('mqtt', mqtt_broker, 18830), ('http', http_server, 18080)):
+        sink = Sink(verbose=False)
+        server = start(sink, port)
+        url = f"mqtt://127.0.0.1:{port}/uhs/keg/weight" if kind == 'mqtt' else f"http://127.0.0.1:{port}/telemetry/keg"
+        publisher = TelemetryPublisher(create_transport(url), interval_ms=200, queue_size=8)
+        publisher.start()
+        sent = []
+        worst_add_us = 0
+        t_ms = 0
+        for i in range(300):  # 3 s of 100 Hz readings of a filling keg
+            weight = 5000 + i * 7.3 + (i % 3) * 0.1
+            begin = time.perf_counter()
+            publisher.add(weight, t_ms, progress=i // 3)
+            worst_add_us = max(worst_add_us, (time.perf_counter() - begin) * 1e6)
+            sent.append((t_ms, round(weight, 1)))
+            t_ms += 10
+            time.sleep(0.01)
+        publisher.flush()
+        time.sleep(0.5)
+        publisher.stop()
+        received = sink.samples()
+        stats = publisher.stats()
+        match = received == sent
+        ok = ok and match
+        print(f"{kind}: {stats['frames']} frames, {len(received)}/{len(sent)} samples "
+              f"{'identical' if match else 'DIFFERENT'}, {sink.bytes / len(received):.1f} bytes/sample, "
+              f"worst add() {worst_add_us:.0f} us")
+        server.close()
+    
+    # Server down: add() must not block, the queue keeps the newest frames
+    publisher = TelemetryPublisher(create_transport("mqtt://127.0.0.1:18831/uhs/scale/weight"),
+                                   interval_ms=100, queue_size=4, retry_ms=50)
+    publisher.start()
+    begin = time.perf_counter()
+    for i in range(200):
+        publisher.add(1000.0, i * 10)
+    elapsed_ms = (time.perf_counter() - begin) * 1000
+    publisher.stop()
+    stats = publisher.stats()
+    print(f"down: 200 samples added in {elapsed_ms:.1f} ms, {stats['dropped']} frames dropped, "
+          f"{stats['queued']} queued")
+    ok = ok and stats['queued'] <= 4
+    
+    # start() while the stopped sender is closing its transport: a sender
+    # must be left running
+    sink = Sink(verbose=False)
+    server = http_server(sink, 18081)
+    transport = create_transport("http://127.0.0.1:18081/telemetry/scale")
+    close = transport.close
+    transport.close = lambda: time.sleep(0.1) or close()  # e.g. a TLS close
+    publisher = TelemetryPublisher(transport, interval_ms=40)
+    publisher.start()
+    time.sleep(0.05)
+    publisher.stop()
+    time.sleep(0.05)  # the sender leaves its loop and closes
+    publisher.start()
+    for i in range(20):
+        publisher.add(1000.0 + i, i * 10)
+    publisher.flush()
+    time.sleep(0.4)
+    publisher.stop()
+    restarted = len(sink.samples()) == 20
+    print(f"restart: start() during the stop, {len(sink.samples())}/20 samples received")
+    server.close()
+    return ok and restarted
+
+
+def main(argv):
+    if argv and argv[0] == '--selftest':
+        sys.exit(0 if selftest() else 1)
+    if not argv or argv[0] not in ('mqtt', 'http'):
+        print(__doc__)
+        return
+    sink = Sink()
+    if argv[0] == 'mqtt':
+        mqtt_broker(sink, int(argv[1]) if len(argv) > 1 else 1883)
+    else:
+        http_server(sink, int(argv[1]) if len(argv) > 1 else 8080)
+    print(f"Listening ({argv[0]}), Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,174 @@
+"""
+Ultimate Homebrewing Scale - Live server load test
+Runs LiveServer on a computer with simulated weight updates and several
+WebSocket clients (one of them never reading), and reports throughput,
+latency and the time spent in poll(). Fails (exit status 1) unless the
+slow client is dropped while the others get every update in time.
+
+Usage:
+    python tools/ws_load.py [CLIENTS] [SECONDS] [UPDATE_HZ]
+"""
+
+import os
+import sys
+import socket
+import threading
+import time
+import base64
+import hashlib
+import json
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from live_server import LiveServer, ticks_ms, WS_GUID
+
+PORT = 18765
+STALL_MS = 2000
+DEVICE_SEND_BUFFER = 5744  # lwIP TCP_SND_BUF of the ESP32 port
+LATENCY_LIMIT_MS = 50  # p99 of the clients that read
+
+
+class DeviceServer(LiveServer):
+    """
+    LiveServer with the socket send buffer of the device
+    
+    The host kernel buffers megabytes for a client that does not read, so
+    it would take minutes to stall; the device buffers a few kilobytes.
+    """
+    
+    def _accept(self, now_ms):
+        count = len(self.clients)
+        super()._accept(now_ms)
+        if len(self.clients) > count:
+            self.clients[-1].sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, DEVICE_SEND_BUFFER)
+
+
+def _recv_exact(sock, length):
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def connect():
+    """Open a WebSocket to the server, return the socket"""
+    sock = socket.create_connection(('127.0.0.1', PORT))
+    key = base64.b64encode(os.urandom(16))
+    sock.sendall(b"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+                 b"Connection: Upgrade\r\nSec-WebSocket-Version: 13\r\n"
+                 b"Sec-WebSocket-Key: " + key + b"\r\n\r\n")
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += sock.recv(1)
+    accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+    if not response.startswith(b"HTTP/1.1 101") or b"Sec-WebSocket-Accept: " + accept not in response:
+        raise ConnectionError(response[:40])
+    return sock
+
+
+def reader(sock, result, stop):
+    """Client thread: receive state messages and measure their latency"""
+    latencies = result['latencies']
+    sock.settimeout(0.5)
+    while not stop.is_set():
+        try:
+            header = _recv_exact(sock, 2)
+        except socket.timeout:
+            continue
+        except (ConnectionError, OSError):
+            result['closed'] = True
+            return
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(_recv_exact(sock, 2), 'big')
+        state = json.loads(_recv_exact(sock, length))
+        latencies.append(ticks_ms() - state['t'])
+
+
+def main(argv):
+    clients = int(argv[0]) if argv else 4
+    seconds = float(argv[1]) if len(argv) > 1 else 5
+    update_hz = float(argv[2]) if len(argv) > 2 else 50
+    
+    server = DeviceServer(PORT, max_clients=clients + 1, stall_ms=STALL_MS)
+    server.start()
+    stop = threading.Event()
+    results = []
+    sockets = []
+    connecting = []
+    
+    def open_clients():
+        for _ in range(clients):
+            sock = connect()
+            result = {'latencies': [], 'closed': False}
+            results.append(result)
+            sockets.append(sock)
+            threading.Thread(target=reader, args=(sock, result, stop), daemon=True).start()
+        # Slow client: handshake, then never reads (small receive buffer)
+        slow = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+        slow.connect(('127.0.0.1', PORT))
+        slow.sendall(b"GET /ws HTTP/1.1\r\nUpgrade: websocket\r\nSec-WebSocket-Key: "
+                     + base64.b64encode(os.urandom(16)) + b"\r\n\r\n")
+        connecting.append(slow)
+    threading.Thread(target=open_clients, daemon=True).start()
+    
+    # Application loop: publish a weight at update_hz, poll every 2 ms
+    poll_us = []
+    start = time.monotonic()
+    next_update = start
+    weight = 0.0
+    updates = 0
+    dropped_s = None
+    while time.monotonic() - start < seconds:
+        now = time.monotonic()
+        if now >= next_update:
+            weight += 12.5
+            server.publish(weight, stable=False, fill='filling', progress=updates % 100)
+            updates += 1
+            next_update += 1 / update_hz
+        begin = time.perf_counter()
+        server.poll()
+        poll_us.append((time.perf_counter() - begin) * 1e6)
+        if dropped_s is None and server.dropped:
+            dropped_s = time.monotonic() - start
+        time.sleep(0.002)
+    
+    stop.set()
+    stats = server.stats()
+    sent = [client.sent for client in server.clients]
+    server.stop()
+    for sock in sockets + connecting:
+        sock.close()
+    
+    latencies = sorted(l for r in results for l in r['latencies'])
+    poll_us.sort()
+    received = [len(r['latencies']) for r in results]
+    print(f"{clients} clients + 1 slow, {updates} updates at {update_hz:.0f} Hz over {seconds:.0f} s")
+    print(f"messages received per client: {min(received)}-{max(received)} "
+          f"({sum(received) / seconds:.0f} msg/s in total)")
+    if latencies:
+        print(f"latency: median {latencies[len(latencies) // 2]} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)]} ms, max {latencies[-1]} ms")
+    print(f"poll(): median {poll_us[len(poll_us) // 2]:.0f} us, max {poll_us[-1]:.0f} us")
+    print(f"messages written per connection: {sent}")
+    if dropped_s is not None:
+        print(f"slow client dropped after {dropped_s:.1f} s")
+    print(f"server: {stats}")
+    
+    failures = []
+    if stats['dropped'] != 1 or stats['clients'] != clients:
+        failures.append("the slow client was not dropped")
+    if min(received) < updates * 0.95:
+        failures.append(f"a reading client missed updates ({min(received)} of {updates})")
+    if not latencies or latencies[int(len(latencies) * 0.99)] > LATENCY_LIMIT_MS:
+        failures.append(f"p99 latency above {LATENCY_LIMIT_MS} ms")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,463 @@
+"""
+Ultimate Homebrewing Scale - Weighing helpers
+Hardware-independent signal processing shared by the assistants
+(runs on the M5Stack and on a computer for replays)
+"""
+
+import time
+from array import array
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_diff = time.ticks_diff
+    sleep_ms = time.sleep_ms
+except AttributeError:
+    # CPython fallback (host-side replays)
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_diff(end, start):
+        return end - start
+    
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+
+class StabilityDetector:
+    """
+    Detect when the filtered weight has settled
+    
+    The reading is stable once it stayed within `band_g` (max - min) for at
+    least `hold_ms`. Any excursion outside the band restarts the window.
+    """
+    
+    def __init__(self, band_g=3.0, hold_ms=1500):
+        """
+        Initialize the detector
+        
+        Args:
+            band_g: Maximum spread of readings considered stable (grams)
+            hold_ms: Time the readings must stay in the band
+        """
+        self.band_g = band_g
+        self.hold_ms = hold_ms
+        self.reset()
+    
+    def reset(self):
+        """Forget the current window"""
+        self._start_ms = None
+        self._min = 0.0
+        self._max = 0.0
+        self._sum = 0.0
+        self._count = 0
+        self.stable = False
+    
+    def update(self, weight, now_ms):
+        """
+        Add a reading
+        
+        Args:
+            weight: Filtered weight in grams
+            now_ms: Timestamp of the reading (ticks_ms)
+        
+        Returns:
+            True if the weight is stable
+        """
+        if self._start_ms is None:
+            self._restart(weight, now_ms)
+        else:
+            low = weight if weight < self._min else self._min
+            high = weight if weight > self._max else self._max
+            if high - low > self.band_g:
+                self._restart(weight, now_ms)
+            else:
+                self._min = low
+                self._max = high
+                self._sum += weight
+                self._count += 1
+        
+        self.stable = ticks_diff(now_ms, self._start_ms) >= self.hold_ms
+        return self.stable
+    
+    def _restart(self, weight, now_ms):
+        self._start_ms = now_ms
+        self._min = weight
+        self._max = weight
+        self._sum = weight
+        self._count = 1
+    
+    @property
+    def mean(self):
+        """Average weight of the current stable window"""
+        return self._sum / self._count if self._count else 0.0
+
+
+class FlowEstimator:
+    """
+    Flow rate (weight derivative) from a window of recent readings
+    
+    The slope is a least-squares fit over the last `size` readings, which
+    is far less noisy than the difference of two consecutive readings.
+    Readings are kept in preallocated arrays (like CalibrationTable), so
+    update() never grows a list; only the float arithmetic of the fit
+    allocates (boxed floats on the ESP32 port).
+    """
+    
+    def __init__(self, size=8):
+        """
+        Initialize the estimator
+        
+        Args:
+            size: Number of readings in the fit window
+        """
+        self.size = size
+        self._t = array('l', [0] * size)  # ticks_ms (32 bits on the device)
+        self._w = array('f', [0.0] * size)
+        self.reset()
+    
+    def reset(self):
+        """Forget the readings"""
+        self._pos = 0
+        self._count = 0
+        self.flow = 0.0
+    
+    def update(self, weight, now_ms):
+        """
+        Add a reading
+        
+        Args:
+            weight: Weight in grams
+            now_ms: Timestamp of the reading (ticks_ms)
+        
+        Returns:
+            Flow rate in grams per second (0 until two readings are known)
+        """
+        self._t[self._pos] = now_ms
+        self._w[self._pos] = weight
+        self._pos = (self._pos + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+        if self._count < 2:
+            return 0.0
+        
+        # Times relative to the newest reading (wrap-safe, small numbers)
+        newest = now_ms
+        n = self._count
+        sum_t = sum_w = sum_tt = sum_tw = 0.0
+        for i in range(n):
+            t = ticks_diff(self._t[i], newest)
+            w = self._w[i]
+            sum_t += t
+            sum_w += w
+            sum_tt += t * t
+            sum_tw += t * w
+        denominator = n * sum_tt - sum_t * sum_t
+        if denominator > 0:
+            self.flow = (n * sum_tw - sum_t * sum_w) / denominator * 1000
+        return self.flow
+
+
+class Oversampler:
+    """
+    Burst-sample a sensor and decimate the burst to one averaged value
+    
+    Averaging N independent conversions divides the noise by sqrt(N): the
+    burst trades settle time (its duration) for resolution. Reads that
+    return the previous value again (bus faster than the ADC) are counted
+    apart, as they do not add resolution.
+    """
+    
+    def __init__(self, read, count=32, interval_ms=0):
+        """
+        Initialize the oversampler
+        
+        Args:
+            read: Function returning a raw sensor value, or None on error
+            count: Number of reads per burst
+            interval_ms: Pause between reads (ADC conversion period)
+        """
+        self.read = read
+        self.interval_ms = interval_ms
+        self.resize(count)
+    
+    def resize(self, count):
+        """Change the number of reads per burst"""
+        self.count = count
+        self._buf = array('i', [0] * count)
+        self.mean = None
+        self.noise = 0.0  # standard deviation of the mean (ADC counts)
+        self.conversions = 0  # distinct conversions in the last burst
+        self.settle_ms = 0  # duration of the last burst
+    
+    def sample(self):
+        """
+        Read a burst
+        
+        Returns:
+            Mean raw value, or None if fewer than half the reads succeeded
+        """
+        start = ticks_ms()
+        n = 0
+        conversions = 0
+        previous = None
+        for _ in range(self.count):
+            value = self.read()
+            if value is not None:
+                self._buf[n] = value
+                n += 1
+                if value != previous:
+                    conversions += 1
+                previous = value
+            if self.interval_ms:
+                sleep_ms(self.interval_ms)
+        self.settle_ms = ticks_diff(ticks_ms(), start)
+        self.conversions = conversions
+        
+        if n < self.count // 2 or n == 0:
+            return None
+        
+        total = 0
+        for i in range(n):
+            total += self._buf[i]
+        mean = total / n
+        variance = 0.0
+        for i in range(n):
+            d = self._buf[i] - mean
+            variance += d * d
+        variance /= max(1, n - 1)
+        # Only distinct conversions average out the noise
+        self.noise = (variance / max(1, conversions)) ** 0.5
+        self.mean = mean
+        return mean
+
+
+class ZeroTracker:
+    """
+    Automatic zero tracking
+    
+    While the scale is stable and reads within `band_g` of zero, the zero
+    is pulled towards the reading by at most `rate_g_per_s`, and by
+    `limit_g` in total since the last manual tare. Slow drift is removed
+    without a blocking tare; a real load (outside the band, or added
+    faster than the rate) is not. Fine readings (precision mode, where a
+    gram is a real load) use a narrower band and a slower rate.
+    """
+    
+    def __init__(self, band_g=2.0, rate_g_per_s=0.2, limit_g=100, stable_band_g=1.0, hold_ms=2000,
+                 fine_band_g=0.5, fine_rate_g_per_s=0.02):
+        """
+        Initialize the tracker
+        
+        Args:
+            band_g: Readings within +/- band_g of zero are tracked
+            rate_g_per_s: Maximum zero correction speed
+            limit_g: Maximum total correction (then a manual tare is needed)
+            stable_band_g: Stability band required before tracking
+            hold_ms: Time the reading must be stable before tracking
+            fine_band_g: band_g of fine readings
+            fine_rate_g_per_s: rate_g_per_s of fine readings
+        """
+        self.band_g = band_g
+        self.rate_g_per_s = rate_g_per_s
+        self.fine_band_g = fine_band_g
+        self.fine_rate_g_per_s = fine_rate_g_per_s
+        self.limit_g = limit_g
+        self.stability = StabilityDetector(stable_band_g, hold_ms)
+        self.enabled = True
+        self.reset()
+    
+    def reset(self):
+        """Start over after a manual tare"""
+        self.total_g = 0.0
+        self.stability.reset()
+        self._last_ms = None
+    
+    def update(self, weight, now_ms, fine=False):
+        """
+        Add a reading
+        
+        Args:
+            weight: Tared weight in grams
+            now_ms: Timestamp of the reading (ticks_ms)
+            fine: Precision reading (fine band and rate)
+        
+        Returns:
+            Correction to add to the tare offset (grams, 0 when not tracking)
+        """
+        last_ms = self._last_ms
+        self._last_ms = now_ms
+        stable = self.stability.update(weight, now_ms)
+        band_g = self.fine_band_g if fine else self.band_g
+        if not self.enabled or not stable or last_ms is None or abs(weight) > band_g:
+            return 0.0
+        
+        rate = self.fine_rate_g_per_s if fine else self.rate_g_per_s
+        max_step = rate * ticks_diff(now_ms, last_ms) / 1000
+        step = weight
+        if step > max_step:
+            step = max_step
+        elif step < -max_step:
+            step = -max_step
+        
+        # Bounded total correction
+        if self.total_g + step > self.limit_g:
+            step = self.limit_g - self.total_g
+        elif self.total_g + step < -self.limit_g:
+            step = -self.limit_g - self.total_g
+        self.total_g += step
+        return step
+
+
+class CreepCompensator:
+    """
+    Load-cell creep model
+    
+    Under a constant load L the reading of a load cell slowly rises by up
+    to `coefficient` * L, with time constant `tau_s`, and recovers the same
+    way once unloaded. The creep is modelled as a first-order response to
+    the load and subtracted from the gross weight.
+    """
+    
+    def __init__(self, coefficient=0.0, tau_s=1200):
+        """
+        Initialize the model (coefficient 0 disables it)
+        
+        Args:
+            coefficient: Final creep as a fraction of the load (e.g. 0.0005)
+            tau_s: Creep time constant in seconds
+        """
+        self.coefficient = coefficient
+        self.tau_s = tau_s
+        self.reset()
+    
+    def reset(self):
+        """Forget the load history"""
+        self.creep_g = 0.0
+        self._last_ms = None
+    
+    def update(self, gross_g, now_ms):
+        """
+        Compensate a reading
+        
+        Args:
+            gross_g: Untared weight in grams (load on the cell)
+            now_ms: Timestamp of the reading (ticks_ms)
+        
+        Returns:
+            Gross weight without the modelled creep
+        """
+        if not self.coefficient:
+            return gross_g
+        if self._last_ms is not None:
+            dt_s = ticks_diff(now_ms, self._last_ms) / 1000
+            # The creep itself is not load: use the compensated value
+            load = gross_g - self.creep_g
+            alpha = dt_s / self.tau_s
+            if alpha > 1:
+                alpha = 1
+            self.creep_g += (self.coefficient * load - self.creep_g) * alpha
+        self._last_ms = now_ms
+        return gross_g - self.creep_g
+
+
+def parse_points(points):
+    """
+    (weight, adc) pairs of a calibration section, sorted by ADC value
+    
+    Args:
+        points: List of [weight, adc] pairs (written by the wizard) or of
+                {'weight': ..., 'adc_average': ...} dicts (older files)
+    """
+    pairs = []
+    for point in points:
+        if isinstance(point, dict):
+            pairs.append((point['weight'], point['adc_average']))
+        else:
+            pairs.append((point[0], point[1]))
+    pairs.sort(key=lambda p: p[1])
+    return pairs
+
+
+class CalibrationTable:
+    """
+    Piecewise-linear ADC to weight conversion
+    
+    Sorted ADC values, weights and the slope of each segment are kept in
+    flat arrays. A reading is first checked against the segment of the
+    previous one (consecutive readings rarely change segment), then found
+    by binary search, so dozens of points cost no more than four. Readings
+    outside the points are extrapolated from the end segments.
+    """
+    
+    def __init__(self, points):
+        """
+        Build the table
+        
+        Args:
+            points: Calibration points (see parse_points()), at least 2
+        
+        Raises:
+            ValueError: Fewer than 2 points
+        """
+        pairs = parse_points(points)
+        if len(pairs) < 2:
+            raise ValueError("At least 2 calibration points required")
+        count = len(pairs)
+        self.weights = array('f', [p[0] for p in pairs])
+        # ADC values keep their fraction: floats, not a single-precision array
+        self.adcs = [float(p[1]) for p in pairs]
+        self.slopes = array('f', [0.0] * (count - 1))  # grams per count
+        for i in range(count - 1):
+            span = self.adcs[i + 1] - self.adcs[i]
+            if span:
+                self.slopes[i] = (self.weights[i + 1] - self.weights[i]) / span
+        self._last = 0
+    
+    def __len__(self):
+        return len(self.adcs)
+    
+    def contains(self, adc_value):
+        """True if the value is within the calibrated range"""
+        return self.adcs[0] <= adc_value <= self.adcs[-1]
+    
+    def segment(self, adc_value):
+        """
+        Segment of an ADC value
+        
+        Returns:
+            Index i of the segment (points i and i + 1)
+        """
+        adcs = self.adcs
+        i = self._last
+        if adcs[i] <= adc_value <= adcs[i + 1]:
+            return i
+        last = len(adcs) - 1
+        if adc_value <= adcs[0]:
+            i = 0
+        elif adc_value >= adcs[last]:
+            i = last - 1
+        else:
+            low = 0
+            high = last
+            while high - low > 1:
+                middle = (low + high) >> 1
+                if adcs[middle] <= adc_value:
+                    low = middle
+                else:
+                    high = middle
+            i = low
+        self._last = i
+        return i
+    
+    def weight(self, adc_value):
+        """Weight in grams of an ADC value"""
+        i = self.segment(adc_value)
+        return self.weights[i] + (adc_value - self.adcs[i]) * self.slopes[i]
+    
+    def grams_per_count(self, adc_value):
+        """Local slope of the calibration (grams per ADC count, positive)"""
+        return abs(self.slopes[self.segment(adc_value)])
+    
+    def points(self):
+        """(weight, adc) pairs, sorted by ADC value"""
+        return [(self.weights[i], self.adcs[i]) for i in range(len(self.adcs))]